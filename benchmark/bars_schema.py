@@ -0,0 +1,51 @@
+"""
+Per-symbol load latency and storage size of bars_1min before (legacy "bars_1min_v1") and after migration.
+Run after "python -m tools.migrate_bars_1min" on a database that holds real or synthetic bars.
+"""
+import argparse
+import json
+import statistics
+import time
+from data_types import QueryType
+from repository.bars_schema import SchemaBarsMin
+from repository.client import ClientDB, get_client_db
+
+
+def bench_load(client_db: ClientDB, table_name: str, symbols: list, runs: int) -> dict:
+    query = client_db.load_query_by_name(QueryType.SELECT, 'bars_1min_symbol_table').format(table=table_name)
+    times = []
+    rows_num = 0
+    for _ in range(runs):
+        for symbol in symbols:
+            time_start = time.perf_counter()
+            rows_num = len(client_db.fetch_all(query, (symbol,)))
+            times.append(time.perf_counter() - time_start)
+    return {
+        'median_ms': statistics.median(times) * 1000,
+        'max_ms': max(times) * 1000,
+        'rows_last_symbol': rows_num
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bars_1min schema versions.')
+    parser.add_argument('--symbols', nargs='+', default=['AAPL', 'SPY'])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    client_db = get_client_db()
+    schema = SchemaBarsMin(_client_db=client_db)
+    results = []
+    for table_name in ('bars_1min_v1', 'bars_1min'):
+        if schema.get_version(table_name) == 0:
+            continue
+        results.append({
+            'table': table_name,
+            'version': schema.get_version(table_name),
+            **schema.get_table_size(table_name),
+            **bench_load(client_db, table_name, args.symbols, args.runs)
+        })
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Seconds of the analytic scans over bars_1min on each storage backend: a daily aggregate
+and a moving average window of every symbol, plus the bulk load of the bars they scan.
+
+    DB_DUCKDB_PATH=/tmp/bench.duckdb python -m benchmark.db_backend --backends duckdb --symbols 20 --days 250
+    DB_USER=root DB_PASSWORD=bench DB_HOST=127.0.0.1 DB_NAME=alpaca_market_db \
+        python -m benchmark.db_backend --backends mysql duckdb
+
+The MySQL backend needs the MySQL/MariaDB of "DB_*", DuckDB needs "duckdb".
+The synthetic symbols are deleted after each run.
+"""
+import argparse
+import json
+import time
+from benchmark.synthetic import generate_bars_columns
+from data_types import QueryType, BulkInsertMode, DBBackend
+from repository.bars_columnar import bars_columns_to_lines
+from repository.bars_schema import SchemaBarsMin
+from repository.client import ClientDB, get_client_db
+
+TABLE = 'bars_1min'
+# both dialects, the quoting and placeholders are translated by the backend.
+QUERY_DAILY = """
+SELECT symbol, CAST(`time` AS DATE) AS `day`, MIN(low), MAX(high), SUM(volume), COUNT(*)
+FROM bars_1min
+WHERE symbol IN ({symbols})
+GROUP BY symbol, CAST(`time` AS DATE);
+"""
+QUERY_WINDOW = """
+SELECT symbol, MAX(ma), MIN(ma)
+FROM (
+    SELECT
+        symbol,
+        AVG(`close`) OVER (PARTITION BY symbol ORDER BY `time` ROWS BETWEEN 29 PRECEDING AND CURRENT ROW) AS ma
+    FROM bars_1min
+    WHERE symbol IN ({symbols})
+) w
+GROUP BY symbol;
+"""
+
+
+def _time_query(client_db: ClientDB, query: str, symbols: list, runs: int) -> dict:
+    query = query.format(symbols=', '.join(['%s'] * len(symbols)))
+    secs = []
+    rows = 0
+    for _ in range(runs):
+        time_start = time.perf_counter()
+        rows = len(client_db.fetch_all(query, tuple(symbols)))
+        secs.append(time.perf_counter() - time_start)
+    return {'rows': rows, 'sec_min': min(secs), 'sec_max': max(secs)}
+
+
+def bench_backend(backend: DBBackend, symbols_num: int, days: int, runs: int) -> dict:
+    client_db = get_client_db(backend)
+    SchemaBarsMin(_client_db=client_db).create_table()
+    symbols = [f'BB{i:04d}' for i in range(symbols_num)]
+    q_delete = client_db.load_query_by_name(QueryType.DELETE, f'{TABLE}_symbol')
+    try:
+        time_load = 0.0
+        bars_num = 0
+        for i, symbol in enumerate(symbols):
+            lines = bars_columns_to_lines(symbol, generate_bars_columns('2021-01-04T00:00:00', days * 24 * 60, seed=i))
+            time_start = time.perf_counter()
+            client_db.bulk_insert_lines(TABLE, lines, BulkInsertMode.UPSERT)
+            time_load += time.perf_counter() - time_start
+            bars_num += len(lines)
+        return {
+            'backend': backend.value,
+            'bars': bars_num,
+            'load': {'sec': time_load, 'rows_per_sec': bars_num / time_load},
+            'daily': _time_query(client_db, QUERY_DAILY, symbols, runs),
+            'window': _time_query(client_db, QUERY_WINDOW, symbols, runs)
+        }
+    finally:
+        for symbol in symbols:
+            client_db.execute(q_delete, (symbol,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark analytic scans of bars_1min per storage backend.')
+    parser.add_argument('--backends', nargs='+', choices=[b.value for b in DBBackend], default=[DBBackend.DUCKDB.value])
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--days', type=int, default=250, help='days of 24h minute bars per symbol.')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    results = [bench_backend(DBBackend(b), args.symbols, args.days, args.runs) for b in args.backends]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Rows/sec of the insert paths of bars_1min against a local MySQL/MariaDB.
+
+    docker run -d --name alpaca-bench-db -p 3306:3306 \
+        -e MYSQL_ROOT_PASSWORD=bench mysql:8 --local-infile=1
+    DB_USER=root DB_PASSWORD=bench DB_HOST=127.0.0.1 DB_NAME=alpaca_market_db \
+        python -m benchmark.db_insert --bars 1000000
+
+The synthetic symbol is deleted before each run.
+"""
+import argparse
+import json
+import time
+from benchmark.synthetic import generate_bars_columns
+from data_types import QueryType, BulkInsertMode
+from repository.bars_columnar import bars_columns_to_lines
+from repository.bars_schema import SchemaBarsMin
+from repository.client import ClientDB, get_client_db
+
+SYMBOL = 'BENCH'
+TABLE = 'bars_1min'
+
+
+def _reset(client_db: ClientDB) -> None:
+    SchemaBarsMin(_client_db=client_db).create_table()
+    client_db.execute(client_db.load_query_by_name(QueryType.DELETE, f'{TABLE}_symbol'), (SYMBOL,))
+
+
+def bench_insert(client_db: ClientDB, mode: str, lines: list) -> dict:
+    _reset(client_db)
+    time_start = time.perf_counter()
+    if mode == 'executemany':
+        client_db.insert_lines(client_db.load_query_by_name(QueryType.INSERT, TABLE), lines)
+    else:
+        client_db.bulk_insert_lines(TABLE, lines, BulkInsertMode(mode))
+    time_elapsed = time.perf_counter() - time_start
+    result = {
+        'mode': mode,
+        'rows': len(lines),
+        'sec': time_elapsed,
+        'rows_per_sec': len(lines) / time_elapsed
+    }
+    # bulk modes overwrite duplicated keys, so a rerun of the same rows must succeed.
+    if mode != 'executemany':
+        time_start = time.perf_counter()
+        client_db.bulk_insert_lines(TABLE, lines, BulkInsertMode(mode))
+        result['rerun_rows_per_sec'] = len(lines) / (time.perf_counter() - time_start)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark insert paths of bars_1min.')
+    parser.add_argument('--bars', type=int, default=1000000)
+    parser.add_argument(
+        '--modes',
+        nargs='+',
+        default=['executemany'] + [m.value for m in BulkInsertMode]
+    )
+    args = parser.parse_args()
+    client_db = get_client_db()
+    lines = bars_columns_to_lines(SYMBOL, generate_bars_columns('2016-01-04T00:00:00', args.bars))
+    results = [bench_insert(client_db, mode, lines) for mode in args.modes]
+    _reset(client_db)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
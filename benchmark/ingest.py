@@ -0,0 +1,183 @@
+"""
+Throughput of each stage of the bars ingest path against the local mock of alpaca api.
+
+    python -m benchmark.ingest --scale 1x5y --output bench_ingest.json
+
+"db_insert" and "load_bars_df" run only with "--db", against the MySQL/MariaDB of "DB_*" (see benchmark/db_insert.py).
+The synthetic symbols are deleted from bars_1min after the run.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from benchmark.mock_alpaca import MockAlpacaServer
+from data_types import QueryType, SpoolFormat, BulkInsertMode
+from metrics_alpaca.metrics_alpaca import enable_metrics, metrics_to_dict
+from repository import RepositoryMarketData
+from repository.bars_columnar import bars_columns_to_lines
+from repository.client import get_client_db, ClientMarketData
+
+# name: (symbols, months)
+SCALES = {
+    '1x1m': (1, 1),
+    '1x5y': (1, 60),
+    '10x1y': (10, 12),
+    '100x3m': (100, 3),
+    '1000x1m': (1000, 1)
+}
+END_DATE = date(2021, 12, 31)
+
+
+def _get_version() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _get_span(months: int) -> tuple:
+    month_index = END_DATE.year * 12 + END_DATE.month - months
+    return date(month_index // 12, month_index % 12 + 1, 1).isoformat(), END_DATE.isoformat()
+
+
+class _Stage:
+    # accumulated time and bars of a stage measured in many parts.
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.sec = 0.0
+        self.bars = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.name,
+            'sec': self.sec,
+            'bars': self.bars,
+            'bars_per_sec': self.bars / self.sec if self.sec else None
+        }
+
+
+def run(
+        symbols_num: int,
+        months: int,
+        workers: int,
+        spool_format: SpoolFormat,
+        rate_limit_every: int,
+        use_db: bool,
+        bulk_insert_mode: BulkInsertMode
+) -> dict:
+    symbols = [f'BENCH{i:04d}' for i in range(symbols_num)]
+    start, end = _get_span(months)
+    server = MockAlpacaServer(rate_limit_every=rate_limit_every).start()
+    client_db = get_client_db()
+    stages = {name: _Stage(name) for name in ('download', 'spool_read', 'normalize', 'db_insert', 'load_bars_df')}
+    try:
+        with tempfile.TemporaryDirectory() as dl_dir:
+            repo = RepositoryMarketData(
+                _start_time=start,
+                _end_time=end,
+                _client_db=client_db,
+                _client_md=ClientMarketData(
+                    _base_url=server.url,
+                    _start_time=start,
+                    _end_time=end,
+                    _client_db=client_db,
+                    _api_rate_limit=10 ** 6
+                ),
+                _dl_destination=dl_dir,
+                _spool_format=spool_format,
+                _use_cache=False
+            )
+            time_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda s: repo._download_price_data(s, start, end), symbols))
+            stages['download'].sec = time.perf_counter() - time_start
+            if use_db:
+                repo._ensure_tables()
+            for symbol in symbols:
+                time_start = time.perf_counter()
+                columns = repo._load_bars_columns_from_files(symbol, start, end)
+                stages['spool_read'].sec += time.perf_counter() - time_start
+                time_start = time.perf_counter()
+                lines = bars_columns_to_lines(symbol, columns)
+                stages['normalize'].sec += time.perf_counter() - time_start
+                for stage in ('download', 'spool_read', 'normalize'):
+                    stages[stage].bars += len(lines)
+                if use_db:
+                    time_start = time.perf_counter()
+                    client_db.bulk_insert_lines('bars_1min', lines, bulk_insert_mode)
+                    stages['db_insert'].sec += time.perf_counter() - time_start
+                    stages['db_insert'].bars += len(lines)
+            if use_db:
+                time_start = time.perf_counter()
+                df = repo.load_bars_df(symbols, start, end, update=False)
+                stages['load_bars_df'].sec = time.perf_counter() - time_start
+                stages['load_bars_df'].bars = len(df)
+    finally:
+        if use_db:
+            query = client_db.load_query_by_name(QueryType.DELETE, 'bars_1min_symbol')
+            for symbol in symbols:
+                client_db.execute(query, (symbol,))
+        server.stop()
+    return {
+        'symbols': symbols_num,
+        'months': months,
+        'span': [start, end],
+        'spool_format': spool_format.value,
+        'workers': workers,
+        'stages': [s.to_dict() for s in stages.values() if use_db or s.name not in ('db_insert', 'load_bars_df')],
+        'server': {'requests': server.requests_num, 'rate_limited': server.rate_limited_num}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ingest stages against a mock of alpaca api.')
+    parser.add_argument('--scale', choices=SCALES.keys(), nargs='+', default=['1x1m'])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--spool-format', choices=[f.value for f in SpoolFormat], default=SpoolFormat.NPZ.value)
+    parser.add_argument('--rate-limit-every', type=int, default=50, help='the mock answers every n-th request 429.')
+    parser.add_argument('--db', action='store_true', help='also run db_insert and load_bars_df.')
+    parser.add_argument(
+        '--bulk-insert-mode',
+        choices=[m.value for m in BulkInsertMode],
+        default=BulkInsertMode.UPSERT.value
+    )
+    parser.add_argument('--output', help='write the json here instead of stdout.')
+    args = parser.parse_args()
+    enable_metrics()
+    results = {
+        'version': _get_version(),
+        'python': platform.python_version(),
+        'runs': [
+            {'scale': scale, **run(
+                *SCALES[scale],
+                workers=args.workers,
+                spool_format=SpoolFormat(args.spool_format),
+                rate_limit_every=args.rate_limit_every,
+                use_db=args.db,
+                bulk_insert_mode=BulkInsertMode(args.bulk_insert_mode)
+            )}
+            for scale in args.scale
+        ],
+        'metrics': metrics_to_dict()
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Local stand-in of the market data api of alpaca, so the ingest path can be measured without credentials.
+
+"/v2/stocks/{symbol}/bars" is paginated like alpaca: at most "limit" bars per page and an opaque "next_page_token".
+"/v2/stocks/bars?symbols=..." pages the symbols in order, "limit" counts the bars of all symbols.
+Bars are deterministic per (symbol, page), one per minute of the regular session (13:30-20:00 UTC) of weekdays.
+Every "rate_limit_every"-th request is answered 429 with "Retry-After", like an exhausted rate limit,
+and so is every request beyond "rate_limit_per_min" in the last 60 sec, like the limit of alpaca.
+
+    python -m benchmark.mock_alpaca --port 8790
+    ALPACA_ENDPOINT_MARKET_DATA=http://127.0.0.1:8790/v2 python main.py
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+import zlib
+from collections import deque
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from benchmark.synthetic import NS_PER_MIN, generate_bars_columns, columns_to_api_bars
+
+SESSION_START_MIN = 13 * 60 + 30
+SESSION_MINUTES = 390
+
+
+def session_minutes(start: str, end: str) -> np.ndarray:
+    """
+    Epoch ns of the session minutes of weekdays in [start, end], both dates included.
+    RFC3339 times ("2021-06-01T14:00:00Z") bound the span to the minute.
+    """
+    days = np.arange(np.datetime64(start[:10], 'D'), np.datetime64(end[:10], 'D') + 1)
+    days = days[np.is_busday(days)]
+    t_days = days.astype('datetime64[ns]').astype(np.int64)
+    t = (t_days[:, None] + (SESSION_START_MIN + np.arange(SESSION_MINUTES)) * NS_PER_MIN).ravel()
+    if len(start) > 10:
+        t = t[t >= np.datetime64(start.rstrip('Z'), 'ns').astype(np.int64)]
+    if len(end) > 10:
+        t = t[t <= np.datetime64(end.rstrip('Z'), 'ns').astype(np.int64)]
+    return t
+
+
+def generate_page(symbol: str, start: str, end: str, limit: int, page_token: str = None) -> dict:
+    t = session_minutes(start, end)
+    # the token is the time of the first bar of the page.
+    idx_start = 0 if page_token is None else int(np.searchsorted(t, int(page_token, 16)))
+    t_page = t[idx_start:idx_start + limit]
+    if len(t_page) == 0:
+        return {'bars': [], 'symbol': symbol, 'next_page_token': None}
+    seed = zlib.crc32(f'{symbol}{idx_start}'.encode())
+    columns = generate_bars_columns('1970-01-01T00:00:00', len(t_page), seed=seed)
+    columns['t'] = t_page
+    idx_next = idx_start + limit
+    return {
+        'bars': columns_to_api_bars(columns),
+        'symbol': symbol,
+        'next_page_token': f'{t[idx_next]:x}' if idx_next < len(t) else None
+    }
+
+
+def generate_page_multi(symbols: list, start: str, end: str, limit: int, page_token: str = None) -> dict:
+    symbols = sorted(symbols)
+    # the token is "{symbol}:{token of the single symbol page}".
+    idx_symbol, token_symbol = 0, None
+    if page_token is not None:
+        symbol_token, token_symbol = page_token.split(':')
+        idx_symbol = symbols.index(symbol_token)
+    bars = {}
+    while idx_symbol < len(symbols) and limit > 0:
+        page = generate_page(symbols[idx_symbol], start, end, limit, token_symbol)
+        if page['bars']:
+            bars[symbols[idx_symbol]] = page['bars']
+        limit -= len(page['bars'])
+        token_symbol = page['next_page_token']
+        if token_symbol is None:
+            idx_symbol += 1
+    next_page_token = None
+    if idx_symbol < len(symbols):
+        # "0" is the first bar of the symbol.
+        next_page_token = f'{symbols[idx_symbol]}:{token_symbol or 0}'
+    return {'bars': bars, 'next_page_token': next_page_token}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'MockAlpacaServer'
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        is_multi = parts == ['v2', 'stocks', 'bars']
+        if not is_multi and (len(parts) != 4 or parts[:2] != ['v2', 'stocks'] or parts[3] != 'bars'):
+            self.send_error(404)
+            return
+        if self.server.count_request():
+            self._send_json(429, {'message': 'too many requests.'}, {'Retry-After': str(self.server.retry_after)})
+            return
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if is_multi:
+            self._send_json(200, generate_page_multi(
+                query['symbols'].split(','),
+                query['start'],
+                query['end'],
+                min(int(query.get('limit', 1000)), 10000),
+                query.get('page_token')
+            ))
+            return
+        page = generate_page(
+            parts[2],
+            query['start'],
+            query['end'],
+            min(int(query.get('limit', 1000)), 10000),
+            query.get('page_token')
+        )
+        self._send_json(200, page)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode()
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if use_gzip:
+            data = gzip.compress(data, compresslevel=1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        return None
+
+
+class MockAlpacaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            rate_limit_every: int = 0,
+            retry_after: int = 0,
+            rate_limit_per_min: int = 0
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rate_limit_per_min = rate_limit_per_min
+        self.requests_num = 0
+        self.rate_limited_num = 0
+        # times of the requests answered in the last 60 sec.
+        self._times_served = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v2'
+
+    def count_request(self) -> bool:
+        # True if the request should be answered 429.
+        with self._lock:
+            self.requests_num += 1
+            is_limited = self.rate_limit_every > 0 and self.requests_num % self.rate_limit_every == 0
+            if self.rate_limit_per_min > 0:
+                now = time.monotonic()
+                while self._times_served and self._times_served[0] <= now - 60:
+                    self._times_served.popleft()
+                is_limited = is_limited or len(self._times_served) >= self.rate_limit_per_min
+                if not is_limited:
+                    self._times_served.append(now)
+            self.rate_limited_num += int(is_limited)
+        return is_limited
+
+    def start(self) -> 'MockAlpacaServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a mock of the bars api of alpaca.')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every n-th request with 429.')
+    parser.add_argument('--rate-limit-per-min', type=int, default=0, help='answer requests beyond it with 429.')
+    args = parser.parse_args()
+    server = MockAlpacaServer(
+        port=args.port,
+        rate_limit_every=args.rate_limit_every,
+        rate_limit_per_min=args.rate_limit_per_min
+    )
+    print(f'Serving "{server.url}"')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Local stand-in of the realtime market data websocket of alpaca, stdlib only.
+
+Answers connect, auth and subscribe like alpaca, then every "interval" sec sends a bar of each subscribed symbol
+that closes at that moment ("t" is the start of its minute, so a bar closes at "t" + 60 sec).
+With "drop_after" the first connection is cut after that many rounds, to exercise reconnect and gap fill.
+
+    python -m benchmark.mock_alpaca_stream --port 8791 --interval 1
+    ALPACA_ENDPOINT_MARKET_DATA_STREAM=ws://127.0.0.1:8791/v2/iex python tools/run_realtime.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from benchmark.synthetic import NS_PER_MIN
+
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_OPCODE_TEXT = 0x1
+_OPCODE_CLOSE = 0x8
+_OPCODE_PING = 0x9
+_OPCODE_PONG = 0xA
+
+
+def _encode_frame(payload: bytes, opcode: int = _OPCODE_TEXT) -> bytes:
+    # frames of the server are not masked.
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+def _read_exact(rfile, n: int) -> bytes:
+    data = rfile.read(n)
+    if len(data) != n:
+        raise ConnectionError('Connection is closed by the client.')
+    return data
+
+
+def _read_frame(rfile) -> tuple:
+    # (opcode, payload) of a frame of the client, which is always masked.
+    b1, b2 = _read_exact(rfile, 2)
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack('!H', _read_exact(rfile, 2))[0]
+    elif n == 127:
+        n = struct.unpack('!Q', _read_exact(rfile, 8))[0]
+    mask = _read_exact(rfile, 4) if b2 & 0x80 else b'\x00' * 4
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(_read_exact(rfile, n)))
+    return b1 & 0x0F, payload
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: 'MockAlpacaStreamServer'
+
+    def setup(self) -> None:
+        super().setup()
+        self._send_lock = threading.Lock()
+        self._symbols = []
+        self._closed = threading.Event()
+
+    def _handshake(self) -> bool:
+        headers = {}
+        line = self.rfile.readline()
+        if not line.startswith(b'GET '):
+            return False
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                break
+            k, _, v = line.partition(':')
+            headers[k.strip().lower()] = v.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + _WS_GUID).encode()).digest())
+        self.wfile.write((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept.decode()}\r\n\r\n'
+        ).encode())
+        return True
+
+    def _send(self, messages: list, opcode: int = _OPCODE_TEXT) -> None:
+        data = _encode_frame(json.dumps(messages).encode() if opcode == _OPCODE_TEXT else b'', opcode)
+        with self._send_lock:
+            self.wfile.write(data)
+
+    def _emit_bars(self) -> None:
+        # one round of bars per "interval", each closing now.
+        rng = np.random.default_rng(len(self._symbols))
+        rounds = 0
+        time_next = time.monotonic()
+        while not self._closed.is_set():
+            time_next += self.server.interval
+            if self._closed.wait(max(time_next - time.monotonic(), 0)):
+                return
+            t_ns = time.time_ns() - NS_PER_MIN
+            t = f'{np.datetime_as_string(np.datetime64(t_ns, "ns").astype("datetime64[ms]"))}Z'
+            close = np.round(100 + rng.normal(0, 1, len(self._symbols)), 4)
+            bars = [
+                {'T': 'b', 'S': s, 'o': c, 'h': c + 0.05, 'l': c - 0.05, 'c': c, 'v': 100, 't': t}
+                for s, c in zip(self._symbols, close.tolist())
+            ]
+            try:
+                for i in range(0, len(bars), self.server.bars_per_frame):
+                    self._send(bars[i:i + self.server.bars_per_frame])
+            except OSError:
+                return
+            self.server.bars_sent += len(bars)
+            rounds += 1
+            if self.server.take_drop(rounds):
+                # cut the connection without a close frame, like a network failure.
+                self._closed.set()
+                self.connection.shutdown(2)
+                return
+
+    def handle(self) -> None:
+        if not self._handshake():
+            return
+        self.server.connections_num += 1
+        self._send([{'T': 'success', 'msg': 'connected'}])
+        emitter = None
+        try:
+            while not self._closed.is_set():
+                opcode, payload = _read_frame(self.rfile)
+                if opcode == _OPCODE_CLOSE:
+                    self._send([], _OPCODE_CLOSE)
+                    return
+                if opcode == _OPCODE_PING:
+                    self._send([], _OPCODE_PONG)
+                    continue
+                if opcode != _OPCODE_TEXT:
+                    continue
+                message = json.loads(payload)
+                if message.get('action') == 'auth':
+                    self._send([{'T': 'success', 'msg': 'authenticated'}])
+                elif message.get('action') == 'subscribe':
+                    self._symbols = sorted(set(self._symbols) | set(message.get('bars', [])))
+                    self._send([{'T': 'subscription', 'trades': [], 'quotes': [], 'bars': self._symbols}])
+                    if emitter is None:
+                        emitter = threading.Thread(target=self._emit_bars, daemon=True)
+                        emitter.start()
+        except (ConnectionError, OSError):
+            return
+        finally:
+            self._closed.set()
+
+
+class MockAlpacaStreamServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            interval: float = 60.0,
+            drop_after: int = 0,
+            bars_per_frame: int = 1000
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.interval = interval
+        self.drop_after = drop_after
+        self.bars_per_frame = bars_per_frame
+        self.bars_sent = 0
+        self.connections_num = 0
+        self._dropped = False
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'ws://{host}:{port}/v2/iex'
+
+    def take_drop(self, rounds: int) -> bool:
+        # True once, for the connection that should be cut after "drop_after" rounds.
+        with self._lock:
+            if self._dropped or self.drop_after <= 0 or rounds < self.drop_after:
+                return False
+            self._dropped = True
+            return True
+
+    def start(self) -> 'MockAlpacaStreamServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a mock of the realtime bars stream of alpaca.')
+    parser.add_argument('--port', type=int, default=8791)
+    parser.add_argument('--interval', type=float, default=60.0, help='seconds between rounds of bars.')
+    parser.add_argument('--drop-after', type=int, default=0, help='cut the first connection after n rounds.')
+    args = parser.parse_args()
+    server = MockAlpacaStreamServer(port=args.port, interval=args.interval, drop_after=args.drop_after)
+    print(f'Serving "{server.url}"')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Latency from bar close to bars_1min of the realtime ingest, against local stand-ins of the alpaca stream
+and of the historical api (for the gap fill after a dropped connection).
+
+    python -m benchmark.realtime --symbols 3000 --seconds 30 --interval 1 --output bench_realtime.json
+
+Needs "websocket-client" and the MySQL/MariaDB of "DB_*".
+The synthetic symbols are deleted from bars_1min after the run.
+"""
+import argparse
+import json
+import platform
+import threading
+from benchmark.ingest import _get_version
+from benchmark.mock_alpaca import MockAlpacaServer
+from benchmark.mock_alpaca_stream import MockAlpacaStreamServer
+from data_types import QueryType
+from metrics_alpaca.metrics_alpaca import enable_metrics, metrics_to_dict
+from repository.client import get_client_db, ClientMarketData, ClientMarketDataStream
+from repository.market_data_realtime import RepositoryRealtimeBars
+
+
+def run(symbols_num: int, seconds: float, interval: float, drop_after: int, flush_rows: int) -> dict:
+    symbols = [f'RT{i:05d}' for i in range(symbols_num)]
+    server_stream = MockAlpacaStreamServer(interval=interval, drop_after=drop_after).start()
+    server_api = MockAlpacaServer().start()
+    client_db = get_client_db()
+    try:
+        repo = RepositoryRealtimeBars(
+            _client_db=client_db,
+            _client_stream=ClientMarketDataStream(_url=server_stream.url),
+            _client_md=ClientMarketData(_base_url=server_api.url, _client_db=client_db, _api_rate_limit=10 ** 6),
+            _flush_rows=flush_rows
+        )
+        stop = threading.Event()
+        threading.Timer(seconds, stop.set).start()
+        stats = repo.run(symbols, stop)
+    finally:
+        query = client_db.load_query_by_name(QueryType.DELETE, 'bars_1min_symbol')
+        for symbol in symbols:
+            client_db.execute(query, (symbol,))
+        server_stream.stop()
+        server_api.stop()
+    return {
+        'symbols': symbols_num,
+        'seconds': seconds,
+        'interval': interval,
+        'flush_rows': flush_rows,
+        'bars_sent': server_stream.bars_sent,
+        'bars_received': stats.bars_received,
+        'bars_written': stats.bars_written,
+        'bars_gap_filled': stats.bars_gap_filled,
+        'bars_dropped': stats.bars_dropped,
+        'flushes': stats.flushes,
+        'reconnects': stats.reconnects,
+        'latency_sec': stats.get_latency_quantiles()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the latency of the realtime bars ingest.')
+    parser.add_argument('--symbols', type=int, default=3000)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between rounds of bars of the stream.')
+    parser.add_argument('--drop-after', type=int, default=10, help='cut the stream after n rounds, 0 to never.')
+    parser.add_argument('--flush-rows', type=int, default=5000)
+    parser.add_argument('--output', help='write the json here instead of stdout.')
+    args = parser.parse_args()
+    enable_metrics()
+    results = {
+        'version': _get_version(),
+        'python': platform.python_version(),
+        'run': run(args.symbols, args.seconds, args.interval, args.drop_after, args.flush_rows),
+        'metrics': metrics_to_dict()
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
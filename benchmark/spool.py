@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from benchmark.synthetic import generate_bars_page
+from data_types import SpoolFormat
+from repository.bars_columnar import decode_bars_page
+from repository.spool import get_spool, list_spool_pages, read_spool_page
+
+
+def bench_spool(spool_format: SpoolFormat, pages: list) -> dict:
+    spool = get_spool(spool_format)
+    bars_num = sum(len(p['bars']) for p in pages)
+    with tempfile.TemporaryDirectory() as dir_path:
+        time_start = time.perf_counter()
+        for i, page in enumerate(pages):
+            spool.write_page(f'{dir_path}/{i:06d}.{spool.extension}', page, decode_bars_page(page['bars']))
+        time_write = time.perf_counter() - time_start
+        paths = list_spool_pages(dir_path)
+        bytes_total = sum(os.path.getsize(p) for p in paths)
+        time_start = time.perf_counter()
+        for path in paths:
+            read_spool_page(path)
+        time_load = time.perf_counter() - time_start
+    return {
+        'format': spool_format.value,
+        'pages': len(pages),
+        'bars': bars_num,
+        'write_sec': time_write,
+        'load_sec': time_load,
+        'load_bars_per_sec': bars_num / time_load,
+        'bytes_per_bar': bytes_total / bars_num
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load time and size of the spool formats.')
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--bars-per-page', type=int, default=10000)
+    args = parser.parse_args()
+    pages = [
+        generate_bars_page('BENCH', f'2021-01-{i % 28 + 1:02d}T00:00:00', args.bars_per_page, seed=i)
+        for i in range(args.pages)
+    ]
+    results = [bench_spool(spool_format, pages) for spool_format in SpoolFormat]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Time from interpreter start until the repository package is imported and its repositories are constructed.
+Nothing may touch MySQL or the Alpaca api at this point, so this runs without either of them.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+STAGES = {
+    'interpreter': 'pass',
+    'import_repository': 'import repository',
+    'construct_repositories': (
+        'import repository; '
+        'repository.RepositoryMarketData(); '
+        'repository.RepositoryPaperTrade()'
+    )
+}
+
+
+def bench_stage(code: str, runs: int) -> list:
+    times = []
+    for _ in range(runs):
+        time_start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent.parent, check=True)
+        times.append(time.perf_counter() - time_start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark startup time of the repository package.')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    results = []
+    for stage, code in STAGES.items():
+        times = bench_stage(code, args.runs)
+        results.append({
+            'stage': stage,
+            'runs': args.runs,
+            'median_ms': statistics.median(times) * 1000,
+            'min_ms': min(times) * 1000
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
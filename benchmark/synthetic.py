@@ -0,0 +1,50 @@
+import numpy as np
+from datetime import datetime, timedelta
+from repository.bars_columnar import epoch_ns_to_datetime_str
+
+NS_PER_MIN = 60 * 10 ** 9
+
+
+def generate_bars_columns(start: str, bars_num: int, seed: int = 0) -> dict:
+    """
+    Deterministic random walk of 1 minute OHLCV bars starting at "start" (UTC).
+    """
+    rng = np.random.default_rng(seed)
+    t0 = int(np.datetime64(start, 'ns').astype(np.int64))
+    t = t0 + np.arange(bars_num, dtype=np.int64) * NS_PER_MIN
+    close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.001, bars_num))), 4)
+    open_ = np.round(np.concatenate(([close[0]], close[:-1])), 4)
+    spread = np.round(np.abs(rng.normal(0, 0.05, bars_num)), 4)
+    return {
+        't': t,
+        'o': open_,
+        'h': np.maximum(open_, close) + spread,
+        'l': np.minimum(open_, close) - spread,
+        'c': close,
+        'v': rng.integers(1, 100000, bars_num, dtype=np.uint32)
+    }
+
+
+def columns_to_api_bars(columns: dict) -> list:
+    # the shape of "bars" in an alpaca api response.
+    times = epoch_ns_to_datetime_str(columns['t'], sep='T')
+    return [
+        {'t': f'{t}Z', 'o': o, 'h': h, 'l': l, 'c': c, 'v': v}
+        for t, o, h, l, c, v in zip(
+            times.tolist(),
+            columns['o'].tolist(),
+            columns['h'].tolist(),
+            columns['l'].tolist(),
+            columns['c'].tolist(),
+            columns['v'].tolist()
+        )
+    ]
+
+
+def generate_bars_page(symbol: str, start: str, bars_num: int = 10000, seed: int = 0) -> dict:
+    next_page_token = f'{symbol}_{(datetime.fromisoformat(start) + timedelta(minutes=bars_num)).isoformat()}'
+    return {
+        'bars': columns_to_api_bars(generate_bars_columns(start, bars_num, seed)),
+        'symbol': symbol,
+        'next_page_token': next_page_token
+    }
@@ -2,3 +2,7 @@ from data_types.price_data_category import PriceDataCategory
 from data_types.market_data_category import MarketDataCategory
 from data_types.time_frame import TimeFrame
 from data_types.query_type import QueryType
+from data_types.spool_format import SpoolFormat
+from data_types.bulk_insert_mode import BulkInsertMode
+from data_types.trading_session import TradingSession
+from data_types.db_backend import DBBackend
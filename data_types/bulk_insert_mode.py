@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class BulkInsertMode(Enum):
+    UPSERT = 'upsert'
+    LOAD_DATA = 'load_data'
@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class DBBackend(Enum):
+    MYSQL = 'mysql'
+    DUCKDB = 'duckdb'
@@ -8,3 +8,5 @@ class QueryType(Enum):
     DELETE = 'delete'
     CREATE = 'create'
     COUNT = 'count'
+    ALTER = 'alter'
+    DROP = 'drop'
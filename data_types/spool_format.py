@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class SpoolFormat(Enum):
+    NPZ = 'npz'
+    YAML = 'yaml'
@@ -5,3 +5,5 @@ class TimeFrame(Enum):
     MIN = '1Min'
     HOUR = '1Hour'
     DAY = '1Day'
+    # quotes and trades are not aggregated.
+    TICK = 'tick'
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class TradingSession(Enum):
+    # 09:30-16:00 America/New_York
+    REGULAR = 'regular'
+    # 04:00-20:00 America/New_York, pre-market and after-hours included.
+    EXTENDED = 'extended'
@@ -1,3 +1,4 @@
 from .alpaca_api_rate_limit import AlpacaApiRateLimit
 from .fail_download_price_data import FailDownloadPriceData
 from .not_exist_sql_file import NotExistSqlFile
+from .stream_disconnected import StreamDisconnected
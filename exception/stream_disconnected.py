@@ -0,0 +1,2 @@
+class StreamDisconnected(Exception):
+    pass
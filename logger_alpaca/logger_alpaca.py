@@ -1,16 +1,33 @@
 import json
+import threading
 from pathlib import Path
 from logging import config, getLogger, Logger
 
+_config_lock = threading.Lock()
+_configured = False
+
+
+def configure_logging() -> None:
+    """
+    Apply "logging.json" once per process.
+    The file handler opens "app.log" with mode "w", so configuring again would truncate it.
+    """
+    global _configured
+    with _config_lock:
+        if _configured:
+            return
+        log_file_name = 'app.log'
+        parent_path = Path(__file__).parent
+        log_conf_name = 'logging.json'
+        with open(f'{parent_path}/{log_conf_name}', 'r') as f:
+            cnf = json.load(f)
+        cnf['handlers']['logFileHandler']['filename'] = f'{parent_path}/{log_file_name}'
+        config.dictConfig(cnf)
+        _configured = True
+
 
 def get_logger(logger_name: str) -> Logger:
-    log_file_name = 'app.log'
-    parent_path = Path(__file__).parent
-    log_conf_name = 'logging.json'
-    with open(f'{parent_path}/{log_conf_name}', 'r') as f:
-        cnf = json.load(f)
-    cnf['handlers']['logFileHandler']['filename'] = f'{parent_path}/{log_file_name}'
-    config.dictConfig(cnf)
+    configure_logging()
     return getLogger(logger_name)
 
 
@@ -1,4 +1,6 @@
-from repository import RepositoryMarketData
+from repository import RepositoryMarketData, RepositoryPaperTrade
+from repository.client import get_client_db
+from repository.resample import ResampleBars
 
 
 symbols = [
@@ -15,9 +17,21 @@ symbols = [
     'AMT',
 ]
 
+client_db = get_client_db()
+# new and delisted assets of the api, before the download progress is read.
+repository_pt = RepositoryPaperTrade(_client_db=client_db)
+repository_pt.create_tables()
+repository_pt.sync_assets()
+
 repo = RepositoryMarketData(
-    _end_time='2021-06-05'
+    _end_time='2021-06-05',
+    _client_db=client_db,
+    _repository_pt=repository_pt
 )
 
-for symbol in symbols:
-    repo.update_bars_in_db(symbol)
+# symbols downloaded until the same recent date share multi-symbol requests,
+# the ones far behind are downloaded one by one.
+repo.update_bars_in_db_batched(symbols)
+
+# hour and day bars are built from bars_1min, not downloaded.
+ResampleBars().update(symbols)
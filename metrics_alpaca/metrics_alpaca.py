@@ -0,0 +1,210 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# seconds, from a fast decode of one page to a slow backfill request.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _State:
+    # metrics are recorded only while enabled. checked first in every hot call, so disabled costs one lookup.
+    enabled = os.getenv('METRICS_ENABLED', '0') == '1'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1.0) -> None:
+        if not _State.enabled:
+            return
+        with self._lock:
+            self.value += value
+
+    def to_dict(self) -> dict:
+        return {'value': self.value}
+
+    def to_prometheus(self) -> list:
+        return [f'{self.name} {self.value}']
+
+
+class Span:
+    """
+    Context manager observing the elapsed seconds of the block into a histogram.
+    """
+
+    def __init__(self, histogram: 'Histogram') -> None:
+        self._histogram = histogram
+        self._time_start = 0.0
+
+    def __enter__(self) -> 'Span':
+        self._time_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._time_start)
+
+
+class _NullSpan:
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # the last count is of values above every bucket (+Inf).
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        if not _State.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def span(self):
+        return Span(self) if _State.enabled else _NULL_SPAN
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'buckets': {str(le): n for le, n in zip(self.buckets + ('+Inf',), self.counts)}
+        }
+
+    def to_prometheus(self) -> list:
+        lines = []
+        cumulative = 0
+        for le, n in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f'{self.name}_sum {self.sum}')
+        lines.append(f'{self.name}_count {self.count}')
+        return lines
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _get_or_create(cls, name: str, *args):
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = cls(name, *args)
+        metric = _metrics[name]
+    if not isinstance(metric, cls):
+        raise ValueError(f'Metric "{name}" is already registered as {metric.kind}.')
+    return metric
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _get_or_create(Counter, name, help_text)
+
+
+def histogram(name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, help_text, buckets)
+
+
+def enable_metrics(enabled: bool = True) -> None:
+    _State.enabled = enabled
+
+
+def is_metrics_enabled() -> bool:
+    return _State.enabled
+
+
+def metrics_to_dict() -> dict:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {m.name: {'type': m.kind, **m.to_dict()} for m in metrics}
+
+
+def metrics_to_prometheus() -> str:
+    # Prometheus text exposition format 0.0.4
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for m in metrics:
+        lines.append(f'# HELP {m.name} {m.help_text}')
+        lines.append(f'# TYPE {m.name} {m.kind}')
+        lines.extend(m.to_prometheus())
+    return '\n'.join(lines) + '\n'
+
+
+def dump_metrics_json(path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(metrics_to_dict(), f, indent=2)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == '/metrics':
+            body = metrics_to_prometheus().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(metrics_to_dict()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # scrapes are not logged.
+        return None
+
+
+def start_metrics_server(port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serve "/metrics" (Prometheus text) and "/metrics.json" in a daemon thread, and enable metrics.
+    Only on the loopback by default, pass host "0.0.0.0" to let a scraper on another box read it.
+    """
+    enable_metrics()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_metric(name: str) -> Optional[object]:
+    with _metrics_lock:
+        return _metrics.get(name)
+
+
+if __name__ == '__main__':
+    enable_metrics()
+    with histogram('example_seconds', 'Example span.').span():
+        counter('example_total', 'Example counter.').inc()
+    print(metrics_to_prometheus())
@@ -0,0 +1,216 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy as np
+from dataclasses import dataclass, field
+from functools import partial
+from logging import Logger
+from pathlib import Path
+from typing import Optional
+from data_types import TimeFrame
+from repository.bars_columnar import BARS_COLUMNS_DTYPE, concat_bars_columns
+from logger_alpaca.logger_alpaca import get_logger
+
+
+@dataclass
+class CachedBars:
+    # read-only memory-mapped columns
+    columns: dict
+    until: Optional[str]
+
+
+@dataclass
+class CacheBars:
+    """
+    Read-through cache of bars columns in ".npy" files, one directory per (symbol, time_frame):
+    "{time_frame}/{symbol}/{version}/{t,o,h,l,c,v}.npy" and "meta.json" holding the "until" watermark
+    of market_data_dl_progress the columns are complete for and the version directory holding them.
+    A write fills a new version directory and swaps "meta.json" by rename, so readers of any process
+    see all columns of one version. Columns are loaded with mmap, so reads copy nothing.
+    The least recently used directories are evicted when the total size exceeds "_max_bytes".
+    The total is counted by the writes of this process and scanned again every "_rescan_seconds",
+    since other processes write to the cache too. The entry just written is never evicted.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _cache_dir: str = f'{Path(__file__).parent}/../cache_data/bars'
+    _max_bytes: int = 4 * 1024 ** 3
+    _meta_name = 'meta.json'
+    # reads of a version removed by a concurrent write, before the entry is treated as missing.
+    _read_retries: int = 3
+    _rescan_seconds: float = 300.0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.RLock()
+        # size of the cache as of the last scan plus the writes since, None until the first scan.
+        self._bytes_total = None
+        self._time_scanned = 0.0
+
+    def _get_dir(self, symbol: str, time_frame: TimeFrame) -> str:
+        return f'{self._cache_dir}/{time_frame.value}/{symbol}'
+
+    def _read_meta(self, dir_path: str) -> Optional[dict]:
+        try:
+            with open(f'{dir_path}/{self._meta_name}', 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get(self, symbol: str, time_frame: TimeFrame) -> Optional[CachedBars]:
+        dir_path = self._get_dir(symbol, time_frame)
+        with self._lock:
+            for _ in range(self._read_retries):
+                meta = self._read_meta(dir_path)
+                # entries written before versions are rebuilt.
+                if meta is None or 'version' not in meta:
+                    return None
+                try:
+                    columns = {
+                        k: np.load(f'{dir_path}/{meta["version"]}/{k}.npy', mmap_mode='r')
+                        for k in BARS_COLUMNS_DTYPE.keys()
+                    }
+                    # mtime of meta is the last access time used by eviction.
+                    os.utime(f'{dir_path}/{self._meta_name}')
+                except FileNotFoundError:
+                    # replaced or evicted by another process meanwhile.
+                    continue
+                return CachedBars(columns, meta['until'])
+        return None
+
+    def _remove_stale_versions(self, dir_path: str, version: str) -> None:
+        # readers holding mmaps of an old version keep its files until they are closed.
+        for p in Path(dir_path).iterdir():
+            if p.name == self._meta_name or p.name == version:
+                continue
+            if p.is_dir():
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                p.unlink(missing_ok=True)
+
+    @staticmethod
+    def _get_size(dir_path: str) -> int:
+        size = 0
+        for p in Path(dir_path).rglob('*'):
+            try:
+                if p.is_file():
+                    size += p.stat().st_size
+            except FileNotFoundError:
+                # removed by another process meanwhile.
+                continue
+        return size
+
+    def _add_bytes(self, size: int) -> None:
+        if self._bytes_total is not None:
+            self._bytes_total += size
+
+    def put(self, symbol: str, time_frame: TimeFrame, columns: dict, until: Optional[str]) -> None:
+        dir_path = self._get_dir(symbol, time_frame)
+        version = uuid.uuid4().hex
+        with self._lock:
+            size_prev = self._get_size(dir_path)
+            os.makedirs(f'{dir_path}/{version}')
+            for k, dtype in BARS_COLUMNS_DTYPE.items():
+                np.save(f'{dir_path}/{version}/{k}.npy', np.ascontiguousarray(columns[k], dtype=dtype))
+            path_tmp = f'{dir_path}/{self._meta_name}.{version}.tmp'
+            with open(path_tmp, 'w') as f:
+                json.dump({'until': until, 'bars': int(len(columns['t'])), 'version': version}, f)
+            os.replace(path_tmp, f'{dir_path}/{self._meta_name}')
+            self._remove_stale_versions(dir_path, version)
+            self._add_bytes(self._get_size(dir_path) - size_prev)
+            if (
+                self._bytes_total is None
+                or self._bytes_total > self._max_bytes
+                or time.monotonic() - self._time_scanned > self._rescan_seconds
+            ):
+                self.evict(dir_path)
+
+    def extend(self, symbol: str, time_frame: TimeFrame, columns: dict, until: Optional[str]) -> None:
+        """
+        Append bars newer than the cached ones and move the watermark to "until".
+        Bars at or before the last cached one may overwrite cached bars or fill a gap, which can not
+        be appended, so the entry is invalidated instead and the next read loads the symbol from db.
+        """
+        with self._lock:
+            cached = self.get(symbol, time_frame)
+            if cached is None:
+                self.put(symbol, time_frame, columns, until)
+                return
+            if self._is_before_end(cached.columns, columns):
+                self.invalidate(symbol, time_frame)
+                return
+            self.put(symbol, time_frame, concat_bars_columns([cached.columns, columns]), until)
+
+    def extend_if_cached(
+            self,
+            symbol: str,
+            time_frame: TimeFrame,
+            columns: dict,
+            until: Optional[str],
+            until_prev: Optional[str]
+    ) -> None:
+        """
+        Called on ingest, symbols that were never read are not cached.
+        Extended only when the cache is complete until "until_prev" (the progress before "columns"),
+        otherwise the bars after the cached ones are read from db on the next read,
+        and the entry is invalidated if "columns" reach back into the cached ones.
+        """
+        with self._lock:
+            meta = self._read_meta(self._get_dir(symbol, time_frame))
+            if meta is None:
+                return
+            if meta['until'] == until_prev:
+                self.extend(symbol, time_frame, columns, until)
+                return
+            cached = self.get(symbol, time_frame)
+            if cached is not None and self._is_before_end(cached.columns, columns):
+                self.invalidate(symbol, time_frame)
+
+    @staticmethod
+    def _is_before_end(columns_cached: dict, columns: dict) -> bool:
+        # any bar of "columns" at or before the last cached bar.
+        if len(columns_cached['t']) == 0 or len(columns['t']) == 0:
+            return False
+        return columns['t'].min() <= columns_cached['t'][-1]
+
+    def invalidate(self, symbol: str, time_frame: TimeFrame) -> None:
+        # for bars written at or before the cached ones, which can not be appended.
+        dir_path = self._get_dir(symbol, time_frame)
+        with self._lock:
+            self._add_bytes(-self._get_size(dir_path))
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+    def _list_entries(self) -> list:
+        # [(last access, bytes, dir_path), ...]
+        entries = []
+        for meta_path in Path(self._cache_dir).glob(f'*/*/{self._meta_name}'):
+            dir_path = meta_path.parent
+            try:
+                entries.append((meta_path.stat().st_mtime, self._get_size(str(dir_path)), str(dir_path)))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def evict(self, dir_path_keep: Optional[str] = None) -> int:
+        """
+        Scan the cache and remove the least recently used entries until it fits in "_max_bytes",
+        except the entry in "dir_path_keep". Returns the number of removed entries.
+        """
+        with self._lock:
+            entries = sorted(self._list_entries())
+            bytes_total = sum(e[1] for e in entries)
+            evicted_num = 0
+            for _, size, dir_path in entries:
+                if bytes_total <= self._max_bytes:
+                    break
+                if dir_path_keep is not None and Path(dir_path) == Path(dir_path_keep):
+                    continue
+                shutil.rmtree(dir_path, ignore_errors=True)
+                bytes_total -= size
+                evicted_num += 1
+            self._bytes_total = bytes_total
+            self._time_scanned = time.monotonic()
+            if evicted_num:
+                self._logger.debug(f'Evicted {evicted_num} bars cache entries. bytes: {bytes_total}')
+        return evicted_num
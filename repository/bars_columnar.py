@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+# typed columns of bars. time is epoch nanoseconds in UTC.
+BARS_COLUMNS_DTYPE = {
+    't': np.int64,
+    'o': np.float64,
+    'h': np.float64,
+    'l': np.float64,
+    'c': np.float64,
+    'v': np.uint32
+}
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+
+
+def to_epoch_ns(times: list) -> np.ndarray:
+    """
+    Parse RFC3339 timestamps of alpaca api ("2021-06-01T08:00:00Z") in one vectorized call.
+    """
+    return pd.to_datetime(times, format='ISO8601', utc=True).as_unit('ns').asi8
+
+
+def epoch_ns_to_datetime_str(t: np.ndarray, sep: str = ' ') -> np.ndarray:
+    """
+    Format epoch nanoseconds as "YYYY-mm-dd HH:MM:SS" (mysql datetime) in one vectorized call.
+    """
+    return np.char.replace(np.datetime_as_string(t.astype('datetime64[ns]').astype('datetime64[s]')), 'T', sep)
+
+
+def empty_bars_columns() -> dict:
+    return {k: np.empty(0, dtype=dtype) for k, dtype in BARS_COLUMNS_DTYPE.items()}
+
+
+def decode_bars_page(bars: list) -> dict:
+    """
+    Convert "bars" of a page of alpaca api ([{'t': ..., 'o': ..., ...}, ...]) into typed columns.
+    """
+    if not bars:
+        return empty_bars_columns()
+    columns = {'t': to_epoch_ns([b['t'] for b in bars])}
+    for k in ('o', 'h', 'l', 'c', 'v'):
+        columns[k] = np.fromiter((b[k] for b in bars), dtype=BARS_COLUMNS_DTYPE[k], count=len(bars))
+    return columns
+
+
+def concat_bars_columns(columns_list: list) -> dict:
+    """
+    Merge columns of pages into one set sorted ascending by time.
+    Bars with the same time (overlap of page boundaries) are dropped except the first one.
+    """
+    if not columns_list:
+        return empty_bars_columns()
+    columns = {k: np.concatenate([c[k] for c in columns_list]) for k in BARS_COLUMNS_DTYPE.keys()}
+    order = np.argsort(columns['t'], kind='stable')
+    t_sorted = columns['t'][order]
+    is_unique = np.empty(len(t_sorted), dtype=bool)
+    is_unique[:1] = True
+    np.not_equal(t_sorted[1:], t_sorted[:-1], out=is_unique[1:])
+    order = order[is_unique]
+    return {k: v[order] for k, v in columns.items()}
+
+
+def slice_bars_columns(columns: dict, start: int = None, stop: int = None) -> dict:
+    return {k: v[start:stop] for k, v in columns.items()}
+
+
+def split_bars_columns_at_last_day(columns: dict) -> tuple:
+    """
+    Split sorted columns into (bars of complete days, bars of the last day).
+    The last day may still continue on the next page, so it is held back.
+    """
+    days = columns['t'] // NS_PER_DAY
+    if len(days) == 0:
+        return columns, columns
+    cut = int(np.searchsorted(days, days[-1], side='left'))
+    return slice_bars_columns(columns, stop=cut), slice_bars_columns(columns, start=cut)
+
+
+def bars_columns_from_rows(rows: list) -> dict:
+    """
+    Convert rows of "select/bars_1min.sql" ((time, symbol, open, high, low, close, volume), ...) into columns.
+    """
+    if not rows:
+        return empty_bars_columns()
+    times, _, o, h, l, c, v = zip(*rows)
+    return {
+        't': np.array(times, dtype='datetime64[ns]').astype(np.int64),
+        'o': np.array(o, dtype=np.float64),
+        'h': np.array(h, dtype=np.float64),
+        'l': np.array(l, dtype=np.float64),
+        'c': np.array(c, dtype=np.float64),
+        'v': np.array(v, dtype=np.uint32)
+    }
+
+
+def bars_columns_to_lines(symbol: str, columns: dict) -> list:
+    """
+    Rows for "insert/bars_1min.sql". [(time, symbol, open, high, low, close, volume), ...]
+    """
+    return list(zip(
+        epoch_ns_to_datetime_str(columns['t']).tolist(),
+        [symbol] * len(columns['t']),
+        columns['o'].tolist(),
+        columns['h'].tolist(),
+        columns['l'].tolist(),
+        columns['c'].tolist(),
+        columns['v'].tolist()
+    ))
+
+
+def bars_rows_to_df(rows: list) -> pd.DataFrame:
+    """
+    DataFrame of rows of several symbols, with typed numpy columns instead of object rows.
+    """
+    columns = bars_columns_from_rows(rows)
+    symbols = np.array([r[1] for r in rows], dtype=object)
+    return pd.DataFrame({
+        'time': columns['t'].astype('datetime64[ns]'),
+        'symbol': symbols,
+        'open': columns['o'],
+        'high': columns['h'],
+        'low': columns['l'],
+        'close': columns['c'],
+        'volume': columns['v']
+    })
+
+
+def build_panel(series: dict, field_names: tuple) -> pd.DataFrame:
+    """
+    Wide DataFrame (index: time, columns: (field, symbol)) from per-symbol arrays.
+    series: {symbol: {'t': int64 array, field: array, ...}}
+    Times a symbol has no bar at are NaN.
+    """
+    symbols = list(series.keys())
+    if symbols:
+        times = np.unique(np.concatenate([series[s]['t'] for s in symbols]))
+    else:
+        times = np.empty(0, dtype=np.int64)
+    panel = {}
+    for field_name in field_names:
+        values = np.full((len(times), len(symbols)), np.nan)
+        for i, symbol in enumerate(symbols):
+            values[np.searchsorted(times, series[symbol]['t']), i] = series[symbol][field_name]
+        panel[field_name] = values
+    return pd.concat(
+        {f: pd.DataFrame(v, index=times.astype('datetime64[ns]'), columns=symbols) for f, v in panel.items()},
+        axis=1
+    ).rename_axis(index='time', columns=('field', 'symbol'))
+
+
+def bars_columns_to_df(symbol: str, columns: dict) -> pd.DataFrame:
+    # same columns as "select/bars_1min.sql", built from typed arrays without object rows.
+    return pd.DataFrame({
+        'time': columns['t'].astype('datetime64[ns]'),
+        'symbol': symbol,
+        'open': columns['o'],
+        'high': columns['h'],
+        'low': columns['l'],
+        'close': columns['c'],
+        'volume': columns['v']
+    })
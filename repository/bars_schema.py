@@ -0,0 +1,209 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import partial
+from logging import Logger
+from repository.client import ClientDB, get_client_db
+from data_types import QueryType
+from logger_alpaca.logger_alpaca import get_logger
+
+# version 1: PRIMARY KEY (time, symbol), one partition.
+# version 2: PRIMARY KEY (symbol, time), monthly range partitions, compressed rows.
+BARS_SCHEMA_VERSION = 2
+MIGRATION_TRIGGER_EVENTS = ('insert', 'update', 'delete')
+
+
+def _add_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + d.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def build_month_partitions(month_start: date, month_end: date, with_future: bool = True) -> str:
+    """
+    "PARTITION pYYYYMM VALUES LESS THAN ('YYYY-MM-01')" for each month in [month_start, month_end].
+    """
+    partitions = []
+    month = date(month_start.year, month_start.month, 1)
+    while month <= month_end:
+        month_next = _add_months(month, 1)
+        partitions.append(f"    PARTITION p{month:%Y%m} VALUES LESS THAN ('{month_next:%Y-%m-%d}')")
+        month = month_next
+    if with_future:
+        partitions.append('    PARTITION p_future VALUES LESS THAN (MAXVALUE)')
+    return ',\n'.join(partitions)
+
+
+@dataclass
+class SchemaBarsMin:
+    """
+    Versioned schema of bars_1min and its online migration from version 1.
+    Version 2 is clustered on (symbol, time), so a symbol's history is one range scan.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    _tbl_name: str = 'bars_1min'
+    _tbl_name_migration: str = 'schema_migration'
+    _start_time: str = '2016-01-01'
+    _months_ahead: int = 12
+    _copy_chunk: int = 200000
+
+    def _table_new(self) -> str:
+        return f'{self._tbl_name}_v{BARS_SCHEMA_VERSION}'
+
+    def _table_legacy(self) -> str:
+        return f'{self._tbl_name}_v1'
+
+    def get_version(self, table_name: str = None) -> int:
+        # 0 if the table does not exist.
+        query = self._client_db.load_query_by_name(QueryType.SELECT, 'primary_key_columns')
+        columns = [r[0] for r in self._client_db.fetch_all(query, (table_name or self._tbl_name,))]
+        if not columns:
+            return 0
+        return 2 if columns[0] == 'symbol' else 1
+
+    def create_table(self, table_name: str = None) -> None:
+        month_start = datetime.strptime(self._start_time, '%Y-%m-%d').date()
+        month_end = _add_months(date.today(), self._months_ahead)
+        query = self._client_db.load_query_by_name(QueryType.CREATE, f'{self._tbl_name}_v{BARS_SCHEMA_VERSION}')
+        self._client_db.execute(query.format(
+            table=table_name or self._tbl_name,
+            partitions=build_month_partitions(month_start, month_end)
+        ))
+
+    def add_future_partitions(self) -> int:
+        """
+        Split "p_future" so that monthly partitions exist until "_months_ahead" months from today.
+        Returns the number of added partitions, 0 on a backend without partitions.
+        """
+        if not self._client_db.supports_partitions:
+            return 0
+        query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_partitions')
+        names = [r[0] for r in self._client_db.fetch_all(query, (self._tbl_name,)) if r[0] != 'p_future']
+        month_last = datetime.strptime(max(names)[1:], '%Y%m').date()
+        month_end = _add_months(date.today(), self._months_ahead)
+        if month_end <= month_last:
+            return 0
+        query = self._client_db.load_query_by_name(QueryType.ALTER, f'{self._tbl_name}_add_partitions')
+        partitions = build_month_partitions(_add_months(month_last, 1), month_end)
+        self._client_db.execute(query.format(table=self._tbl_name, partitions=partitions))
+        return partitions.count('PARTITION p') - 1
+
+    def _load_migration(self) -> tuple:
+        """
+        (position, completed) of the migration. position is the last copied (time, symbol).
+        """
+        self._client_db.execute(self._client_db.load_query_by_name(QueryType.CREATE, self._tbl_name_migration))
+        query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_migration)
+        row = self._client_db.fetch_one(query, (self._tbl_name, BARS_SCHEMA_VERSION))
+        if row is None or row[0] is None:
+            return ('1000-01-01 00:00:00', ''), False
+        time_position, symbol_position = row[0].split('|', 1)
+        return (time_position, symbol_position), row[1] is not None
+
+    def _save_position(self, position: tuple, completed: bool = False) -> None:
+        query = self._client_db.load_query_by_name(QueryType.INSERT, f'{self._tbl_name_migration}_upsert')
+        self._client_db.execute(query, (
+            self._tbl_name,
+            BARS_SCHEMA_VERSION,
+            f'{position[0]}|{position[1]}',
+            datetime.utcnow() if completed else None
+        ))
+
+    def _trigger_name(self, event: str) -> str:
+        return f'{self._tbl_name}_migrate_{event}'
+
+    def _create_triggers(self, src: str, dst: str) -> None:
+        """
+        Triggers that apply every insert, update and delete of "src" to "dst" as well,
+        so writes during the copy reach the new table whatever their key, older times and
+        upserts of already copied rows included. Triggers left by an interrupted run are kept.
+        """
+        query = self._client_db.load_query_by_name(QueryType.SELECT, 'table_triggers')
+        existing = {r[0] for r in self._client_db.fetch_all(query, (src,))}
+        for event in MIGRATION_TRIGGER_EVENTS:
+            name = self._trigger_name(event)
+            if name in existing:
+                continue
+            query = self._client_db.load_query_by_name(QueryType.CREATE, f'{self._tbl_name}_migrate_{event}')
+            self._client_db.execute(query.format(trigger=name, table=src, table_new=dst))
+
+    def _drop_triggers(self) -> None:
+        query = self._client_db.load_query_by_name(QueryType.DROP, f'{self._tbl_name}_migrate_trigger')
+        for event in MIGRATION_TRIGGER_EVENTS:
+            self._client_db.execute(query.format(trigger=self._trigger_name(event)))
+
+    def _copy_chunks(self, src: str, dst: str, position: tuple) -> tuple:
+        """
+        Copy rows of "src" after "position" ((time, symbol) of version 1 key order) to "dst",
+        committing every "_copy_chunk" rows. Returns the last saved position.
+        Keys are only compared by db, in the collation of the table.
+        Rows already in "dst" were written by the triggers and are newer, so they are kept.
+        """
+        q_boundary = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_chunk_boundary')
+        q_copy = self._client_db.load_query_by_name(QueryType.INSERT, f'{self._tbl_name}_copy_chunk')
+        q_copy_tail = self._client_db.load_query_by_name(QueryType.INSERT, f'{self._tbl_name}_copy_tail')
+        q_boundary = q_boundary.format(table=src)
+        q_copy = q_copy.format(src=src, dst=dst)
+        q_copy_tail = q_copy_tail.format(src=src, dst=dst)
+        copied_num = 0
+        while True:
+            boundary = self._client_db.fetch_one(q_boundary, (*position, self._copy_chunk - 1))
+            with self._client_db.cursor() as cur:
+                if boundary is None:
+                    # less than a chunk is left, later rows are written by the triggers.
+                    cur.execute(q_copy_tail, position)
+                else:
+                    cur.execute(q_copy, (*position, str(boundary[0]), boundary[1]))
+                copied_num += cur.rowcount
+            if boundary is None:
+                self._logger.debug('Copied bars. copied: %d', copied_num)
+                return position
+            position = (str(boundary[0]), boundary[1])
+            self._save_position(position)
+            self._logger.debug('Copied bars chunk. position: %s, copied: %d', position, copied_num)
+
+    def migrate(self) -> None:
+        """
+        Online migration from version 1:
+        triggers on the table write every change to "{table}_v2" too, while the existing rows are copied
+        in committed chunks (resumable), then the tables are swapped atomically and the triggers dropped.
+        Ingest may keep running. Needs the TRIGGER privilege
+        (and "log_bin_trust_function_creators" when binary logging is on without SUPER).
+        """
+        time_start = datetime.now()
+        position, completed = self._load_migration()
+        version = self.get_version()
+        if version == BARS_SCHEMA_VERSION and (completed or self.get_version(self._table_legacy()) == 0):
+            self._logger.info(f'Table "{self._tbl_name}" is already version {BARS_SCHEMA_VERSION}.')
+            return
+        if version != BARS_SCHEMA_VERSION:
+            table_new = self._table_new()
+            self.create_table(table_new)
+            self._create_triggers(self._tbl_name, table_new)
+            position = self._copy_chunks(self._tbl_name, table_new, position)
+            query = self._client_db.load_query_by_name(QueryType.ALTER, f'{self._tbl_name}_swap')
+            self._client_db.execute(query.format(
+                table=self._tbl_name,
+                table_legacy=self._table_legacy(),
+                table_new=table_new
+            ))
+        # the triggers moved to the legacy table with the swap, writes go to the new table now.
+        self._drop_triggers()
+        self._save_position(position, completed=True)
+        self._logger.info((
+            f'Migrated "{self._tbl_name}" to version {BARS_SCHEMA_VERSION}. '
+            f'Legacy table: "{self._table_legacy()}", time: "{datetime.now() - time_start}"'
+        ))
+
+    def get_table_size(self, table_name: str = None) -> dict:
+        query = self._client_db.load_query_by_name(QueryType.SELECT, 'table_size')
+        data_length, index_length, rows = self._client_db.fetch_one(query, (table_name or self._tbl_name,))
+        return {'data_bytes': data_length, 'index_bytes': index_length, 'rows': rows}
+
+
+def main():
+    schema = SchemaBarsMin()
+    print(schema.get_version())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+from repository.spool import list_spool_pages, read_spool_page
+
+JOURNAL_NAME = '_journal.json'
+
+
+@dataclass
+class JournalPage:
+    # file name in the download directory.
+    file: str
+    next_page_token: Optional[str]
+    bars: int
+    size: int
+
+
+@dataclass
+class DownloadJournal:
+    """
+    Checkpoint of a download directory: the pages written so far in request order.
+    Each page file is renamed into place before the journal names it, and the journal itself
+    is replaced by rename, so it only ever lists complete files.
+    The download is complete when the last page has no "next_page_token".
+    """
+    dir_path: str
+    pages: list = field(default_factory=list)
+
+    @classmethod
+    def load(cls, dir_path: str) -> 'DownloadJournal':
+        try:
+            with open(f'{dir_path}/{JOURNAL_NAME}', 'r') as f:
+                pages = json.load(f)['pages']
+        except FileNotFoundError:
+            return cls(dir_path)
+        return cls(dir_path, [JournalPage(**p) for p in pages])
+
+    @staticmethod
+    def exists(dir_path: str) -> bool:
+        return os.path.exists(f'{dir_path}/{JOURNAL_NAME}')
+
+    def save(self) -> None:
+        path = f'{self.dir_path}/{JOURNAL_NAME}'
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'pages': [asdict(p) for p in self.pages]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    @property
+    def completed(self) -> bool:
+        return bool(self.pages) and self.pages[-1].next_page_token is None
+
+    def get_next_page_token(self) -> Optional[str]:
+        # token to resume from, None to start from the head.
+        return self.pages[-1].next_page_token if self.pages else None
+
+    def add_page(self, file: str, next_page_token: Optional[str], bars: int, size: int) -> None:
+        self.pages.append(JournalPage(file, next_page_token, bars, size))
+        self.save()
+
+
+def list_download_pages(dir_path: str) -> list:
+    # pages named by the journal, or every page file of a directory written before journals existed.
+    if DownloadJournal.exists(dir_path):
+        return [f'{dir_path}/{p.file}' for p in DownloadJournal.load(dir_path).pages]
+    return list_spool_pages(dir_path)
+
+
+def _check_page(dir_path: str, page: JournalPage) -> Optional[str]:
+    path = f'{dir_path}/{page.file}'
+    if not os.path.exists(path):
+        return f'missing page "{page.file}"'
+    if os.path.getsize(path) != page.size:
+        return f'truncated page "{page.file}". size: {os.path.getsize(path)}, journal: {page.size}'
+    try:
+        bars_num = len(read_spool_page(path).columns['t'])
+    except Exception as e:
+        return f'unreadable page "{page.file}". {type(e).__name__}: {e}'
+    if bars_num != page.bars:
+        return f'page "{page.file}" has {bars_num} bars, journal: {page.bars}'
+    return None
+
+
+def verify_download_dir(dir_path: str) -> list:
+    """
+    Problems of a download directory: missing, truncated or unreadable pages named by the journal,
+    and an incomplete page chain. An empty list means the directory can be loaded.
+    """
+    if not DownloadJournal.exists(dir_path):
+        problems = []
+        for path in list_spool_pages(dir_path):
+            try:
+                read_spool_page(path)
+            except Exception as e:
+                problems.append(f'unreadable page "{os.path.basename(path)}". {type(e).__name__}: {e}')
+        return problems
+    journal = DownloadJournal.load(dir_path)
+    problems = [p for p in (_check_page(dir_path, page) for page in journal.pages) if p is not None]
+    if not journal.completed:
+        problems.append(f'incomplete, {len(journal.pages)} pages downloaded.')
+    return problems
+
+
+def repair_download_dir(dir_path: str) -> int:
+    """
+    Cut the journal before its first bad page, so the next download resumes from there.
+    Returns the number of dropped pages.
+    """
+    journal = DownloadJournal.load(dir_path)
+    for i, page in enumerate(journal.pages):
+        if _check_page(dir_path, page) is not None:
+            dropped = journal.pages[i:]
+            journal.pages = journal.pages[:i]
+            journal.save()
+            for p in dropped:
+                if os.path.exists(f'{dir_path}/{p.file}'):
+                    os.remove(f'{dir_path}/{p.file}')
+            return len(dropped)
+    return 0
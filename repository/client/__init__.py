@@ -1,4 +1,7 @@
 from .alpaca import ClientAlpaca
 from .db import ClientDB
+from .db_duckdb import ClientDuckDB
+from .db_backend import get_client_db
 from .market_data import ClientMarketData
 from .paper_trade import ClientPaperTrade
+from .market_data_stream import ClientMarketDataStream
@@ -1,17 +1,65 @@
 import os
-from dataclasses import dataclass
+import requests
+import threading
+from dataclasses import dataclass, field
+from functools import partial
 from dotenv import load_dotenv
 from logging import Logger
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from logger_alpaca.logger_alpaca import get_logger
+from metrics_alpaca.metrics_alpaca import counter, histogram
 
 load_dotenv()
 
+_http_request_seconds = histogram('alpaca_http_request_seconds', 'Latency of requests to alpaca api.')
+_http_requests = counter('alpaca_http_requests_total', 'Requests to alpaca api.')
+_http_bytes_wire = counter('alpaca_http_bytes_wire_total', 'Response bytes of alpaca api as transferred.')
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Accumulated per-request stats of a client.
+    "bytes_wire" is the body size as transferred (compressed), "bytes_body" is after decoding.
+    The process-wide totals are also exported by metrics_alpaca when it is enabled.
+    """
+    requests_num: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    bytes_wire: int = 0
+    bytes_body: int = 0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, bytes_wire: int, bytes_body: int) -> None:
+        with self._lock:
+            self.requests_num += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.bytes_wire += bytes_wire
+            self.bytes_body += bytes_body
+        _http_request_seconds.observe(latency)
+        _http_requests.inc()
+        _http_bytes_wire.inc(bytes_wire)
+
 
 @dataclass
 class ClientAlpaca:
     _api_key: str = os.getenv('ALPACA_API_KEY')
     _secret_key: str = os.getenv('ALPACA_SECRET_KEY')
-    _logger: Logger = get_logger(__name__)
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _pool_size: int = 10
+    _max_retries: int = 3
+    _backoff_factor: float = 0.5
+    _backoff_jitter: float = 0.5
+    # (connect, read) seconds, so a stalled connection fails and is retried instead of hanging a worker.
+    _timeout: tuple = (10.0, 60.0)
+    _session: Optional[requests.Session] = None
+    _metrics: RequestMetrics = field(default_factory=RequestMetrics)
+    _session_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
     def get_auth_headers(self) -> dict:
         return {
@@ -19,6 +67,55 @@ class ClientAlpaca:
             "APCA-API-SECRET-KEY": self._secret_key
         }
 
+    def _create_session(self) -> requests.Session:
+        # retry 5xx and connection errors with jittered exponential backoff.
+        # 429 is not retried here, ClientMarketData handles it with the shared token bucket.
+        retry = Retry(
+            total=self._max_retries,
+            connect=self._max_retries,
+            read=self._max_retries,
+            status=self._max_retries,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            backoff_factor=self._backoff_factor,
+            backoff_jitter=self._backoff_jitter,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_size,
+            pool_maxsize=self._pool_size,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.get_auth_headers())
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        # created on first request, and reused so connections are kept alive.
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session()
+        return self._session
+
+    def request_get(self, url: str, params: dict = None) -> requests.Response:
+        r = self.session.get(url, params=params, timeout=self._timeout)
+        # "tell" of the raw response is the number of bytes read from the socket before decoding.
+        bytes_wire = r.raw.tell() if r.raw is not None else len(r.content)
+        self._metrics.record(r.elapsed.total_seconds(), bytes_wire, len(r.content))
+        return r
+
+    def get_metrics(self) -> RequestMetrics:
+        return self._metrics
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
 
 def main():
     client = ClientAlpaca()
@@ -1,32 +1,65 @@
 import os
+import tempfile
+import threading
 import mysql.connector
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+import pandas as pd
 from dotenv import load_dotenv
 from logging import Logger
 from pathlib import Path
+from typing import Iterator, Optional
+from mysql.connector.cursor import MySQLCursor
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection
 from exception import NotExistSqlFile
-from data_types import QueryType
+from data_types import QueryType, BulkInsertMode
 from logger_alpaca.logger_alpaca import get_logger
+from metrics_alpaca.metrics_alpaca import counter, histogram
 
 load_dotenv()
 
+_insert_seconds = histogram('db_bulk_insert_seconds', 'Bulk insert of lines into a table, commits included.')
+_rows_inserted = counter('db_rows_inserted_total', 'Rows sent by bulk inserts.')
+
 
 @dataclass
 class ClientDB:
-    _logger: Logger = get_logger(__name__)
+    """
+    Connections are checked out of a pool created on first use, so a ClientDB is cheap to build
+    and can be shared by threads. Each "cursor()" block is one transaction on its own connection.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
     _user: str = os.getenv('DB_USER')
     _passwd: str = os.getenv('DB_PASSWORD')
     _host: str = os.getenv('DB_HOST')
     _name: str = os.getenv('DB_NAME')
     _sql_dir_name: str = 'sql'
+    # sub directory of "_sql_dir_name" with the queries of this backend that differ from the MySQL ones.
+    _sql_dialect: Optional[str] = None
+    _pool_size: int = 8
+    # share of max_allowed_packet a multi-row insert statement may use.
+    _packet_usage: float = 0.8
+    _load_data_chunk: int = 1000000
+    _max_allowed_packet: int = 0
+    _pool: Optional[MySQLConnectionPool] = field(default=None, repr=False)
 
     def __post_init__(self) -> None:
-        self.conn = self.create_connection()
-        self.cur = self.conn.cursor()
-        self.init_db()
+        self._pool_lock = threading.Lock()
+        # mysql.connector raises when the pool is exhausted, block on this instead.
+        self._pool_slots = threading.BoundedSemaphore(self._pool_size)
+
+    @property
+    def supports_partitions(self) -> bool:
+        return True
 
     def get_sql_file_path(self, query_type: QueryType, file_name: str) -> str:
-        file_path = f'{Path(__file__).parent}/{self._sql_dir_name}/{query_type.value}/{file_name}.sql'
+        sql_dir = f'{Path(__file__).parent}/{self._sql_dir_name}'
+        if self._sql_dialect is not None:
+            file_path = f'{sql_dir}/{self._sql_dialect}/{query_type.value}/{file_name}.sql'
+            if os.path.exists(file_path):
+                return file_path
+        file_path = f'{sql_dir}/{query_type.value}/{file_name}.sql'
         if not os.path.exists(file_path):
             raise NotExistSqlFile(f'Not exist sql file. name: "{query_type.value}/{file_name}.sql"')
         return file_path
@@ -40,23 +73,176 @@ class ClientDB:
         return mysql.connector.connect(
             user=self._user,
             password=self._passwd,
-            host=self._host
+            host=self._host,
+            allow_local_infile=True
         )
 
     def init_db(self) -> None:
-        self.cur.execute(f"CREATE DATABASE IF NOT EXISTS {self._name};")
-        self.cur.execute(f"USE {self._name};")
+        conn = self.create_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"CREATE DATABASE IF NOT EXISTS {self._name};")
+            cur.close()
+        finally:
+            conn.close()
+
+    def get_pool(self) -> MySQLConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self.init_db()
+                self._pool = MySQLConnectionPool(
+                    pool_name=f'alpaca_{id(self)}',
+                    pool_size=self._pool_size,
+                    user=self._user,
+                    password=self._passwd,
+                    host=self._host,
+                    database=self._name,
+                    allow_local_infile=True
+                )
+                self._logger.debug('Created connection pool. size: %d', self._pool_size)
+        return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledMySQLConnection]:
+        pool = self.get_pool()
+        with self._pool_slots:
+            conn = pool.get_connection()
+            try:
+                yield conn
+            finally:
+                # return the connection to the pool.
+                conn.close()
+
+    @contextmanager
+    def cursor(self, **kwargs) -> Iterator[MySQLCursor]:
+        """
+        Transaction on a pooled connection. Committed when the block ends, rolled back on error.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor(**kwargs)
+            try:
+                yield cur
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def execute(self, query: str, params: tuple = None) -> None:
+        with self.cursor() as cur:
+            cur.execute(query, params)
+
+    def fetch_one(self, query: str, params: tuple = None) -> Optional[tuple]:
+        with self.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchone()
+
+    def fetch_all(self, query: str, params: tuple = None) -> list:
+        with self.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+    def fetch_df(self, query: str, params: tuple = None) -> pd.DataFrame:
+        with self.cursor() as cur:
+            cur.execute(query, params)
+            return pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+
+    def fetch_chunks(self, query: str, params: tuple = None, chunksize: int = 100000) -> Iterator[list]:
+        """
+        Stream the result with an unbuffered cursor, "chunksize" rows at a time,
+        so the whole result set is never held in memory.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor(buffered=False)
+            try:
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(chunksize)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                # the rest of an abandoned result must be read before the connection is reused.
+                conn.consume_results()
+                cur.close()
 
     def insert_lines(self, query: str, lines: list) -> None:
         # split lines every 500,000 because of restriction memory limit.
         chunk = 500000
         lines_len = len(lines)
-        self._logger.debug(f"insert num: {lines_len}")
+        self._logger.debug('insert num: %d', lines_len)
         lines_parts = [lines[i:i + chunk] for i in range(0, lines_len, chunk)]
-        for i, l_part in enumerate(lines_parts):
-            self.cur.executemany(query, l_part)
-            self._logger.debug(f"executed query. progress: {i + 1}/{(lines_len // chunk) + 1}")
-        self.conn.commit()
+        with self.cursor() as cur:
+            for i, l_part in enumerate(lines_parts):
+                cur.executemany(query, l_part)
+                self._logger.debug('executed query. progress: %d/%d', i + 1, (lines_len // chunk) + 1)
+
+    def get_max_allowed_packet(self) -> int:
+        if self._max_allowed_packet == 0:
+            self._max_allowed_packet = int(self.fetch_one('SELECT @@max_allowed_packet;')[0])
+        return self._max_allowed_packet
+
+    def get_adaptive_chunk(self, lines: list) -> int:
+        """
+        Number of rows of a multi-row insert that fits in max_allowed_packet.
+        The row size is estimated from a sample of the lines.
+        """
+        sample = lines[:1000]
+        if not sample:
+            return 1
+        # each value is quoted and separated by ", ", each row is wrapped by "(...),"
+        bytes_row = sum(sum(len(str(v)) + 4 for v in row) + 3 for row in sample) / len(sample)
+        # headroom for rows longer than the sample average
+        return max(1, int(self.get_max_allowed_packet() * self._packet_usage / (bytes_row * 1.5)))
+
+    def insert_lines_chunked(self, query: str, lines: list) -> None:
+        """
+        executemany in chunks sized from max_allowed_packet, committing each chunk.
+        For "INSERT ... VALUES(...)" queries mysql.connector sends each chunk as one multi-row statement.
+        """
+        chunk = self.get_adaptive_chunk(lines)
+        lines_len = len(lines)
+        chunks_num = -(-lines_len // chunk)
+        with self.connection() as conn:
+            cur = conn.cursor()
+            for i in range(chunks_num):
+                cur.executemany(query, lines[i * chunk:(i + 1) * chunk])
+                conn.commit()
+                self._logger.debug('committed chunk. rows: %d, progress: %d/%d', chunk, i + 1, chunks_num)
+            cur.close()
+
+    def load_data_lines(self, query: str, lines: list) -> None:
+        """
+        Stream lines as TSV through "LOAD DATA LOCAL INFILE %s ...", committing each chunk.
+        """
+        lines_len = len(lines)
+        chunks_num = -(-lines_len // self._load_data_chunk)
+        with self.connection() as conn:
+            cur = conn.cursor()
+            for i in range(chunks_num):
+                l_part = lines[i * self._load_data_chunk:(i + 1) * self._load_data_chunk]
+                with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8') as f:
+                    f.write('\n'.join('\t'.join(str(v) for v in line) for line in l_part))
+                    f.write('\n')
+                    f.flush()
+                    cur.execute(query, (f.name,))
+                conn.commit()
+                self._logger.debug('loaded chunk. rows: %d, progress: %d/%d', len(l_part), i + 1, chunks_num)
+            cur.close()
+
+    def bulk_insert_lines(self, table_name: str, lines: list, mode: BulkInsertMode = BulkInsertMode.UPSERT) -> None:
+        """
+        Insert lines with the bulk query of the table ("insert/{table_name}_{mode}.sql").
+        Both modes overwrite existing rows of the same primary key, so reruns are safe.
+        """
+        query = self.load_query_by_name(QueryType.INSERT, f'{table_name}_{mode.value}')
+        with _insert_seconds.span():
+            if mode == BulkInsertMode.LOAD_DATA:
+                self.load_data_lines(query, lines)
+            else:
+                self.insert_lines_chunked(query, lines)
+        _rows_inserted.inc(len(lines))
 
 
 def main():
@@ -0,0 +1,18 @@
+import os
+from data_types import DBBackend
+from repository.client.db import ClientDB
+from repository.client.db_duckdb import ClientDuckDB
+
+_CLIENTS = {
+    DBBackend.MYSQL: ClientDB,
+    DBBackend.DUCKDB: ClientDuckDB
+}
+
+
+def get_client_db(backend: DBBackend = None) -> ClientDB:
+    """
+    ClientDB of "backend", by default of the env "DB_BACKEND" ("mysql" or "duckdb", "mysql" when not set).
+    """
+    if backend is None:
+        backend = DBBackend(os.getenv('DB_BACKEND', DBBackend.MYSQL.value))
+    return _CLIENTS[backend]()
@@ -0,0 +1,166 @@
+import os
+import re
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from pathlib import Path
+from typing import Iterator, Optional
+from repository.client.db import ClientDB
+from data_types import QueryType, BulkInsertMode
+from metrics_alpaca.metrics_alpaca import counter, histogram
+
+load_dotenv()
+
+_insert_seconds = histogram('db_bulk_insert_seconds', 'Bulk insert of lines into a table, commits included.')
+_rows_inserted = counter('db_rows_inserted_total', 'Rows sent by bulk inserts.')
+
+_DML = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+def to_duckdb_query(query: str) -> str:
+    # MySQL quoting and placeholders of the shared sql files to DuckDB ones.
+    return query.replace('`', '"').replace('%s', '?')
+
+
+class CursorDuckDB:
+    """
+    The part of a MySQL cursor the repositories use, over a DuckDB connection.
+    DuckDB answers DML with one row holding the number of changed rows, which becomes "rowcount".
+    """
+
+    def __init__(self, conn) -> None:
+        self._conn = conn
+        self.rowcount = -1
+
+    @property
+    def description(self) -> Optional[list]:
+        return self._conn.description
+
+    def execute(self, query: str, params: tuple = None) -> None:
+        self._conn.execute(to_duckdb_query(query), None if params is None else list(params))
+        self.rowcount = self._conn.fetchone()[0] if _DML.match(query) else -1
+
+    def executemany(self, query: str, lines: list) -> None:
+        self._conn.executemany(to_duckdb_query(query), lines)
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._conn.fetchone()
+
+    def fetchall(self) -> list:
+        return self._conn.fetchall()
+
+    def fetchmany(self, size: int) -> list:
+        return self._conn.fetchmany(size)
+
+    def close(self) -> None:
+        pass
+
+
+@dataclass
+class ClientDuckDB(ClientDB):
+    """
+    Embedded DuckDB file in place of the MySQL server, for a single research box.
+    Queries are the shared sql files, or the ones under "sql/duckdb" where the dialects differ.
+    Bulk inserts scan the lines as a DataFrame instead of sending rows, and are serialized,
+    since DuckDB fails concurrent transactions that write the same keys.
+    There are no partitions, the columnar storage prunes row groups of minute bars by their min/max.
+    Needs the optional package "duckdb", imported on first use.
+    """
+    _path: str = os.getenv('DB_DUCKDB_PATH', f'{Path(__file__).parent}/../../db_data/alpaca_market.duckdb')
+    _sql_dialect: Optional[str] = 'duckdb'
+    _threads: int = 0
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @property
+    def supports_partitions(self) -> bool:
+        return False
+
+    def init_db(self) -> None:
+        Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+
+    def get_connection(self):
+        with self._conn_lock:
+            if self._conn is None:
+                try:
+                    import duckdb
+                except ImportError:
+                    raise ImportError('The embedded backend needs "duckdb": pip install duckdb')
+                self.init_db()
+                self._conn = duckdb.connect(self._path)
+                if self._threads > 0:
+                    self._conn.execute(f'SET threads = {self._threads};')
+                self._logger.debug('Opened duckdb "%s".', self._path)
+        return self._conn
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        # a cursor of DuckDB is its own connection to the same database, one per thread.
+        conn = self.get_connection().cursor()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def cursor(self, **kwargs) -> Iterator[CursorDuckDB]:
+        """
+        Transaction on its own connection. Committed when the block ends, rolled back on error.
+        """
+        with self.connection() as conn:
+            conn.begin()
+            try:
+                yield CursorDuckDB(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def fetch_chunks(self, query: str, params: tuple = None, chunksize: int = 100000) -> Iterator[list]:
+        with self.connection() as conn:
+            cur = CursorDuckDB(conn)
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if not rows:
+                    return
+                yield rows
+
+    def insert_lines(self, query: str, lines: list) -> None:
+        self._logger.debug('insert num: %d', len(lines))
+        with self._write_lock, self.cursor() as cur:
+            cur.executemany(query, lines)
+
+    def insert_lines_chunked(self, query: str, lines: list) -> None:
+        self.insert_lines(query, lines)
+
+    def insert_frame_lines(self, query: str, lines: list) -> None:
+        """
+        Run "query" with "lines" registered as the relation "lines" (columns c0, c1, ...).
+        """
+        if not lines:
+            return
+        frame = pd.DataFrame.from_records(lines, columns=[f'c{i}' for i in range(len(lines[0]))])
+        with self._write_lock, self.connection() as conn:
+            conn.register('lines', frame)
+            try:
+                conn.execute(to_duckdb_query(query))
+            finally:
+                conn.unregister('lines')
+        self._logger.debug('inserted frame. rows: %d', len(lines))
+
+    def bulk_insert_lines(self, table_name: str, lines: list, mode: BulkInsertMode = BulkInsertMode.UPSERT) -> None:
+        """
+        Insert lines with "duckdb/insert/{table_name}_{mode}.sql", an "INSERT ... SELECT ... FROM lines".
+        Both modes overwrite existing rows of the same primary key, so reruns are safe.
+        """
+        query = self.load_query_by_name(QueryType.INSERT, f'{table_name}_{mode.value}')
+        with _insert_seconds.span():
+            self.insert_frame_lines(query, lines)
+        _rows_inserted.inc(len(lines))
@@ -1,11 +1,16 @@
 import os
 import requests
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from repository.client import ClientAlpaca, ClientDB
+from repository.client import ClientAlpaca, ClientDB, get_client_db
+from repository.client.rate_limit import TokenBucket
 from data_types import TimeFrame, PriceDataCategory
 from exception import AlpacaApiRateLimit
+from metrics_alpaca.metrics_alpaca import counter, histogram
+
+_rate_limit_wait_seconds = histogram('alpaca_rate_limit_wait_seconds', 'Wait for a token of the rate limit.')
+_rate_limited = counter('alpaca_rate_limited_total', 'Responses of status 429.')
 
 
 @dataclass
@@ -16,54 +21,96 @@ class ClientMarketData(ClientAlpaca):
     _category: PriceDataCategory = PriceDataCategory.BAR
     _time_frame: TimeFrame = TimeFrame.MIN
     _limit: int = 10000
-    _client_db: ClientDB = ClientDB()
-    _api_rate_limit = 200
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    _api_rate_limit: int = 200
+    _max_retry_rate_limit: int = 5
 
     def __post_init__(self) -> None:
         self._logger = self._logger.getChild(__name__)
-        self._api_rate_limit_per_min = (self._api_rate_limit // 59)
+        self._token_bucket = TokenBucket.shared(self._api_rate_limit)
+
+    def _get_retry_after(self, r: requests.Response) -> float:
+        # prefer "Retry-After", then alpaca's "X-RateLimit-Reset" (epoch sec), then one token interval.
+        retry_after = r.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                pass
+        rate_limit_reset = r.headers.get('X-RateLimit-Reset')
+        if rate_limit_reset is not None:
+            try:
+                return max(float(rate_limit_reset) - time.time(), 0)
+            except ValueError:
+                pass
+        return 60 / self._api_rate_limit
+
+    def _get_query(self, dl_start_time: str, page_token: str = None, dl_end_time: str = None) -> dict:
+        query = {
+            'start': dl_start_time,
+            'end': self._end_time if dl_end_time is None else dl_end_time,
+            'limit': self._limit
+        }
+        # quotes and trades have no time frame.
+        if self._category == PriceDataCategory.BAR:
+            query['timeframe'] = self._time_frame.value
+        if not (page_token is None):
+            query['page_token'] = page_token
+        return query
+
+    def _request_rate_limited(self, url: str, query: dict, label: str) -> dict:
+        # "label" names the requested symbols in logs.
+        for i in range(self._max_retry_rate_limit + 1):
+            time_wait = self._token_bucket.acquire()
+            _rate_limit_wait_seconds.observe(time_wait)
+            r = self.request_get(url, params=query)
+            # formatted only when debug is enabled.
+            self._logger.debug(
+                'Request symbol: "%s", Time: "%s", Rate limit wait: "%.3f", '
+                'Status code: "%s", Url: "%s", Query: %s',
+                label, r.elapsed, time_wait, r.status_code, url, query
+            )
+            if r.status_code != 429:
+                break
+            _rate_limited.inc()
+            # back off every thread sharing the bucket until the api allows requests again.
+            retry_after = self._get_retry_after(r)
+            self._logger.warning(f'Alpaca api rate limit has been exceeded. "{label}" retry after "{retry_after}" sec.')
+            self._token_bucket.pause(retry_after)
+        else:
+            raise AlpacaApiRateLimit(
+                f'Alpaca api rate limit has been exceeded {self._max_retry_rate_limit + 1} times. symbol: "{label}"'
+            )
+        return r.json()
 
     def request_price_data_segment(
             self,
             symbol: str,
             dl_start_time: str,
-            page_token: str = None
+            page_token: str = None,
+            dl_end_time: str = None
     ) -> dict:
         """
         [(time, symbol, open, high, low, close, volume), (...)]
         """
         url = f"{self._base_url}/stocks/{symbol}/{self._category.value}"
-        query = {
-            'start': dl_start_time,
-            'end': self._end_time,
-            'timeframe': self._time_frame.value,
-            'limit': self._limit
-        }
-        if not (page_token is None):
-            query['page_token'] = page_token
-        time_start = datetime.now()
-        r = requests.get(
-            url,
-            headers=self.get_auth_headers(),
-            params=query
-        )
-        time_elapsed = datetime.now() - time_start
-        self._logger.debug((
-            f"Request symbol: \"{symbol}\", "
-            f"Time: \"{time_elapsed}\", "
-            f"Status code: \"{r.status_code}\", "
-            f"Url: \"{url}\", "
-            f"Query: {str(query)}"
-        ))
-        # raise exception if exceed alpaca api rate limit 200 per min.
-        if r.status_code == 429:
-            raise AlpacaApiRateLimit(f'Alpaca api rate limit has been exceeded.')
-        # wait to avoid api limit rate
-        time_too_early = self._api_rate_limit_per_min - time_elapsed.total_seconds()
-        if time_too_early > 0:
-            self._logger.debug(f'Request time is too early, wait "{time_too_early}" sec.')
-            time.sleep(time_too_early)
-        return r.json()
+        return self._request_rate_limited(url, self._get_query(dl_start_time, page_token, dl_end_time), symbol)
+
+    def request_price_data_segment_multi(
+            self,
+            symbols: list,
+            dl_start_time: str,
+            page_token: str = None,
+            dl_end_time: str = None
+    ) -> dict:
+        """
+        One page of many symbols: {'bars': {symbol: [...], ...}, 'next_page_token': ...}.
+        "limit" counts the bars of all symbols, a symbol may continue on the next page.
+        """
+        url = f"{self._base_url}/stocks/{self._category.value}"
+        query = self._get_query(dl_start_time, page_token, dl_end_time)
+        query['symbols'] = ','.join(symbols)
+        return self._request_rate_limited(url, query, f'{symbols[0]}..{symbols[-1]} ({len(symbols)} symbols)')
 
 
 def main():
@@ -0,0 +1,87 @@
+import json
+import os
+from dataclasses import dataclass, field
+from functools import partial
+from dotenv import load_dotenv
+from logging import Logger
+from exception import StreamDisconnected
+from logger_alpaca.logger_alpaca import get_logger
+
+load_dotenv()
+
+
+@dataclass
+class ClientMarketDataStream:
+    """
+    Minute bars of the realtime market data websocket of alpaca:
+    connect -> {"T": "success", "msg": "connected"}, auth, subscribe "bars", then arrays of
+    {"T": "b", "S": symbol, "t", "o", "h", "l", "c", "v"} as each minute closes.
+    Needs the optional package "websocket-client", imported on connect.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _url: str = os.getenv('ALPACA_ENDPOINT_MARKET_DATA_STREAM', 'wss://stream.data.alpaca.markets/v2/iex')
+    _api_key: str = os.getenv('ALPACA_API_KEY')
+    _secret_key: str = os.getenv('ALPACA_SECRET_KEY')
+    _timeout: float = 10.0
+    # symbols of one subscribe message, the server limits the message size.
+    _subscribe_chunk: int = 1000
+
+    def __post_init__(self) -> None:
+        self._ws = None
+
+    def _recv_control(self, expected: str) -> list:
+        # the first array after connect, auth or subscribe answers it, errors come as {"T": "error"}.
+        messages = self.recv_messages()
+        for message in messages:
+            if message.get('T') == 'error':
+                raise StreamDisconnected(f'Stream answered error to {expected}. {message}')
+        return messages
+
+    def connect(self) -> None:
+        try:
+            import websocket
+        except ImportError:
+            raise ImportError('The realtime stream needs "websocket-client": pip install websocket-client')
+        try:
+            self._ws = websocket.create_connection(self._url, timeout=self._timeout, enable_multithread=True)
+        except (OSError, websocket.WebSocketException) as e:
+            raise StreamDisconnected(f'Connecting to "{self._url}" is failed. {e}')
+        self._recv_control('connect')
+        self._send({'action': 'auth', 'key': self._api_key, 'secret': self._secret_key})
+        self._recv_control('auth')
+        self._logger.info(f'Connected to stream "{self._url}".')
+
+    def subscribe_bars(self, symbols: list) -> None:
+        for i in range(0, len(symbols), self._subscribe_chunk):
+            self._send({'action': 'subscribe', 'bars': symbols[i:i + self._subscribe_chunk]})
+            self._recv_control('subscribe')
+        self._logger.info(f'Subscribed bars of {len(symbols)} symbols.')
+
+    def _send(self, message: dict) -> None:
+        try:
+            self._ws.send(json.dumps(message))
+        except Exception as e:
+            raise StreamDisconnected(f'Sending to stream is failed. {type(e).__name__}: {e}')
+
+    def recv_messages(self) -> list:
+        """
+        Messages of one frame. Raises StreamDisconnected when the connection is lost.
+        Returns [] when nothing arrived within "_timeout".
+        """
+        import websocket
+        try:
+            data = self._ws.recv()
+        except websocket.WebSocketTimeoutException:
+            return []
+        except Exception as e:
+            raise StreamDisconnected(f'Receiving from stream is failed. {type(e).__name__}: {e}')
+        if not data:
+            raise StreamDisconnected('Stream is closed by the server.')
+        return json.loads(data)
+
+    def close(self) -> None:
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            finally:
+                self._ws = None
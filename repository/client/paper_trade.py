@@ -1,4 +1,3 @@
-import requests
 import os
 from dataclasses import dataclass
 from repository.client import ClientAlpaca
@@ -13,8 +12,8 @@ class ClientPaperTrade(ClientAlpaca):
 
     def get_assets(self) -> dict:
         url = f"{self._base_url}/assets"
-        r = requests.get(url, headers=self.get_auth_headers())
-        self._logger.debug(f"Request status code: \"{r.status_code}\"")
+        r = self.request_get(url)
+        self._logger.debug('Request status code: "%s"', r.status_code)
         return r.json()
 
 
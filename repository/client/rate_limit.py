@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every client of the same api budget.
+    Tokens refill continuously at "rate_per_min / 60" per second up to "capacity",
+    one token by default, so requests are paced evenly from the first one and no minute
+    sees more than "rate_per_min" requests. A larger capacity allows bursts on top of the rate,
+    which a per-minute limit of the api answers with 429.
+    """
+    _shared: Dict[int, 'TokenBucket'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate_per_min: int, capacity: int = 1) -> None:
+        self._rate_per_sec = rate_per_min / 60
+        self._capacity = capacity
+        self._tokens = float(self._capacity)
+        self._time_last = time.monotonic()
+        self._time_resume = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, rate_per_min: int) -> 'TokenBucket':
+        # one bucket per process for each rate limit.
+        with cls._shared_lock:
+            if rate_per_min not in cls._shared:
+                cls._shared[rate_per_min] = cls(rate_per_min)
+            return cls._shared[rate_per_min]
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._capacity, self._tokens + (now - self._time_last) * self._rate_per_sec)
+        self._time_last = now
+
+    def acquire(self) -> float:
+        """
+        Block until a token is available. Returns the time waited in seconds.
+        """
+        time_start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._time_resume and self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - time_start
+                time_wait = max(self._time_resume - now, (1 - self._tokens) / self._rate_per_sec)
+            time.sleep(time_wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens for "seconds" and drop the remaining ones.
+        Called when the api answered 429, so every thread backs off together.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._time_resume = max(self._time_resume, now + seconds)
+            self._tokens = 0
+            self._time_last = now
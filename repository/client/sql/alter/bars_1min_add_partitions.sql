@@ -0,0 +1,3 @@
+ALTER TABLE `{table}` REORGANIZE PARTITION p_future INTO (
+{partitions}
+);
@@ -0,0 +1,3 @@
+ALTER TABLE `bars_1min_coverage`
+    ADD COLUMN `changed_at` datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    ADD KEY `bars_1min_coverage_changed_at` (`changed_at`);
@@ -0,0 +1,3 @@
+RENAME TABLE
+    `{table}` TO `{table_legacy}`,
+    `{table_new}` TO `{table}`;
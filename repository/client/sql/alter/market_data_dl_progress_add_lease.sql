@@ -0,0 +1,6 @@
+ALTER TABLE `market_data_dl_progress`
+    ADD COLUMN `lease_owner` varchar(64) DEFAULT NULL,
+    ADD COLUMN `lease_until` datetime(3) DEFAULT NULL,
+    ADD COLUMN `attempts` int NOT NULL DEFAULT 0,
+    ADD KEY `market_data_dl_progress_todo` (`category`,`time_frame`,`until`),
+    ADD KEY `market_data_dl_progress_lease_owner` (`lease_owner`);
@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS `bars_1day` (
+    `symbol` varchar(16) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    `time` datetime NOT NULL,
+    `open` double NOT NULL,
+    `high` double NOT NULL,
+    `low` double NOT NULL,
+    `close` double NOT NULL,
+    `volume` bigint unsigned NOT NULL,
+    PRIMARY KEY (`symbol`,`time`)
+) ENGINE=InnoDB ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
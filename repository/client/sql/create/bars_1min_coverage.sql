@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS `bars_1min_coverage` (
+    `symbol` varchar(16) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    `day` date NOT NULL,
+    `bars` int unsigned NOT NULL,
+    `bars_session` int unsigned NOT NULL,
+    `first_time` datetime DEFAULT NULL,
+    `last_time` datetime DEFAULT NULL,
+    `volume` bigint unsigned NOT NULL,
+    `changed_at` datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    PRIMARY KEY (`symbol`,`day`),
+    KEY `bars_1min_coverage_changed_at` (`changed_at`)
+) ENGINE=InnoDB;
@@ -0,0 +1,4 @@
+CREATE TRIGGER `{trigger}` AFTER DELETE ON `{table}` FOR EACH ROW
+DELETE IGNORE FROM `{table_new}`
+WHERE symbol = OLD.symbol
+AND `time` = OLD.`time`
@@ -0,0 +1,3 @@
+CREATE TRIGGER `{trigger}` AFTER INSERT ON `{table}` FOR EACH ROW
+REPLACE INTO `{table_new}` (symbol, `time`, `open`, high, low, `close`, volume)
+VALUES (NEW.symbol, NEW.`time`, NEW.`open`, NEW.high, NEW.low, NEW.`close`, NEW.volume)
@@ -0,0 +1,9 @@
+CREATE TRIGGER `{trigger}` AFTER UPDATE ON `{table}` FOR EACH ROW
+BEGIN
+    DELETE IGNORE FROM `{table_new}`
+    WHERE NOT (OLD.`time` <=> NEW.`time` AND OLD.symbol <=> NEW.symbol)
+    AND symbol = OLD.symbol
+    AND `time` = OLD.`time`;
+    REPLACE INTO `{table_new}` (symbol, `time`, `open`, high, low, `close`, volume)
+    VALUES (NEW.symbol, NEW.`time`, NEW.`open`, NEW.high, NEW.low, NEW.`close`, NEW.volume);
+END
@@ -4,7 +4,12 @@ CREATE TABLE IF NOT EXISTS `market_data_dl_progress` (
     `time_frame` varchar(8) NOT NULL,
     `until` datetime DEFAULT NULL,
     `message` varchar(256) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci DEFAULT NULL,
+    `lease_owner` varchar(64) DEFAULT NULL,
+    `lease_until` datetime(3) DEFAULT NULL,
+    `attempts` int NOT NULL DEFAULT 0,
     PRIMARY KEY (`asset_id`,`category`,`time_frame`),
     KEY `market_data_dl_progress_FK` (`asset_id`),
+    KEY `market_data_dl_progress_todo` (`category`,`time_frame`,`until`),
+    KEY `market_data_dl_progress_lease_owner` (`lease_owner`),
     CONSTRAINT `market_data_dl_progress_FK` FOREIGN KEY (`asset_id`) REFERENCES `assets` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS `schema_migration` (
+    `name` varchar(64) NOT NULL,
+    `version` int NOT NULL,
+    `position` varchar(64) DEFAULT NULL,
+    `completed_at` datetime DEFAULT NULL,
+    PRIMARY KEY (`name`,`version`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,2 @@
+DELETE FROM bars_1min
+WHERE symbol = %s;
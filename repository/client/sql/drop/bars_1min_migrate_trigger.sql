@@ -0,0 +1 @@
+DROP TRIGGER IF EXISTS `{trigger}`;
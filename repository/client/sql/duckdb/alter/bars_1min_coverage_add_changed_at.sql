@@ -0,0 +1 @@
+ALTER TABLE bars_1min_coverage ADD COLUMN changed_at timestamp DEFAULT CAST(now() AS TIMESTAMP);
@@ -0,0 +1,14 @@
+CREATE TABLE IF NOT EXISTS assets (
+    id varchar NOT NULL,
+    class varchar NOT NULL,
+    easy_to_borrow boolean NOT NULL,
+    exchange varchar NOT NULL,
+    fractionable boolean NOT NULL,
+    marginable boolean NOT NULL,
+    name varchar NOT NULL,
+    shortable boolean NOT NULL,
+    status varchar NOT NULL,
+    symbol varchar NOT NULL,
+    tradable boolean NOT NULL,
+    PRIMARY KEY (id)
+);
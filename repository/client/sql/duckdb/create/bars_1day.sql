@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS bars_1day (
+    symbol varchar NOT NULL,
+    "time" timestamp NOT NULL,
+    "open" double NOT NULL,
+    high double NOT NULL,
+    low double NOT NULL,
+    "close" double NOT NULL,
+    volume ubigint NOT NULL,
+    PRIMARY KEY (symbol, "time")
+);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS bars_1min_coverage (
+    symbol varchar NOT NULL,
+    "day" date NOT NULL,
+    bars uinteger NOT NULL,
+    bars_session uinteger NOT NULL,
+    first_time timestamp DEFAULT NULL,
+    last_time timestamp DEFAULT NULL,
+    volume ubigint NOT NULL,
+    changed_at timestamp DEFAULT CAST(now() AS TIMESTAMP),
+    PRIMARY KEY (symbol, "day")
+);
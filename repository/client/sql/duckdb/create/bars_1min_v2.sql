@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS "{table}" (
+    symbol varchar NOT NULL,
+    "time" timestamp NOT NULL,
+    "open" double NOT NULL,
+    high double NOT NULL,
+    low double NOT NULL,
+    "close" double NOT NULL,
+    volume uinteger NOT NULL,
+    PRIMARY KEY (symbol, "time")
+);
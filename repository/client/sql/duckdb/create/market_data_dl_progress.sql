@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS market_data_dl_progress (
+    asset_id varchar NOT NULL,
+    category varchar NOT NULL,
+    time_frame varchar NOT NULL,
+    until timestamp DEFAULT NULL,
+    message varchar DEFAULT NULL,
+    lease_owner varchar DEFAULT NULL,
+    lease_until timestamp DEFAULT NULL,
+    attempts integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (asset_id, category, time_frame)
+);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS schema_migration (
+    name varchar NOT NULL,
+    version integer NOT NULL,
+    position varchar DEFAULT NULL,
+    completed_at timestamp DEFAULT NULL,
+    PRIMARY KEY (name, version)
+);
@@ -0,0 +1,25 @@
+INSERT INTO assets (
+    id,
+    class,
+    easy_to_borrow,
+    exchange,
+    fractionable,
+    marginable,
+    name,
+    shortable,
+    status,
+    symbol,
+    tradable
+)
+SELECT * FROM lines
+ON CONFLICT (id) DO UPDATE SET
+    class=excluded.class,
+    easy_to_borrow=excluded.easy_to_borrow,
+    exchange=excluded.exchange,
+    fractionable=excluded.fractionable,
+    marginable=excluded.marginable,
+    name=excluded.name,
+    shortable=excluded.shortable,
+    status=excluded.status,
+    symbol=excluded.symbol,
+    tradable=excluded.tradable;
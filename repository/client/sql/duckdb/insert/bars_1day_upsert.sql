@@ -0,0 +1,8 @@
+INSERT INTO bars_1day ("time", symbol, "open", high, low, "close", volume)
+SELECT CAST(c0 AS TIMESTAMP), c1, c2, c3, c4, c5, c6 FROM lines
+ON CONFLICT (symbol, "time") DO UPDATE SET
+    "open"=excluded."open",
+    high=excluded.high,
+    low=excluded.low,
+    "close"=excluded."close",
+    volume=excluded.volume;
@@ -0,0 +1,9 @@
+INSERT INTO bars_1min_coverage (symbol, "day", bars, bars_session, first_time, last_time, volume)
+SELECT c0, CAST(c1 AS DATE), c2, c3, CAST(c4 AS TIMESTAMP), CAST(c5 AS TIMESTAMP), c6 FROM lines
+ON CONFLICT (symbol, "day") DO UPDATE SET
+    bars=excluded.bars,
+    bars_session=excluded.bars_session,
+    first_time=excluded.first_time,
+    last_time=excluded.last_time,
+    volume=excluded.volume,
+    changed_at=CAST(now() AS TIMESTAMP);
@@ -0,0 +1,7 @@
+INSERT INTO market_data_dl_progress (
+    category, time_frame, until, message, asset_id
+)
+SELECT c0, c1, CAST(c2 AS TIMESTAMP), c3, c4 FROM lines
+ON CONFLICT (asset_id, category, time_frame) DO UPDATE SET
+    until=excluded.until,
+    message=excluded.message;
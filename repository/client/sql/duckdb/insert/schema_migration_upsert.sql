@@ -0,0 +1,5 @@
+INSERT INTO schema_migration (name, version, position, completed_at)
+VALUES(%s, %s, %s, %s)
+ON CONFLICT (name, version) DO UPDATE SET
+    position=excluded.position,
+    completed_at=excluded.completed_at;
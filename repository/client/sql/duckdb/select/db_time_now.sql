@@ -0,0 +1 @@
+SELECT CAST(now() AS TIMESTAMP);
@@ -0,0 +1,14 @@
+SELECT
+    mddp.asset_id,
+    ast.symbol,
+    mddp.until
+FROM market_data_dl_progress mddp
+JOIN assets ast ON mddp.asset_id = ast.id
+WHERE mddp.category = %s
+AND mddp.time_frame = %s
+AND ast.status = 'active'
+AND (mddp.until IS NULL OR mddp.until < CAST(%s AS TIMESTAMP))
+AND (mddp.lease_until IS NULL OR mddp.lease_until < CAST(now() AS TIMESTAMP))
+AND mddp.attempts < %s
+ORDER BY mddp.until NULLS FIRST
+LIMIT %s;
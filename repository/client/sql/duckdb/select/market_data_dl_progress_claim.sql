@@ -0,0 +1,9 @@
+SELECT asset_id
+FROM market_data_dl_progress
+WHERE category = %s
+AND time_frame = %s
+AND asset_id IN ({asset_ids})
+AND (until IS NULL OR until < %s)
+AND attempts < %s
+AND (lease_until IS NULL OR lease_until < CAST(now() AS TIMESTAMP))
+LIMIT %s;
@@ -0,0 +1,4 @@
+SELECT UNNEST(constraint_column_names)
+FROM duckdb_constraints()
+WHERE table_name = %s
+AND constraint_type = 'PRIMARY KEY';
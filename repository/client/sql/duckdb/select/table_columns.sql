@@ -0,0 +1,5 @@
+SELECT column_name
+FROM information_schema.columns
+WHERE table_schema = current_schema()
+AND table_name = %s
+ORDER BY ordinal_position;
@@ -0,0 +1,3 @@
+SELECT NULL, NULL, estimated_size
+FROM duckdb_tables()
+WHERE table_name = %s;
@@ -0,0 +1,3 @@
+UPDATE bars_1min_coverage
+SET changed_at=CAST(now() AS TIMESTAMP)
+WHERE changed_at IS NULL;
@@ -0,0 +1,9 @@
+UPDATE market_data_dl_progress
+SET
+    lease_owner=NULL,
+    lease_until=CAST(now() AS TIMESTAMP) + to_milliseconds(CAST(%s AS BIGINT) * 1000),
+    message=%s
+WHERE asset_id=%s
+AND category=%s
+AND time_frame=%s
+AND lease_owner=%s;
@@ -0,0 +1,3 @@
+UPDATE market_data_dl_progress
+SET lease_until=CAST(now() AS TIMESTAMP) + to_milliseconds(CAST(%s AS BIGINT) * 1000)
+WHERE lease_owner=%s;
@@ -0,0 +1,8 @@
+UPDATE market_data_dl_progress
+SET
+    lease_owner=%s,
+    lease_until=CAST(now() AS TIMESTAMP) + to_milliseconds(CAST(%s AS BIGINT) * 1000),
+    attempts=attempts + 1
+WHERE category=%s
+AND time_frame=%s
+AND asset_id IN ({asset_ids});
@@ -1,4 +1,4 @@
-INSERT INTO alpaca_market_db.assets (
+INSERT INTO assets (
     id,
     class,
     easy_to_borrow,
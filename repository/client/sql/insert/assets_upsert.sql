@@ -0,0 +1,24 @@
+INSERT INTO assets (
+    id,
+    class,
+    easy_to_borrow,
+    exchange,
+    fractionable,
+    marginable,
+    name,
+    shortable,
+    status,
+    symbol,
+    tradable
+) VALUES(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    class=VALUES(class),
+    easy_to_borrow=VALUES(easy_to_borrow),
+    exchange=VALUES(exchange),
+    fractionable=VALUES(fractionable),
+    marginable=VALUES(marginable),
+    name=VALUES(name),
+    shortable=VALUES(shortable),
+    status=VALUES(status),
+    symbol=VALUES(symbol),
+    tradable=VALUES(tradable);
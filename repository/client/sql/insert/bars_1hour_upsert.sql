@@ -0,0 +1,8 @@
+INSERT INTO bars_1hour (`time`, symbol, `open`, high, low, `close`, volume)
+VALUES(%s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    `open`=VALUES(`open`),
+    high=VALUES(high),
+    low=VALUES(low),
+    `close`=VALUES(`close`),
+    volume=VALUES(volume);
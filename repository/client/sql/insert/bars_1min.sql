@@ -1,2 +1,2 @@
-INSERT INTO alpaca_market_db.bars_1min (`time`, symbol, `open`, high, low, `close`, volume)
+INSERT INTO bars_1min (`time`, symbol, `open`, high, low, `close`, volume)
 VALUES(%s, %s, %s, %s, %s, %s, %s);
\ No newline at end of file
@@ -0,0 +1,4 @@
+INSERT IGNORE INTO `{dst}` (symbol, `time`, `open`, high, low, `close`, volume)
+SELECT symbol, `time`, `open`, high, low, `close`, volume
+FROM `{src}`
+WHERE (`time`, symbol) > (%s, %s);
@@ -0,0 +1,9 @@
+INSERT INTO bars_1min_coverage (symbol, `day`, bars, bars_session, first_time, last_time, volume)
+VALUES(%s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    bars=VALUES(bars),
+    bars_session=VALUES(bars_session),
+    first_time=VALUES(first_time),
+    last_time=VALUES(last_time),
+    volume=VALUES(volume),
+    changed_at=NOW(3);
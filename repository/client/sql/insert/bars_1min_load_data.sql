@@ -0,0 +1,5 @@
+LOAD DATA LOCAL INFILE %s
+REPLACE INTO TABLE bars_1min
+FIELDS TERMINATED BY '\t'
+LINES TERMINATED BY '\n'
+(`time`, symbol, `open`, high, low, `close`, volume);
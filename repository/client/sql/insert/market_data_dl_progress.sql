@@ -1,3 +1,3 @@
-INSERT INTO alpaca_market_db.market_data_dl_progress (
+INSERT INTO market_data_dl_progress (
     category, time_frame, until, message, asset_id
 ) VALUES(%s,%s,%s,%s,%s);
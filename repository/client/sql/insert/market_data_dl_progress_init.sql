@@ -0,0 +1,5 @@
+INSERT IGNORE INTO market_data_dl_progress (
+    category, time_frame, until, message, asset_id
+)
+SELECT %s, %s, NULL, NULL, id
+FROM assets;
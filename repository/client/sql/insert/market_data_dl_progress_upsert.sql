@@ -0,0 +1,6 @@
+INSERT INTO market_data_dl_progress (
+    category, time_frame, until, message, asset_id
+) VALUES(%s,%s,%s,%s,%s)
+ON DUPLICATE KEY UPDATE
+    until=VALUES(until),
+    message=VALUES(message);
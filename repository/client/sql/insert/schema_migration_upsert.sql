@@ -0,0 +1,5 @@
+INSERT INTO schema_migration (name, version, position, completed_at)
+VALUES(%s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    position=VALUES(position),
+    completed_at=VALUES(completed_at);
@@ -10,4 +10,4 @@ SELECT
     status,
     symbol,
     tradable
-FROM alpaca_market_db.assets;
+FROM assets;
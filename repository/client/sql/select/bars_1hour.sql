@@ -0,0 +1,4 @@
+SELECT `time`, symbol, `open`, high, low, `close`, volume
+FROM bars_1hour
+WHERE symbol = %s
+ORDER BY `time`;
@@ -0,0 +1,5 @@
+SELECT `time`, symbol
+FROM `{table}`
+WHERE (`time`, symbol) > (%s, %s)
+ORDER BY `time`, symbol
+LIMIT 1 OFFSET %s;
@@ -0,0 +1,4 @@
+SELECT symbol, `day`
+FROM bars_1min_coverage
+WHERE changed_at >= %s
+ORDER BY symbol, `day`;
@@ -0,0 +1,6 @@
+SELECT symbol, `day`, bars, bars_session, first_time, last_time, volume
+FROM bars_1min_coverage
+WHERE symbol IN ({symbols})
+AND `day` >= %s
+AND `day` <= %s
+ORDER BY symbol, `day`;
@@ -0,0 +1,5 @@
+SELECT `time`, symbol, `open`, high, low, `close`, volume
+FROM bars_1min
+WHERE symbol = %s
+AND `time` >= %s
+ORDER BY `time`;
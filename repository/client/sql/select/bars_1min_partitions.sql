@@ -0,0 +1,6 @@
+SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE()
+AND TABLE_NAME = %s
+AND PARTITION_NAME IS NOT NULL
+ORDER BY PARTITION_ORDINAL_POSITION;
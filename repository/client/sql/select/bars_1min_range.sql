@@ -0,0 +1,6 @@
+SELECT `time`, symbol, `open`, high, low, `close`, volume
+FROM bars_1min
+WHERE symbol IN ({symbols})
+AND `time` >= %s
+AND `time` < %s
+ORDER BY symbol, `time`;
@@ -0,0 +1,4 @@
+SELECT `time`, symbol, `open`, high, low, `close`, volume
+FROM `{table}`
+WHERE symbol = %s
+ORDER BY `time`;
@@ -0,0 +1 @@
+SELECT NOW(3);
@@ -0,0 +1,6 @@
+SELECT COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE()
+AND TABLE_NAME = %s
+AND CONSTRAINT_NAME = 'PRIMARY'
+ORDER BY ORDINAL_POSITION;
@@ -0,0 +1,4 @@
+SELECT position, completed_at
+FROM schema_migration
+WHERE name = %s
+AND version = %s;
@@ -0,0 +1,5 @@
+SELECT COLUMN_NAME
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+AND TABLE_NAME = %s
+ORDER BY ORDINAL_POSITION;
@@ -0,0 +1,4 @@
+SELECT DATA_LENGTH, INDEX_LENGTH, TABLE_ROWS
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE()
+AND TABLE_NAME = %s;
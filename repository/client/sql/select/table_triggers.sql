@@ -0,0 +1,4 @@
+SELECT TRIGGER_NAME
+FROM information_schema.TRIGGERS
+WHERE TRIGGER_SCHEMA = DATABASE()
+AND EVENT_OBJECT_TABLE = %s;
@@ -1,4 +1,4 @@
-UPDATE alpaca_market_db.market_data_dl_progress
+UPDATE market_data_dl_progress
 SET
     until=%s,
     message=%s
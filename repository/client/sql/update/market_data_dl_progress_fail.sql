@@ -0,0 +1,9 @@
+UPDATE market_data_dl_progress
+SET
+    lease_owner=NULL,
+    lease_until=NOW(3) + INTERVAL %s SECOND,
+    message=%s
+WHERE asset_id=%s
+AND category=%s
+AND time_frame=%s
+AND lease_owner=%s;
@@ -0,0 +1,3 @@
+UPDATE market_data_dl_progress
+SET lease_until=NOW(3) + INTERVAL %s SECOND
+WHERE lease_owner=%s;
@@ -0,0 +1,8 @@
+UPDATE market_data_dl_progress
+SET
+    lease_owner=%s,
+    lease_until=NOW(3) + INTERVAL %s SECOND,
+    attempts=attempts + 1
+WHERE category=%s
+AND time_frame=%s
+AND asset_id IN ({asset_ids});
@@ -0,0 +1,8 @@
+UPDATE market_data_dl_progress
+SET
+    lease_until=NULL,
+    attempts=0
+WHERE category=%s
+AND time_frame=%s
+AND attempts>0
+AND lease_owner IS NULL;
@@ -0,0 +1,232 @@
+import threading
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from logging import Logger
+from typing import Iterator
+from repository.client import ClientDB, get_client_db
+from repository.bars_columnar import (
+    NS_PER_DAY,
+    bars_columns_from_rows,
+    concat_bars_columns,
+    epoch_ns_to_datetime_str,
+    split_bars_columns_at_last_day
+)
+from repository.resample import NS_PER_MINUTE, SESSION_MINUTES, to_exchange_local_ns
+from repository.trading_calendar import get_trading_days, get_session_minutes
+from data_types import QueryType, BulkInsertMode, TradingSession
+from logger_alpaca.logger_alpaca import get_logger
+
+
+def compute_coverage(columns: dict) -> dict:
+    """
+    Per-day coverage of sorted bars columns. Days are UTC dates like the download progress,
+    the regular session of an exchange day always falls in its UTC date.
+    {'day': datetime64[D], 'bars', 'bars_session' (bars in the regular session), 'first', 'last' (epoch ns), 'volume'}
+    """
+    days = columns['t'] // NS_PER_DAY
+    if len(days) == 0:
+        return {
+            'day': np.empty(0, dtype='datetime64[D]'),
+            **{k: np.empty(0, dtype=np.int64) for k in ('bars', 'bars_session', 'first', 'last')},
+            'volume': np.empty(0, dtype=np.uint64)
+        }
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(days)]
+    minute_of_day = (to_exchange_local_ns(columns['t']) % NS_PER_DAY) // NS_PER_MINUTE
+    session_start, session_end = SESSION_MINUTES[TradingSession.REGULAR]
+    in_session = (minute_of_day >= session_start) & (minute_of_day < session_end)
+    return {
+        'day': days[starts].astype('datetime64[D]'),
+        'bars': ends - starts,
+        'bars_session': np.add.reduceat(in_session.astype(np.int64), starts),
+        'first': columns['t'][starts],
+        'last': columns['t'][ends - 1],
+        'volume': np.add.reduceat(columns['v'].astype(np.uint64), starts)
+    }
+
+
+def coverage_to_lines(symbol: str, coverage: dict) -> list:
+    # rows for "insert/bars_1min_coverage_upsert.sql"
+    return list(zip(
+        [symbol] * len(coverage['day']),
+        np.datetime_as_string(coverage['day']).tolist(),
+        coverage['bars'].tolist(),
+        coverage['bars_session'].tolist(),
+        epoch_ns_to_datetime_str(coverage['first']).tolist(),
+        epoch_ns_to_datetime_str(coverage['last']).tolist(),
+        coverage['volume'].tolist()
+    ))
+
+
+def detect_gaps(coverage: dict, start: str, end: str, min_session_ratio: float = 0.0) -> dict:
+    """
+    Trading days in [start, end] without coverage ("missing"), and days whose regular session has
+    less than "min_session_ratio" of its minutes ("partial", disabled with 0).
+    Days recorded with no bars (confirmed empty by a repair) are neither.
+    """
+    trading_days = get_trading_days(start, end)
+    if len(coverage['day']) == 0:
+        return {'missing': trading_days, 'partial': trading_days[:0]}
+    idx = np.minimum(np.searchsorted(coverage['day'], trading_days), len(coverage['day']) - 1)
+    is_covered = coverage['day'][idx] == trading_days
+    gaps = {'missing': trading_days[~is_covered], 'partial': trading_days[:0]}
+    if min_session_ratio > 0:
+        is_partial = is_covered & (coverage['bars'][idx] > 0) \
+            & (coverage['bars_session'][idx] < min_session_ratio * get_session_minutes(trading_days))
+        gaps['partial'] = trading_days[is_partial]
+    return gaps
+
+
+def group_days_into_spans(days: np.ndarray, max_gap_days: int = 4) -> list:
+    # [(start, end), ...] of days closer than "max_gap_days", so a weekend or holiday does not split a span.
+    if len(days) == 0:
+        return []
+    days = np.sort(days)
+    breaks = np.flatnonzero(np.diff(days).astype(np.int64) > max_gap_days)
+    starts = np.r_[0, breaks + 1]
+    ends = np.r_[breaks, len(days) - 1]
+    return [(str(days[s]), str(days[e])) for s, e in zip(starts, ends)]
+
+
+@dataclass
+class CoverageBars:
+    """
+    Index of bars_1min per (symbol, UTC day): bar count, bars in the regular session,
+    first/last time, volume and "changed_at", the db time of the last write of the day.
+    Written with each committed batch of bars, so finding holes or the days rewritten since a time
+    is a lookup of this table instead of a scan of bars_1min.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    _tbl_name: str = 'bars_1min_coverage'
+    _tbl_name_bars_min: str = 'bars_1min'
+    # symbols of one "IN (...)" query.
+    _symbols_chunk: int = 1000
+
+    def __post_init__(self) -> None:
+        self._table_lock = threading.Lock()
+        self._table_created = False
+
+    def _ensure_table(self) -> None:
+        with self._table_lock:
+            if self._table_created:
+                return
+            self._client_db.execute(self._client_db.load_query_by_name(QueryType.CREATE, self._tbl_name))
+            # "changed_at" is added to a coverage table created before it existed.
+            query = self._client_db.load_query_by_name(QueryType.SELECT, 'table_columns')
+            columns = {r[0] for r in self._client_db.fetch_all(query, (self._tbl_name,))}
+            if 'changed_at' not in columns:
+                query = self._client_db.load_query_by_name(QueryType.ALTER, f'{self._tbl_name}_add_changed_at')
+                self._client_db.execute(query)
+                # existing rows count as changed now, so the next incremental export covers all of them.
+                query = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_changed_at_null')
+                self._client_db.execute(query)
+                self._logger.info(f'Added column "changed_at" to "{self._tbl_name}".')
+            self._table_created = True
+
+    def upsert(self, symbol: str, columns: dict) -> None:
+        # the days of "columns" must be complete, their rows are overwritten.
+        if len(columns['t']) == 0:
+            return
+        self._ensure_table()
+        lines = coverage_to_lines(symbol, compute_coverage(columns))
+        self._client_db.bulk_insert_lines(self._tbl_name, lines, BulkInsertMode.UPSERT)
+
+    def upsert_many(self, columns_by_symbol: dict) -> None:
+        # upsert of many symbols in one statement, {symbol: columns}.
+        lines = [
+            line
+            for symbol, columns in columns_by_symbol.items() if len(columns['t']) != 0
+            for line in coverage_to_lines(symbol, compute_coverage(columns))
+        ]
+        if not lines:
+            return
+        self._ensure_table()
+        self._client_db.bulk_insert_lines(self._tbl_name, lines, BulkInsertMode.UPSERT)
+
+    def mark_empty_days(self, symbol: str, days: list) -> None:
+        # days the api has no bars for, so they are not reported as missing again.
+        if not days:
+            return
+        self._ensure_table()
+        lines = [(symbol, str(day), 0, 0, None, None, 0) for day in days]
+        self._client_db.bulk_insert_lines(self._tbl_name, lines, BulkInsertMode.UPSERT)
+
+    def iter_coverage(self, symbols: list, start: str, end: str) -> Iterator[tuple]:
+        """
+        (symbol, coverage) of symbols with any row in [start, end].
+        """
+        self._ensure_table()
+        query_base = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_range')
+        for i in range(0, len(symbols), self._symbols_chunk):
+            symbols_chunk = symbols[i:i + self._symbols_chunk]
+            query = query_base.format(symbols=', '.join(['%s'] * len(symbols_chunk)))
+            rows = self._client_db.fetch_all(query, (*symbols_chunk, start, end))
+            # rows are ordered by symbol
+            bounds = [0] + [j for j in range(1, len(rows)) if rows[j][0] != rows[j - 1][0]] + [len(rows)]
+            for j_start, j_end in zip(bounds[:-1], bounds[1:]):
+                if j_start == j_end:
+                    continue
+                _, days, bars, bars_session, _, _, volume = zip(*rows[j_start:j_end])
+                yield rows[j_start][0], {
+                    'day': np.array(days, dtype='datetime64[D]'),
+                    'bars': np.array(bars, dtype=np.int64),
+                    'bars_session': np.array(bars_session, dtype=np.int64),
+                    'volume': np.array(volume, dtype=np.uint64)
+                }
+
+    def get_time_now(self) -> datetime:
+        # time of db, which "changed_at" is written in.
+        query = self._client_db.load_query_by_name(QueryType.SELECT, 'db_time_now')
+        return self._client_db.fetch_one(query)[0]
+
+    def get_days_changed(self, since: str) -> dict:
+        """
+        {symbol: days (datetime64[D])} whose coverage was written at or after "since",
+        by downloads, backfills or repairs.
+        """
+        self._ensure_table()
+        query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_changed')
+        days_changed = {}
+        for symbol, day in self._client_db.fetch_all(query, (since,)):
+            days_changed.setdefault(symbol, []).append(day)
+        return {symbol: np.array(days, dtype='datetime64[D]') for symbol, days in days_changed.items()}
+
+    def find_gaps(self, untils: dict, start: str, min_session_ratio: float = 0.0) -> dict:
+        """
+        {symbol: {'missing': days, 'partial': days}} of symbols with gaps.
+        untils: {symbol: date until which bars are downloaded}
+        A symbol is checked from its first covered day, so days before its listing are not gaps.
+        """
+        gaps_symbols = {}
+        symbols = sorted(s for s, until in untils.items() if until is not None)
+        end = max((untils[s] for s in symbols), default=start)
+        for symbol, coverage in self.iter_coverage(symbols, start, end):
+            gaps = detect_gaps(coverage, str(coverage['day'][0]), untils[symbol], min_session_ratio)
+            if len(gaps['missing']) or len(gaps['partial']):
+                gaps_symbols[symbol] = gaps
+        return gaps_symbols
+
+    def rebuild(self, symbol: str, chunksize: int = 100000) -> int:
+        """
+        Rebuild the coverage of symbol from bars_1min, for bars stored before the index existed.
+        Returns the number of covered days.
+        """
+        self._ensure_table()
+        query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_bars_min)
+        days_num = 0
+        pending = None
+        for rows in self._client_db.fetch_chunks(query, (symbol,), chunksize):
+            columns = bars_columns_from_rows(rows)
+            if pending is not None:
+                columns = concat_bars_columns([pending, columns])
+            # the last day may continue in the next chunk.
+            complete, pending = split_bars_columns_at_last_day(columns)
+            self.upsert(symbol, complete)
+            days_num += len(np.unique(complete['t'] // NS_PER_DAY))
+        if pending is not None and len(pending['t']):
+            self.upsert(symbol, pending)
+            days_num += 1
+        return days_num
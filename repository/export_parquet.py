@@ -0,0 +1,280 @@
+import json
+import os
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from logging import Logger
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote
+from repository.client import ClientDB, get_client_db
+from repository import RepositoryPaperTrade
+from repository.coverage import CoverageBars
+from data_types import PriceDataCategory, TimeFrame, QueryType
+from logger_alpaca.logger_alpaca import get_logger
+from metrics_alpaca.metrics_alpaca import counter
+
+_rows_exported = counter('export_parquet_rows_total', 'Bars written to the parquet dataset.')
+_partitions_written = counter('export_parquet_partitions_total', 'Partition files written to the parquet dataset.')
+
+WATERMARKS_FILE_NAME = '_watermarks.json'
+PARTITION_FILE_NAME = 'part-0.parquet'
+
+
+def rows_to_export_columns(rows: list) -> dict:
+    """
+    Columns of rows of "select/{table}_range.sql" ((time, symbol, open, high, low, close, volume), ...),
+    without symbol, which is a partition of the dataset. Volume is uint64 for the resampled frames.
+    """
+    times, _, o, h, l, c, v = zip(*rows)
+    return {
+        'time': np.array(times, dtype='datetime64[us]'),
+        'open': np.array(o, dtype=np.float64),
+        'high': np.array(h, dtype=np.float64),
+        'low': np.array(l, dtype=np.float64),
+        'close': np.array(c, dtype=np.float64),
+        'volume': np.array(v, dtype=np.uint64)
+    }
+
+
+def iter_partitions(chunks: Iterator[list], unit: str) -> Iterator[tuple]:
+    """
+    (start of the partition as datetime64[unit], columns) of rows streamed in time order.
+    unit: "M" for monthly, "Y" for yearly partitions. Only one partition is held in memory.
+    """
+    key = None
+    parts = []
+    for rows in chunks:
+        columns = rows_to_export_columns(rows)
+        keys = columns['time'].astype(f'datetime64[{unit}]')
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if key is not None and keys[start] != key:
+                yield key, {k: np.concatenate([p[k] for p in parts]) for k in columns.keys()}
+                parts = []
+            key = keys[start]
+            parts.append({k: v[start:end] for k, v in columns.items()})
+    if parts:
+        yield key, {k: np.concatenate([p[k] for p in parts]) for k in parts[0].keys()}
+
+
+def get_partition_keys(days: np.ndarray, unit: str) -> np.ndarray:
+    # starts of the partitions holding "days", as datetime64[unit].
+    return np.unique(days.astype(f'datetime64[{unit}]'))
+
+
+def get_partition_dir(dataset_dir: str, symbol: str, key: np.datetime64) -> str:
+    # hive layout, symbols like "BTC/USD" are uri encoded as hive readers expect.
+    year, month = str(key.astype('datetime64[M]')).split('-')
+    partition_dir = f'{dataset_dir}/symbol={quote(symbol, safe="")}/year={int(year)}'
+    if key.dtype == np.dtype('datetime64[M]'):
+        partition_dir = f'{partition_dir}/month={int(month)}'
+    return partition_dir
+
+
+@dataclass
+class ExportReport:
+    symbols: int = 0
+    partitions: int = 0
+    rows: int = 0
+
+
+@dataclass
+class ExportParquet:
+    """
+    Bars tables exported into hive-partitioned parquet datasets, "{_dest_dir}/{table}/symbol=/year=/month=/",
+    for spark, duckdb or pandas jobs that read predicate-pushed slices without touching the db.
+    bars_1min is partitioned by month, the smaller resampled frames by year.
+    Each partition is one file of row groups sorted by time with min/max statistics.
+    An export starts at the partition holding the first day after the symbol's watermark
+    ("_watermarks.json" of the dataset, the "until" of market_data_dl_progress exported last),
+    so a nightly run rewrites the latest partition and adds the new ones only.
+    Partitions before it are rewritten when bars_1min_coverage records a write of one of their days
+    (a repair or a backfill) since the previous export of all symbols.
+    Needs the optional package "pyarrow", imported on the first write.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    # built from the fields above when not given.
+    _repository_pt: Optional[RepositoryPaperTrade] = None
+    _coverage: Optional[CoverageBars] = None
+    _dest_dir: str = f'{Path(__file__).parent}/../export_data'
+    _start_time: str = '2016-01-01'
+    _tbl_names: dict = field(default_factory=lambda: {
+        TimeFrame.MIN: 'bars_1min',
+        TimeFrame.HOUR: 'bars_1hour',
+        TimeFrame.DAY: 'bars_1day'
+    })
+    _partition_units: dict = field(default_factory=lambda: {
+        TimeFrame.MIN: 'M',
+        TimeFrame.HOUR: 'Y',
+        TimeFrame.DAY: 'Y'
+    })
+    # about a week of minute bars, so a time filter skips row groups within a month.
+    _row_group_size: int = 5000
+    _compression: str = 'zstd'
+    _chunksize: int = 100000
+    # changes are read from this long before the previous export, for writes of transactions open meanwhile.
+    _changes_overlap_seconds: int = 600
+
+    def __post_init__(self) -> None:
+        if self._repository_pt is None:
+            self._repository_pt = RepositoryPaperTrade(_client_db=self._client_db)
+        if self._coverage is None:
+            self._coverage = CoverageBars(_client_db=self._client_db)
+
+    def _get_dataset_dir(self, time_frame: TimeFrame) -> str:
+        return f'{self._dest_dir}/{self._tbl_names[time_frame]}'
+
+    def load_watermarks(self, time_frame: TimeFrame) -> dict:
+        """
+        {'symbols': {symbol: exported "until"}, 'changed_at': db time the coverage changes are read from}.
+        """
+        path = f'{self._get_dataset_dir(time_frame)}/{WATERMARKS_FILE_NAME}'
+        if not os.path.exists(path):
+            return {'symbols': {}, 'changed_at': None}
+        with open(path, 'r') as f:
+            watermarks = json.load(f)
+        # written before changes were tracked: the watermarks of symbols only.
+        if 'symbols' not in watermarks:
+            return {'symbols': watermarks, 'changed_at': None}
+        return watermarks
+
+    def _save_watermarks(self, time_frame: TimeFrame, watermarks: dict) -> None:
+        path = f'{self._get_dataset_dir(time_frame)}/{WATERMARKS_FILE_NAME}'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(watermarks, f, indent=2, sort_keys=True)
+        os.replace(f'{path}.tmp', path)
+
+    def _write_partition(self, partition_dir: str, columns: dict) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('The parquet export needs "pyarrow": pip install pyarrow')
+        table = pa.table({
+            'time': pa.array(columns['time'], type=pa.timestamp('us', tz='UTC')),
+            **{k: pa.array(v) for k, v in columns.items() if k != 'time'}
+        })
+        os.makedirs(partition_dir, exist_ok=True)
+        # readers skip files starting with ".", so a partial file is never read.
+        path_tmp = f'{partition_dir}/.{PARTITION_FILE_NAME}.tmp'
+        pq.write_table(
+            table,
+            path_tmp,
+            row_group_size=self._row_group_size,
+            compression=self._compression,
+            write_statistics=True
+        )
+        os.replace(path_tmp, f'{partition_dir}/{PARTITION_FILE_NAME}')
+
+    def _get_export_start(self, time_frame: TimeFrame, watermark: Optional[str]) -> str:
+        # start of the partition of the first day to export, a partition file is always written whole.
+        if watermark is None:
+            day_first = np.datetime64(self._start_time, 'D')
+        else:
+            day_first = np.datetime64(watermark, 'D') + 1
+        return str(day_first.astype(f'datetime64[{self._partition_units[time_frame]}]').astype('datetime64[D]'))
+
+    def _export_range(self, time_frame: TimeFrame, symbol: str, time_start: str, time_end: str) -> ExportReport:
+        # write the partitions of the bars in [time_start, time_end), streamed from db one partition at a time.
+        query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_names[time_frame]}_range')
+        query = query.format(symbols='%s')
+        dataset_dir = self._get_dataset_dir(time_frame)
+        report = ExportReport()
+        chunks = self._client_db.fetch_chunks(query, (symbol, time_start, time_end), self._chunksize)
+        for key, columns in iter_partitions(chunks, self._partition_units[time_frame]):
+            self._write_partition(get_partition_dir(dataset_dir, symbol, key), columns)
+            report.partitions += 1
+            report.rows += len(columns['time'])
+        return report
+
+    def export_symbol(
+            self,
+            time_frame: TimeFrame,
+            symbol: str,
+            until: str,
+            watermark: str = None,
+            days_changed: np.ndarray = None
+    ) -> ExportReport:
+        """
+        Write the partitions of symbol from the one holding the day after "watermark" through "until",
+        and the other partitions holding "days_changed".
+        """
+        export_start = self._get_export_start(time_frame, watermark)
+        export_new = watermark is None or watermark < until
+        report = ExportReport(symbols=1)
+        if days_changed is not None:
+            for key in get_partition_keys(days_changed, self._partition_units[time_frame]):
+                key_start = key.astype('datetime64[D]')
+                # written below with the new bars.
+                if export_new and str(key_start) >= export_start:
+                    break
+                key_end = (key + 1).astype('datetime64[D]')
+                report_key = self._export_range(time_frame, symbol, str(key_start), str(key_end))
+                report.partitions += report_key.partitions
+                report.rows += report_key.rows
+        if export_new:
+            time_end = (datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            report_new = self._export_range(time_frame, symbol, export_start, time_end)
+            report.partitions += report_new.partitions
+            report.rows += report_new.rows
+        _partitions_written.inc(report.partitions)
+        _rows_exported.inc(report.rows)
+        self._logger.debug(
+            'Exported "%s" %s. partitions: %d, rows: %d', symbol, time_frame.value, report.partitions, report.rows
+        )
+        return report
+
+    def _get_changed_at_next(self) -> str:
+        # read before the changes, so a write during the export is exported again by the next one.
+        changed_at_next = self._coverage.get_time_now() - timedelta(seconds=self._changes_overlap_seconds)
+        return changed_at_next.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def export(self, time_frames: tuple = (TimeFrame.MIN,), symbols: list = None, full: bool = False) -> dict:
+        """
+        Export the bars downloaded since the last export of each symbol (all downloaded symbols by default),
+        and the partitions of days rewritten since the last export of all symbols.
+        full: ignore the watermarks and rewrite every partition.
+        Returns {time_frame: ExportReport}.
+        """
+        reports = {}
+        for time_frame in time_frames:
+            time_start = datetime.now()
+            changed_at_next = self._get_changed_at_next()
+            watermarks = self.load_watermarks(time_frame)
+            days_changed = {}
+            if not full and watermarks['changed_at'] is not None:
+                days_changed = self._coverage.get_days_changed(watermarks['changed_at'])
+            report = ExportReport()
+            targets = symbols
+            if targets is None:
+                targets = self._repository_pt.get_symbols_downloaded(PriceDataCategory.BAR, time_frame)
+            for symbol in targets:
+                until = self._repository_pt.get_date_downloaded_until(PriceDataCategory.BAR, time_frame, symbol)
+                watermark = None if full else watermarks['symbols'].get(symbol)
+                if until is None:
+                    continue
+                if watermark is not None and watermark >= until and symbol not in days_changed:
+                    continue
+                symbol_report = self.export_symbol(time_frame, symbol, until, watermark, days_changed.get(symbol))
+                report.symbols += 1
+                report.partitions += symbol_report.partitions
+                report.rows += symbol_report.rows
+                # saved per symbol, so an interrupted export resumes where it stopped.
+                watermarks['symbols'][symbol] = until
+                self._save_watermarks(time_frame, watermarks)
+            # changes of symbols out of "symbols" are left for an export of all symbols.
+            if symbols is None:
+                watermarks['changed_at'] = changed_at_next
+                self._save_watermarks(time_frame, watermarks)
+            reports[time_frame] = report
+            self._logger.info((
+                f'Exported {self._tbl_names[time_frame]} to "{self._get_dataset_dir(time_frame)}". '
+                f'symbols: {report.symbols}, partitions: {report.partitions}, rows: {report.rows}, '
+                f'time: "{datetime.now() - time_start}"'
+            ))
+        return reports
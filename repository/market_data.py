@@ -1,59 +1,143 @@
 import os
 import shutil
-import yaml
+import threading
+import numpy as np
 import pandas as pd
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from glob import glob
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from functools import partial
+from datetime import date, datetime, timedelta
 from logging import Logger
-from typing import Optional
+from typing import Iterator, Optional
 from pathlib import Path
-from repository.client import ClientMarketData, ClientDB
+from repository.client import ClientMarketData, ClientDB, get_client_db
 from repository import RepositoryPaperTrade
-from data_types import TimeFrame, PriceDataCategory, QueryType
+from repository.bars_columnar import (
+    NS_PER_DAY,
+    decode_bars_page,
+    concat_bars_columns,
+    split_bars_columns_at_last_day,
+    bars_columns_from_rows,
+    bars_columns_to_lines,
+    bars_columns_to_df,
+    bars_rows_to_df,
+    build_panel,
+    empty_bars_columns,
+    slice_bars_columns
+)
+from repository.spool import get_spool, read_spool_page, write_spool_page_atomic
+from repository.checkpoint import DownloadJournal, list_download_pages
+from repository.pipeline import iter_pipeline, bounded_queue_size
+from repository.bars_schema import BARS_SCHEMA_VERSION, SchemaBarsMin
+from repository.bars_cache import CacheBars
+from repository.coverage import CoverageBars, group_days_into_spans
+from data_types import TimeFrame, PriceDataCategory, QueryType, SpoolFormat, BulkInsertMode
 from logger_alpaca.logger_alpaca import get_logger
 from exception import FailDownloadPriceData
+from metrics_alpaca.metrics_alpaca import counter, histogram
+
+_decode_seconds = histogram('bars_decode_seconds', 'Decode of a page of bars into columns.')
+_bars_decoded = counter('bars_decoded_total', 'Bars decoded from pages of the api.')
+_spool_bytes = counter('spool_bytes_written_total', 'Bytes of page files written to the spool.')
+_spool_pages = counter('spool_pages_written_total', 'Page files written to the spool.')
+_spool_read_seconds = histogram('spool_read_seconds', 'Read of a page file of the spool.')
 
 
 @dataclass
 class RepositoryMarketData:
-    _logger: Logger = get_logger(__name__)
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
     _start_time: str = '2016-01-01'
     _end_time: str = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d')
     _category: PriceDataCategory = PriceDataCategory.BAR
     _time_frame: TimeFrame = TimeFrame.MIN
-    _client_db: ClientDB = ClientDB()
+    _client_db: ClientDB = field(default_factory=get_client_db)
     _tbl_name_bars_min: str = 'bars_1min'
-    _dl_destination = f'{Path(__file__).parent}/../api_data'
+    _dl_destination: str = f'{Path(__file__).parent}/../api_data'
+    _spool_format: SpoolFormat = SpoolFormat.NPZ
+    _bulk_insert_mode: BulkInsertMode = BulkInsertMode.UPSERT
+    # read bars through the local columnar cache instead of querying db every time.
+    _use_cache: bool = True
+    _bars_cache: CacheBars = field(default_factory=CacheBars)
+    # built from the fields above when not given.
+    _client_md: Optional[ClientMarketData] = None
+    _repository_pt: Optional[RepositoryPaperTrade] = None
+    # stream pages straight into db instead of spooling the whole span to files first.
+    _streaming: bool = True
+    _pipeline_batch_bars: int = 200000
+    _pipeline_memory_limit: int = 512 * 1024 ** 2
+    # rough in-memory size of a bar as a dict of the api response and as typed columns.
+    _bytes_raw_bar = 700
+    _bytes_columns_bar = 44
+    # months of one shard of "backfill_bars".
+    _shard_months: int = 1
+    # symbols of one request of "update_bars_in_db_batched", and the longest span it downloads.
+    _symbols_per_request: int = 100
+    _batched_max_days: int = 7
 
     def __post_init__(self) -> None:
-        self._repository_pt = RepositoryPaperTrade(
-            _client_db=self._client_db
+        if self._repository_pt is None:
+            self._repository_pt = RepositoryPaperTrade(
+                _client_db=self._client_db
+            )
+        if self._client_md is None:
+            self._client_md = ClientMarketData(
+                _start_time=self._start_time,
+                _end_time=self._end_time,
+                _category=self._category,
+                _time_frame=self._time_frame,
+                _client_db=self._client_db
+            )
+        self._coverage = CoverageBars(
+            _client_db=self._client_db,
+            _tbl_name_bars_min=self._tbl_name_bars_min
         )
-        self._client_md = ClientMarketData(
-            _start_time=self._start_time,
-            _end_time=self._end_time,
-            _category=self._category,
-            _time_frame=self._time_frame,
-            _client_db=self._client_db
+        self._schema_bars_min = SchemaBarsMin(
+            _client_db=self._client_db,
+            _tbl_name=self._tbl_name_bars_min,
+            _start_time=self._start_time
         )
-        self._create_tables()
+        self._tables_lock = threading.Lock()
+        self._tables_created = False
         self._dest_dl_category = f'{self._dl_destination}/{self._category.value}'
+        self._spool = get_spool(self._spool_format)
 
     def _create_tables(self) -> None:
-        q_bars_min = self._client_db.load_query_by_name(QueryType.CREATE, self._tbl_name_bars_min)
-        self._client_db.cur.execute(q_bars_min)
-        self._client_db.conn.commit()
+        # new installs get the latest schema, a legacy table is kept until "tools/migrate_bars_1min.py" is run.
+        self._schema_bars_min.create_table()
+        if self._schema_bars_min.get_version() == BARS_SCHEMA_VERSION:
+            self._schema_bars_min.add_future_partitions()
+        else:
+            self._logger.warning(f'Table "{self._tbl_name_bars_min}" is a legacy schema, migration is recommended.')
         self._logger.info('Initialized tables market_data is completed.')
 
+    def _ensure_tables(self) -> None:
+        # tables are created on first use, so constructing the repository touches no db.
+        with self._tables_lock:
+            if not self._tables_created:
+                self._create_tables()
+                self._tables_created = True
+
     def _count_symbol_table_bars_1min(self, symbol: str) -> int:
+        self._ensure_tables()
         query = self._client_db.load_query_by_name(QueryType.COUNT, 'bars_1min_symbol')
-        self._client_db.cur.execute(query, (symbol,))
-        return self._client_db.cur.fetchone()[0]
+        return self._client_db.fetch_one(query, (symbol,))[0]
+
+    def _get_range_query(self, symbols: list, start: Optional[str], end: Optional[str]) -> tuple:
+        # start and end are dates and both are included, like "_start_time" and "_end_time".
+        query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name_bars_min}_range')
+        query = query.format(symbols=', '.join(['%s'] * len(symbols)))
+        time_start = self._start_time if start is None else start
+        time_end = (
+            datetime.strptime(self._end_time if end is None else end, '%Y-%m-%d') + timedelta(days=1)
+        ).strftime('%Y-%m-%d')
+        return query, (*symbols, time_start, time_end)
 
-    def _load_bars_min_dataframe(self, symbol: str) -> pd.DataFrame:
-        query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_bars_min)
-        return pd.read_sql(query, self._client_db.conn, params=(symbol,))
+    def _update_bars_before_load(self, symbols: list) -> None:
+        if len(symbols) == 1:
+            self.update_bars_in_db(symbols[0])
+        else:
+            self.update_bars_in_db_concurrently(symbols)
 
     def _get_dest_dl_ctg_symbol_timeframe(
             self,
@@ -64,45 +148,103 @@ class RepositoryMarketData:
         time_span = f'{dl_date_start}_{dl_date_end}'
         return f'{self._dest_dl_category}/{symbol}/{self._time_frame.value}/{time_span}'
 
+    def _find_span_resumable(self, symbol: str, dl_date_start: str, dl_date_end: str) -> Optional[str]:
+        """
+        End date of a span from "dl_date_start" left by an earlier run that ended before "dl_date_end"
+        (the end moves daily), None if there is none. Its page tokens belong to the query of its own end,
+        so it is finished as it is and the days after it are downloaded as another span.
+        A span ending after "dl_date_end" is not resumed, the progress would pass the requested end.
+        """
+        for dir_path in sorted(glob(self._get_dest_dl_ctg_symbol_timeframe(symbol, dl_date_start, '*'))):
+            dl_date_end_prev = os.path.basename(dir_path).split('_')[1]
+            if dl_date_end_prev < dl_date_end and DownloadJournal.exists(dir_path):
+                return dl_date_end_prev
+        return None
+
+    def _iter_price_data_pages(
+            self,
+            symbol: str,
+            dl_date_start: str,
+            dl_date_end: str,
+            page_token: str = None
+    ) -> Iterator[dict]:
+        # follow the "next_page_token" chain of the api, from "page_token" when resuming.
+        next_page_token = page_token
+        while True:
+            bars_seg = self._client_md.request_price_data_segment(
+                symbol=symbol,
+                dl_start_time=dl_date_start,
+                page_token=next_page_token,
+                dl_end_time=dl_date_end
+            )
+            yield bars_seg
+            if bars_seg['next_page_token'] is None:
+                return
+            next_page_token = bars_seg['next_page_token']
+
     def _download_price_data(
             self,
             symbol: str,
             dl_date_start: str,
             dl_date_end: str
-    ) -> None:
-        self._logger.debug((
-            f'Download price data "{symbol} will start. '
-            f'Category: {self._category.value}, '
-            f'TimeFrame: {self._time_frame.value}, '
-            f'Span: "{dl_date_start}" -> "{dl_date_end}".'
-        ))
+    ) -> int:
+        """
+        Download pages of the span into files, recording each page in the checkpoint journal.
+        A span interrupted by an earlier run is resumed from its last recorded page,
+        and a completed one is not downloaded again. Returns the number of pages of the span.
+        """
         time_start = datetime.now()
         # make dir for download symbol bars data
         dl_bars_seg_dst = self._get_dest_dl_ctg_symbol_timeframe(symbol, dl_date_start, dl_date_end)
         os.makedirs(dl_bars_seg_dst, exist_ok=True)
+        journal = DownloadJournal.load(dl_bars_seg_dst)
+        if journal.completed:
+            self._logger.debug(
+                'Price data "%s" "%s" -> "%s" is already downloaded.', symbol, dl_date_start, dl_date_end
+            )
+            return len(journal.pages)
+        self._logger.debug(
+            'Download price data "%s" will start. Category: %s, TimeFrame: %s, '
+            'Span: "%s" -> "%s", Resume from page: %d.',
+            symbol, self._category.value, self._time_frame.value, dl_date_start, dl_date_end, len(journal.pages)
+        )
         # download bars of symbol
-        next_page_token = None
         try:
-            while True:
-                bars_seg = self._client_md.request_price_data_segment(
-                    symbol=symbol,
-                    dl_start_time=dl_date_start,
-                    page_token=next_page_token
+            pages = self._iter_price_data_pages(symbol, dl_date_start, dl_date_end, journal.get_next_page_token())
+            for bars_seg in pages:
+                # save bars_seg data in file, decoded into typed columns.
+                file_name = f'page-{len(journal.pages):06d}.{self._spool.extension}'
+                bars_columns = self._decode_bars_page(bars_seg)
+                size = write_spool_page_atomic(
+                    self._spool,
+                    f'{dl_bars_seg_dst}/{file_name}',
+                    bars_seg,
+                    bars_columns
                 )
-                # save bars_seg data in file
-                title = f'head' if next_page_token is None else next_page_token
-                with open(f'{dl_bars_seg_dst}/{title}.yaml', 'w') as f:
-                    yaml.dump(bars_seg, f, indent=2)
-                # reset next token for download
-                if bars_seg['next_page_token'] is None:
-                    break
-                next_page_token = bars_seg['next_page_token']
-            self._logger.info(f'Request bars set "{symbol}" are completed. time: "{datetime.now() - time_start}"')
-        except (Exception, KeyboardInterrupt):
-            # if download fails, delete the half-files
-            shutil.rmtree(dl_bars_seg_dst)
-            raise FailDownloadPriceData(f'Downloading price data "{symbol}" is failed. removed the half-download files.')
-        # update download progress status
+                journal.add_page(file_name, bars_seg['next_page_token'], len(bars_columns['t']), size)
+                _spool_bytes.inc(size)
+                _spool_pages.inc()
+                self._logger.debug('Downloaded "%s" page: %d', symbol, len(journal.pages))
+            self._logger.info((
+                f'Request bars set "{symbol}" are completed. '
+                f'pages: {len(journal.pages)}, time: "{datetime.now() - time_start}"'
+            ))
+        except Exception as e:
+            # downloaded pages are kept, the next run resumes from the journal.
+            raise FailDownloadPriceData((
+                f'Downloading price data "{symbol}" is failed. '
+                f'{len(journal.pages)} pages are kept in "{dl_bars_seg_dst}" to resume.'
+            )) from e
+        return len(journal.pages)
+
+    @staticmethod
+    def _decode_bars_page(page: dict) -> dict:
+        with _decode_seconds.span():
+            bars_columns = decode_bars_page(page['bars'])
+        _bars_decoded.inc(len(bars_columns['t']))
+        return bars_columns
+
+    def _update_dl_progress(self, symbol: str, dl_date_end: str) -> None:
         self._repository_pt.update_market_data_dl_progress(
             category=self._category,
             time_frame=self._time_frame,
@@ -112,6 +254,7 @@ class RepositoryMarketData:
         )
 
     def _get_should_start_dl_date(self, symbol: str) -> Optional[str]:
+        self._ensure_tables()
         # get latest date of symbol for download
         dl_date_start = self._repository_pt.get_date_should_download(
             category=self._category,
@@ -123,13 +266,11 @@ class RepositoryMarketData:
             dl_date_start = self._start_time
         # if the latest dl date is newer than end_time, the dl is not executed.
         elif self._end_time < dl_date_start:
-            self._logger.debug((
-                f'Price Data {symbol} is already downloaded. '
-                f'Category: {self._category.value}, '
-                f'TimeFrame: {self._time_frame.value}, '
-                f'Downloaded until: {dl_date_start}, '
-                f'Designated dl until: {self._end_time}'
-            ))
+            self._logger.debug(
+                'Price Data %s is already downloaded. Category: %s, TimeFrame: %s, '
+                'Downloaded until: %s, Designated dl until: %s',
+                symbol, self._category.value, self._time_frame.value, dl_date_start, self._end_time
+            )
             return None
         return dl_date_start
 
@@ -139,59 +280,125 @@ class RepositoryMarketData:
             dl_start_date: str,
             dl_end_date: str
     ) -> list:
-        self._download_price_data(symbol, dl_start_date, dl_end_date)
-        price_data_paths = glob(f'{self._get_dest_dl_ctg_symbol_timeframe(symbol, dl_start_date, dl_end_date)}/*.yaml')
+        price_data_paths = list_download_pages(
+            self._get_dest_dl_ctg_symbol_timeframe(symbol, dl_start_date, dl_end_date)
+        )
         prices_len = len(price_data_paths)
         time_start = datetime.now()
         prices_data = []
-        time_prev = time_start
         for i, path in enumerate(price_data_paths):
-            with open(path, 'r') as f:
-                d = yaml.safe_load(f)
-                prices_data.append(d)
-            # report progress
-            time_now = datetime.now()
-            self._logger.debug((
-                f'Loading "{symbol} from files": {i + 1}/{prices_len}, '
-                f'Load time: "{time_now - time_prev}"'
-            ))
-            time_prev = time_now
+            with _spool_read_seconds.span():
+                prices_data.append(read_spool_page(path))
+            self._logger.debug('Loading "%s" from files: %d/%d', symbol, i + 1, prices_len)
         self._logger.info(f'Complete Loading "{symbol}". time: {datetime.now() - time_start}s.')
         return prices_data
 
-    def _load_bars_lines_from_files(
+    def _load_bars_columns_from_files(
             self, symbol: str,
             dl_start_date: str,
             dl_end_date: str
-    ) -> list:
+    ) -> dict:
         time_start = datetime.now()
         price_data_list = self._load_price_data_from_files(symbol, dl_start_date, dl_end_date)
-        price_data_len = len(price_data_list)
-        bars_lines = []
-        # time record
-        prev_time = time_start
-        # convert price data to bars_lines
-        for i, price_data in enumerate(price_data_list):
-            for bar in price_data['bars']:
-                # convert format RFC3339 to mysql_datetime
-                bar_time = datetime.strptime(bar['t'], '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d %H:%M:%S')
-                bars_lines.append([bar_time, symbol, bar['o'], bar['h'], bar['l'], bar['c'], bar['v']])
-            # report progress
-            now_time = datetime.now()
-            self._logger.debug((
-                f'Symbol: "{symbol}", '
-                f'Making bars lines: "{i + 1}/{price_data_len}", '
-                f'Time: "{now_time - prev_time}"'
-            ))
-            prev_time = now_time
-        # sort ascending by time
-        bars_lines.sort(key=lambda b: b[0])
+        # merge pages, sort ascending by time and drop duplicated bars of page boundaries.
+        bars_columns = concat_bars_columns([price_data.columns for price_data in price_data_list])
+        self._logger.info((
+            f'Complete Loading bars columns "{symbol}", '
+            f'Bars: {len(bars_columns["t"])}, '
+            f'Total time: "{datetime.now() - time_start}"'
+        ))
+        return bars_columns
+
+    def _commit_bars(self, symbol: str, bars_columns: dict, time_until: str) -> None:
+        """
+        Insert bars complete until "time_until" and their coverage, then advance the download progress
+        and extend the cache of the symbol if it is cached.
+        """
+        time_until_prev = self._repository_pt.get_date_downloaded_until(self._category, self._time_frame, symbol)
+        if len(bars_columns['t']) != 0:
+            self._client_db.bulk_insert_lines(
+                self._tbl_name_bars_min,
+                bars_columns_to_lines(symbol, bars_columns),
+                self._bulk_insert_mode
+            )
+            self._coverage.upsert(symbol, bars_columns)
+        # update download progress status after the bars are committed.
+        self._update_dl_progress(symbol, time_until)
+        self._bars_cache.extend_if_cached(symbol, self._time_frame, bars_columns, time_until, time_until_prev)
+
+    def _store_downloaded_bars_in_db(self, symbol: str, dl_start_date: str, dl_end_date: str = None) -> None:
+        dl_end_date = self._end_time if dl_end_date is None else dl_end_date
+        bars_columns = self._load_bars_columns_from_files(symbol, dl_start_date, dl_end_date)
+        self._commit_bars(symbol, bars_columns, dl_end_date)
+        self._logger.info(f'Bars "{self._time_frame.value}" "{symbol}" is updated in db until {dl_end_date}.')
+
+    def _iter_bars_batches(self, pages: Iterator[dict]) -> Iterator[dict]:
+        """
+        Decode pages and group them into batches of about "_pipeline_batch_bars" bars.
+        A batch ends at a day boundary, so every day in a batch is complete.
+        """
+        batch_bars = self._get_pipeline_batch_bars()
+        pending = []
+        pending_len = 0
+        for page in pages:
+            columns = self._decode_bars_page(page)
+            pending.append(columns)
+            pending_len += len(columns['t'])
+            if pending_len < batch_bars:
+                continue
+            batch, rest = split_bars_columns_at_last_day(concat_bars_columns(pending))
+            pending = [rest]
+            pending_len = len(rest['t'])
+            if len(batch['t']) != 0:
+                yield batch
+        batch = concat_bars_columns(pending)
+        if len(batch['t']) != 0:
+            yield batch
+
+    def _get_pipeline_batch_bars(self) -> int:
+        # a batch is held by the queue and as insert lines, keep a few of them within the memory limit.
+        return max(self._client_md._limit, min(
+            self._pipeline_batch_bars,
+            self._pipeline_memory_limit // 4 // (self._bytes_columns_bar + self._bytes_raw_bar)
+        ))
+
+    def _update_bars_in_db_streaming(self, symbol: str, dl_start_date: str) -> None:
+        """
+        fetch page -> decode and normalize -> batch insert, each stage in its own thread with bounded queues.
+        Download progress advances to the last complete day of each committed batch.
+        """
+        time_start = datetime.now()
+        maxsize_pages = bounded_queue_size(
+            self._pipeline_memory_limit,
+            self._client_md._limit * self._bytes_raw_bar,
+            shares=4
+        )
+        maxsize_batches = bounded_queue_size(
+            self._pipeline_memory_limit,
+            self._get_pipeline_batch_bars() * (self._bytes_columns_bar + self._bytes_raw_bar),
+            shares=4
+        )
+        batches = iter_pipeline(
+            source=self._iter_price_data_pages(symbol, dl_start_date, self._end_time),
+            stages=[self._iter_bars_batches],
+            maxsizes=[maxsize_pages, maxsize_batches]
+        )
+        bars_num = 0
+        try:
+            for batch in batches:
+                time_until = np.datetime_as_string(np.datetime64(int(batch['t'][-1] // NS_PER_DAY), 'D'))
+                self._commit_bars(symbol, batch, time_until)
+                bars_num += len(batch['t'])
+        except Exception as e:
+            raise FailDownloadPriceData(
+                f'Streaming price data "{symbol}" is failed. committed bars: {bars_num}.'
+            ) from e
+        # nothing more exists until the end of the span.
+        self._commit_bars(symbol, empty_bars_columns(), self._end_time)
         self._logger.info((
-            f'Complete Loading bars_lines "{symbol}", '
-            f'Total time: "{datetime.now() - time_start}", '
-            f'Sort time: "{datetime.now() - prev_time}"'
+            f'Bars "{self._time_frame.value}" "{symbol}" is updated in db by streaming. '
+            f'Bars: {bars_num}, Time: "{datetime.now() - time_start}"'
         ))
-        return bars_lines
 
     def update_bars_in_db(self, symbol: str) -> None:
         dl_start_date = self._get_should_start_dl_date(symbol)
@@ -201,14 +408,396 @@ class RepositoryMarketData:
                 f'Update bars data will be skipped.'
             ))
             return
-        query = self._client_db.load_query_by_name(QueryType.INSERT, self._tbl_name_bars_min)
-        bars_lines = self._load_bars_lines_from_files(symbol, dl_start_date, self._end_time)
-        self._client_db.insert_lines(query, bars_lines)
-        self._logger.info(f'Bars "{self._time_frame.value}" "{symbol}" is updated in db.')
-
-    def load_bars_df(self, symbol: str) -> pd.DataFrame:
-        self.update_bars_in_db(symbol)
-        return self._load_bars_min_dataframe(symbol)
+        if self._streaming:
+            self._update_bars_in_db_streaming(symbol, dl_start_date)
+            return
+        self._download_and_store_bars_in_db(symbol, dl_start_date)
+
+    def _download_and_store_bars_in_db(self, symbol: str, dl_start_date: str) -> int:
+        pages_num = 0
+        dl_end_date_prev = self._find_span_resumable(symbol, dl_start_date, self._end_time)
+        if dl_end_date_prev is not None:
+            self._logger.info(f'Resume the span "{dl_start_date}" -> "{dl_end_date_prev}" of "{symbol}".')
+            pages_num += self._download_price_data(symbol, dl_start_date, dl_end_date_prev)
+            self._store_downloaded_bars_in_db(symbol, dl_start_date, dl_end_date_prev)
+            dl_start_date = (
+                datetime.strptime(dl_end_date_prev, '%Y-%m-%d') + timedelta(days=1)
+            ).strftime('%Y-%m-%d')
+        pages_num += self._download_price_data(symbol, dl_start_date, self._end_time)
+        self._store_downloaded_bars_in_db(symbol, dl_start_date)
+        return pages_num
+
+    def update_bars_in_db_concurrently(self, symbols: list, max_workers: int = 8) -> None:
+        """
+        Download pages of many symbols at once with a thread pool.
+        All threads share the client's token bucket, so the whole api rate budget is used,
+        and each thread loads its symbol into db on a connection of the pool.
+        """
+        dl_start_dates = {}
+        for symbol in symbols:
+            dl_start_date = self._get_should_start_dl_date(symbol)
+            if dl_start_date is None:
+                self._logger.info(f'Bars "{self._time_frame.value}" "{symbol}" is latest in db. skipped.')
+                continue
+            dl_start_dates[symbol] = dl_start_date
+        symbols_len = len(dl_start_dates)
+        time_start = datetime.now()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._download_and_store_bars_in_db, symbol, dl_start_date): symbol
+                for symbol, dl_start_date in dl_start_dates.items()
+            }
+            for i, future in enumerate(as_completed(futures)):
+                symbol = futures[future]
+                try:
+                    pages_num = future.result()
+                except FailDownloadPriceData as e:
+                    self._logger.error(str(e))
+                    continue
+                self._logger.info((
+                    f'Symbols progress: {i + 1}/{symbols_len}, '
+                    f'Symbol: "{symbol}", '
+                    f'Pages: {pages_num}, '
+                    f'Elapsed: "{datetime.now() - time_start}"'
+                ))
+
+    def _iter_price_data_pages_multi(self, symbols: list, dl_date_start: str, dl_date_end: str) -> Iterator[dict]:
+        next_page_token = None
+        while True:
+            page = self._client_md.request_price_data_segment_multi(
+                symbols=symbols,
+                dl_start_time=dl_date_start,
+                page_token=next_page_token,
+                dl_end_time=dl_date_end
+            )
+            yield page
+            if page['next_page_token'] is None:
+                return
+            next_page_token = page['next_page_token']
+
+    def _download_bars_multi(self, symbols: list, dl_date_start: str) -> dict:
+        """
+        Download the span of many symbols with multi-symbol requests and split the pages by symbol.
+        Returns {symbol: columns}, symbols without bars have empty columns.
+        """
+        columns_lists = {symbol: [] for symbol in symbols}
+        for page in self._iter_price_data_pages_multi(symbols, dl_date_start, self._end_time):
+            # "bars" is null when no symbol has bars in the span.
+            for symbol, bars in (page['bars'] or {}).items():
+                columns_lists[symbol].append(self._decode_bars_page({'bars': bars}))
+        return {symbol: concat_bars_columns(columns_list) for symbol, columns_list in columns_lists.items()}
+
+    def _commit_bars_many(self, columns_by_symbol: dict, time_until: str) -> None:
+        """
+        "_commit_bars" of many symbols with one insert of bars, one of coverage and one update of progress.
+        """
+        untils_prev = {
+            symbol: self._repository_pt.get_date_downloaded_until(self._category, self._time_frame, symbol)
+            for symbol in columns_by_symbol
+        }
+        lines = [
+            line
+            for symbol, bars_columns in columns_by_symbol.items()
+            for line in bars_columns_to_lines(symbol, bars_columns)
+        ]
+        if lines:
+            self._client_db.bulk_insert_lines(self._tbl_name_bars_min, lines, self._bulk_insert_mode)
+            self._coverage.upsert_many(columns_by_symbol)
+        # update download progress status after the bars are committed.
+        self._repository_pt.update_market_data_dl_progress_many(
+            self._category,
+            self._time_frame,
+            [(symbol, time_until, None) for symbol in columns_by_symbol]
+        )
+        for symbol, bars_columns in columns_by_symbol.items():
+            self._bars_cache.extend_if_cached(
+                symbol, self._time_frame, bars_columns, time_until, untils_prev[symbol]
+            )
+
+    def _update_bars_in_db_multi(self, symbols: list, dl_start_date: str) -> int:
+        try:
+            columns_by_symbol = self._download_bars_multi(symbols, dl_start_date)
+        except Exception as e:
+            raise FailDownloadPriceData(
+                f'Download price data of {len(symbols)} symbols "{symbols[0]}".."{symbols[-1]}" '
+                f'from "{dl_start_date}" is failed. {type(e).__name__}: {e}'
+            ) from e
+        self._commit_bars_many(columns_by_symbol, self._end_time)
+        return sum(len(bars_columns['t']) for bars_columns in columns_by_symbol.values())
+
+    def update_bars_in_db_batched(self, symbols: list, max_workers: int = 4) -> None:
+        """
+        Incremental update of many symbols with multi-symbol requests. Symbols downloaded until the same date
+        are requested "_symbols_per_request" at a time, so a daily update costs one request per "limit" bars
+        instead of at least one per symbol. The bars of a request are held in memory, so symbols behind
+        by more than "_batched_max_days" days are updated one by one with "update_bars_in_db_concurrently".
+        """
+        date_batched_from = (
+            datetime.strptime(self._end_time, '%Y-%m-%d') - timedelta(days=self._batched_max_days)
+        ).strftime('%Y-%m-%d')
+        groups = {}
+        symbols_behind = []
+        for symbol in symbols:
+            dl_start_date = self._get_should_start_dl_date(symbol)
+            if dl_start_date is None:
+                continue
+            if dl_start_date < date_batched_from:
+                symbols_behind.append(symbol)
+                continue
+            groups.setdefault(dl_start_date, []).append(symbol)
+        if symbols_behind:
+            self.update_bars_in_db_concurrently(symbols_behind, max_workers)
+        batches = []
+        for dl_start_date, symbols_group in sorted(groups.items()):
+            # alpaca orders the bars of a page by symbol.
+            symbols_group = sorted(symbols_group)
+            batches.extend(
+                (dl_start_date, symbols_group[i:i + self._symbols_per_request])
+                for i in range(0, len(symbols_group), self._symbols_per_request)
+            )
+        time_start = datetime.now()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._update_bars_in_db_multi, symbols_request, dl_start_date): symbols_request
+                for dl_start_date, symbols_request in batches
+            }
+            for i, future in enumerate(as_completed(futures)):
+                symbols_request = futures[future]
+                try:
+                    bars_num = future.result()
+                except FailDownloadPriceData as e:
+                    self._logger.error(str(e))
+                    continue
+                self._logger.info((
+                    f'Batches progress: {i + 1}/{len(batches)}, '
+                    f'Symbols: "{symbols_request[0]}".."{symbols_request[-1]}" ({len(symbols_request)}), '
+                    f'Bars: {bars_num}, '
+                    f'Elapsed: "{datetime.now() - time_start}"'
+                ))
+
+    def _get_shard_spans(self, dl_start_date: str) -> list:
+        # [(start, end), ...] of "_shard_months" calendar months, both dates included.
+        spans = []
+        date_start = datetime.strptime(dl_start_date, '%Y-%m-%d').date()
+        date_end = datetime.strptime(self._end_time, '%Y-%m-%d').date()
+        while date_start <= date_end:
+            month_index = date_start.year * 12 + date_start.month - 1 + self._shard_months
+            date_next = date(month_index // 12, month_index % 12 + 1, 1)
+            spans.append((date_start.isoformat(), min(date_next - timedelta(days=1), date_end).isoformat()))
+            date_start = date_next
+        return spans
+
+    def backfill_bars(self, symbol: str, max_workers: int = 8) -> None:
+        """
+        Download the span of symbol as month shards, each with its own page chain, concurrently
+        within the shared token bucket. Shards are loaded into db in date order, and the download
+        progress advances to the end of each loaded shard.
+        When a shard fails, the others are still downloaded, so a rerun resumes only the failed shards
+        from their checkpoint journals.
+        """
+        dl_start_date = self._get_should_start_dl_date(symbol)
+        if dl_start_date is None:
+            self._logger.info(f'Bars "{self._time_frame.value}" "{symbol}" is latest in db. skipped.')
+            return
+        spans = self._get_shard_spans(dl_start_date)
+        # only the last shard ends at "_end_time", which moves daily, the others end with their months.
+        start_last, end_last = spans[-1]
+        end_last_prev = self._find_span_resumable(symbol, start_last, end_last)
+        if end_last_prev is not None:
+            start_next = (datetime.strptime(end_last_prev, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            spans[-1:] = [(start_last, end_last_prev), (start_next, end_last)]
+        time_start = datetime.now()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._download_price_data, symbol, start, end) for start, end in spans]
+            for i, ((start, end), future) in enumerate(zip(spans, futures)):
+                pages_num = future.result()
+                bars_columns = self._load_bars_columns_from_files(symbol, start, end)
+                self._commit_bars(symbol, bars_columns, end)
+                shutil.rmtree(self._get_dest_dl_ctg_symbol_timeframe(symbol, start, end))
+                self._logger.info((
+                    f'Shards progress "{symbol}": {i + 1}/{len(spans)}, '
+                    f'Span: "{start}" -> "{end}", '
+                    f'Pages: {pages_num}, '
+                    f'Bars: {len(bars_columns["t"])}, '
+                    f'Elapsed: "{datetime.now() - time_start}"'
+                ))
+
+    def find_gaps(self, symbols: list = None, min_session_ratio: float = 0.0) -> dict:
+        """
+        Trading days missing from bars_1min (or with a short regular session) per symbol,
+        looked up in the coverage index. All downloaded symbols by default.
+        """
+        if symbols is None:
+            symbols = self._repository_pt.get_symbols_downloaded(self._category, self._time_frame)
+        untils = {
+            symbol: self._repository_pt.get_date_downloaded_until(self._category, self._time_frame, symbol)
+            for symbol in symbols
+        }
+        return self._coverage.find_gaps(untils, self._start_time, min_session_ratio)
+
+    def repair_bars_days(self, symbol: str, days: list) -> int:
+        """
+        Download only "days" of symbol again and store their bars and coverage.
+        Days the api has no bars for are recorded empty. The download progress does not move.
+        Returns the number of stored bars.
+        """
+        self._ensure_tables()
+        days = np.array(days, dtype='datetime64[D]')
+        bars_num = 0
+        for start, end in group_days_into_spans(days):
+            self._download_price_data(symbol, start, end)
+            bars_columns = self._load_bars_columns_from_files(symbol, start, end)
+            if len(bars_columns['t']) != 0:
+                self._client_db.bulk_insert_lines(
+                    self._tbl_name_bars_min,
+                    bars_columns_to_lines(symbol, bars_columns),
+                    self._bulk_insert_mode
+                )
+                self._coverage.upsert(symbol, bars_columns)
+            days_span = days[(days >= np.datetime64(start)) & (days <= np.datetime64(end))]
+            days_found = np.unique(bars_columns['t'] // NS_PER_DAY).astype('datetime64[D]')
+            self._coverage.mark_empty_days(symbol, days_span[~np.isin(days_span, days_found)].tolist())
+            shutil.rmtree(self._get_dest_dl_ctg_symbol_timeframe(symbol, start, end))
+            bars_num += len(bars_columns['t'])
+        # the cache can only be extended at its end.
+        self._bars_cache.invalidate(symbol, self._time_frame)
+        self._logger.info(f'Repaired {len(days)} days of "{symbol}". Bars: {bars_num}')
+        return bars_num
+
+    def iter_bars_df(
+            self,
+            symbols,
+            start: str = None,
+            end: str = None,
+            update: bool = True,
+            chunksize: int = 100000
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Stream bars of "symbols" between the dates "start" and "end" (both included)
+        as DataFrames of at most "chunksize" rows, ordered by symbol and time.
+        """
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        # "IN ()" is not valid sql.
+        if not symbols:
+            return
+        if update:
+            self._update_bars_before_load(symbols)
+        self._ensure_tables()
+        query, params = self._get_range_query(symbols, start, end)
+        for rows in self._client_db.fetch_chunks(query, params, chunksize):
+            yield bars_rows_to_df(rows)
+
+    def _load_bars_columns(self, symbol: str, check_watermark: bool = True) -> dict:
+        """
+        Whole history of the symbol read through the local cache.
+        The cache is used as is when its watermark equals the download progress,
+        otherwise the bars from the first day after the cached watermark are read from db again,
+        since backfills and streamed bars may have rewritten them, and replace the cached ones.
+        check_watermark: if False, a cached symbol is returned without touching db.
+        """
+        cached = self._bars_cache.get(symbol, self._time_frame)
+        if cached is not None and not check_watermark:
+            return cached.columns
+        time_until = self._repository_pt.get_date_downloaded_until(self._category, self._time_frame, symbol)
+        if cached is not None and cached.until == time_until:
+            return cached.columns
+        self._ensure_tables()
+        if cached is None or cached.until is None:
+            query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_bars_min)
+            params = (symbol,)
+        else:
+            time_from = (datetime.strptime(cached.until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name_bars_min}_from')
+            params = (symbol, time_from)
+        bars_columns = concat_bars_columns([
+            bars_columns_from_rows(rows) for rows in self._client_db.fetch_chunks(query, params)
+        ])
+        if cached is not None and cached.until is not None:
+            idx_from = np.searchsorted(cached.columns['t'], np.datetime64(params[1], 'ns').astype(np.int64))
+            bars_columns = concat_bars_columns([slice_bars_columns(cached.columns, stop=int(idx_from)), bars_columns])
+        self._bars_cache.put(symbol, self._time_frame, bars_columns, time_until)
+        return bars_columns
+
+    def _slice_bars_columns_by_date(self, bars_columns: dict, start: Optional[str], end: Optional[str]) -> dict:
+        _, (time_start, time_end) = self._get_range_query([], start, end)
+        t_range = np.array([time_start, time_end], dtype='datetime64[ns]').astype(np.int64)
+        idx_start, idx_end = np.searchsorted(bars_columns['t'], t_range, side='left')
+        return slice_bars_columns(bars_columns, int(idx_start), int(idx_end))
+
+    def load_bars_df(
+            self,
+            symbols,
+            start: str = None,
+            end: str = None,
+            update: bool = True,
+            chunksize: int = 100000
+    ) -> pd.DataFrame:
+        """
+        Bars of one symbol (str) or several symbols, in the long format of table bars_1min.
+        update: download the missing bars before loading.
+        With "_use_cache", bars are read from the local cache, and db is not touched at all
+        for cached symbols when update is False.
+        """
+        if not self._use_cache:
+            chunks = list(self.iter_bars_df(symbols, start, end, update, chunksize))
+            if not chunks:
+                return bars_rows_to_df([])
+            return pd.concat(chunks, ignore_index=True)
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        if not symbols:
+            return bars_rows_to_df([])
+        if update:
+            self._update_bars_before_load(symbols)
+        frames = [
+            bars_columns_to_df(symbol, self._slice_bars_columns_by_date(
+                self._load_bars_columns(symbol, check_watermark=update), start, end
+            ))
+            for symbol in symbols
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+    def load_bars_panel(
+            self,
+            symbols: list,
+            start: str = None,
+            end: str = None,
+            fields: tuple = ('close', 'volume'),
+            update: bool = True,
+            chunksize: int = 100000
+    ) -> pd.DataFrame:
+        """
+        Wide panel of "fields" (index: time, columns: (field, symbol)).
+        Rows are streamed into per-symbol arrays, the long table is never built.
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return build_panel({}, fields)
+        if update:
+            self._update_bars_before_load(symbols)
+        if self._use_cache:
+            columns_names = {'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'}
+            series = {}
+            for symbol in symbols:
+                bars_columns = self._slice_bars_columns_by_date(
+                    self._load_bars_columns(symbol, check_watermark=update), start, end
+                )
+                series[symbol] = {'t': bars_columns['t']}
+                series[symbol].update({f: bars_columns[columns_names[f]] for f in fields})
+            return build_panel(series, fields)
+        self._ensure_tables()
+        query, params = self._get_range_query(symbols, start, end)
+        parts = {}
+        for rows in self._client_db.fetch_chunks(query, params, chunksize):
+            df = bars_rows_to_df(rows)
+            for symbol, idx in df.groupby('symbol', sort=False).indices.items():
+                part = {'t': df['time'].values[idx].astype(np.int64)}
+                part.update({f: df[f].values[idx] for f in fields})
+                parts.setdefault(symbol, []).append(part)
+        series = {
+            symbol: {k: np.concatenate([p[k] for p in symbol_parts]) for k in symbol_parts[0].keys()}
+            for symbol, symbol_parts in parts.items()
+        }
+        return build_panel(series, fields)
 
 
 def main():
@@ -0,0 +1,273 @@
+import threading
+import time
+import numpy as np
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from logging import Logger
+from typing import Optional
+from repository.client import ClientDB, ClientMarketData, ClientMarketDataStream, get_client_db
+from repository import RepositoryPaperTrade
+from repository.bars_columnar import (
+    BARS_COLUMNS_DTYPE,
+    decode_bars_page,
+    epoch_ns_to_datetime_str,
+    bars_columns_to_lines,
+    to_epoch_ns
+)
+from repository.resample import NS_PER_MINUTE
+from repository.ring_buffer import RingBufferBars
+from data_types import PriceDataCategory, TimeFrame, BulkInsertMode
+from exception import StreamDisconnected
+from logger_alpaca.logger_alpaca import get_logger
+from metrics_alpaca.metrics_alpaca import counter, histogram
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0)
+_bar_latency_seconds = histogram(
+    'realtime_bar_latency_seconds',
+    'From the close of a streamed bar to its commit in bars_1min.',
+    _LATENCY_BUCKETS
+)
+_pipeline_seconds = histogram(
+    'realtime_pipeline_seconds',
+    'From the receipt of a streamed bar to its commit in bars_1min.',
+    _LATENCY_BUCKETS
+)
+_bars_received = counter('realtime_bars_received_total', 'Bars received from the stream.')
+_bars_written = counter('realtime_bars_written_total', 'Streamed bars committed to bars_1min.')
+_bars_gap_filled = counter('realtime_bars_gap_filled_total', 'Bars missed while disconnected, filled from the api.')
+_reconnects = counter('realtime_reconnects_total', 'Reconnects to the stream.')
+_bars_dropped = counter('realtime_bars_dropped_total', 'Streamed bars not written, the db failed at shutdown.')
+
+
+@dataclass
+class RealtimeStats:
+    bars_received: int = 0
+    bars_written: int = 0
+    bars_gap_filled: int = 0
+    bars_dropped: int = 0
+    flushes: int = 0
+    reconnects: int = 0
+    # seconds from bar close to commit of the latest bars.
+    latencies: deque = field(default_factory=partial(deque, maxlen=100000))
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def add_gap_filled(self, bars_num: int) -> None:
+        # gap fills of successive reconnects may run at once.
+        with self._lock:
+            self.bars_gap_filled += bars_num
+
+    def get_latency_quantiles(self, quantiles: tuple = (0.5, 0.95, 0.99, 1.0)) -> dict:
+        if not self.latencies:
+            return {}
+        values = np.quantile(np.fromiter(self.latencies, dtype=np.float64), quantiles)
+        return {f'p{round(q * 100)}': float(v) for q, v in zip(quantiles, values)}
+
+
+@dataclass
+class RepositoryRealtimeBars:
+    """
+    Minute bars of the realtime stream written into bars_1min as they close.
+    A receiver thread decodes bar messages into a ring buffer of typed columns, and a flusher thread writes
+    them in micro-batches of "_flush_rows" bars or when the oldest buffered bar waited "_flush_interval" sec.
+    When the ring is full the receiver stops reading the socket until the flusher catches up.
+    After a reconnect, bars missed while disconnected are filled from the historical api.
+    Download progress and coverage stay with the historical update, which upserts the final bars of each day.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    # built from the fields above when not given.
+    _client_stream: Optional[ClientMarketDataStream] = None
+    _client_md: Optional[ClientMarketData] = None
+    _repository_pt: Optional[RepositoryPaperTrade] = None
+    _tbl_name_bars_min: str = 'bars_1min'
+    _bulk_insert_mode: BulkInsertMode = BulkInsertMode.UPSERT
+    _ring_capacity: int = 1 << 18
+    _flush_rows: int = 5000
+    _flush_interval: float = 0.1
+    _reconnect_delay_max: float = 30.0
+    # symbols of one multi-symbol request of the gap fill.
+    _symbols_per_request: int = 100
+
+    def __post_init__(self) -> None:
+        if self._client_stream is None:
+            self._client_stream = ClientMarketDataStream()
+        if self._client_md is None:
+            self._client_md = ClientMarketData(_client_db=self._client_db)
+        if self._repository_pt is None:
+            self._repository_pt = RepositoryPaperTrade(_client_db=self._client_db)
+        self._ring = RingBufferBars(self._ring_capacity)
+        self._symbols = []
+        self._symbol_index = {}
+        # time of the latest streamed bar, where a gap fill starts after a reconnect.
+        self._last_bar_ns = None
+        self._failure = None
+        self.stats = RealtimeStats()
+
+    def _decode_bar_messages(self, messages: list) -> Optional[dict]:
+        # None if "messages" has no bar of the subscribed symbols.
+        bars = [m for m in messages if m.get('T') == 'b' and m.get('S') in self._symbol_index]
+        if not bars:
+            return None
+        columns = {'t': to_epoch_ns([b['t'] for b in bars])}
+        for k in ('o', 'h', 'l', 'c', 'v'):
+            columns[k] = np.fromiter((b[k] for b in bars), dtype=BARS_COLUMNS_DTYPE[k], count=len(bars))
+        columns['symbol'] = np.fromiter((self._symbol_index[b['S']] for b in bars), dtype=np.int32, count=len(bars))
+        columns['recv'] = np.full(len(bars), time.time_ns(), dtype=np.int64)
+        return columns
+
+    def _receive(self, stop: threading.Event) -> None:
+        delay = 1.0
+        time_connected_ns = time.time_ns()
+        is_reconnect = False
+        while not stop.is_set():
+            try:
+                self._client_stream.connect()
+                self._client_stream.subscribe_bars(self._symbols)
+                if is_reconnect:
+                    # bars closed from the last streamed one until now, later ones arrive on the stream.
+                    gap_start_ns = time_connected_ns
+                    if self._last_bar_ns is not None:
+                        gap_start_ns = self._last_bar_ns + NS_PER_MINUTE
+                    gap = (gap_start_ns, time.time_ns())
+                    threading.Thread(target=self._fill_gap, args=gap, daemon=True).start()
+                time_connected_ns = time.time_ns()
+                delay = 1.0
+                while not stop.is_set():
+                    columns = self._decode_bar_messages(self._client_stream.recv_messages())
+                    if columns is None:
+                        continue
+                    self._ring.put(columns, stop)
+                    self._last_bar_ns = max(self._last_bar_ns or 0, int(columns['t'].max()))
+                    self.stats.bars_received += len(columns['t'])
+                    _bars_received.inc(len(columns['t']))
+            except StreamDisconnected as e:
+                self._logger.warning(f'Stream is disconnected, reconnect after {delay} sec. {e}')
+                self.stats.reconnects += 1
+                _reconnects.inc()
+                is_reconnect = True
+                stop.wait(delay)
+                delay = min(delay * 2, self._reconnect_delay_max)
+            finally:
+                self._client_stream.close()
+
+    def _fill_gap(self, start_ns: int, end_ns: int) -> None:
+        start, end = (f'{s}Z' for s in epoch_ns_to_datetime_str(np.array([start_ns, end_ns]), sep='T').tolist())
+        bars_num = 0
+        try:
+            for i in range(0, len(self._symbols), self._symbols_per_request):
+                symbols = self._symbols[i:i + self._symbols_per_request]
+                page_token = None
+                while True:
+                    page = self._client_md.request_price_data_segment_multi(symbols, start, page_token, end)
+                    lines = [
+                        line
+                        for symbol, bars in (page['bars'] or {}).items()
+                        for line in bars_columns_to_lines(symbol, decode_bars_page(bars))
+                    ]
+                    if lines:
+                        self._client_db.bulk_insert_lines(self._tbl_name_bars_min, lines, self._bulk_insert_mode)
+                    bars_num += len(lines)
+                    page_token = page['next_page_token']
+                    if page_token is None:
+                        break
+        except Exception:
+            # the historical update still downloads these bars, the gap is only open until then.
+            self._logger.exception(f'Gap fill "{start}" -> "{end}" is failed. filled bars: {bars_num}')
+        self.stats.add_gap_filled(bars_num)
+        _bars_gap_filled.inc(bars_num)
+        self._logger.info(f'Filled gap "{start}" -> "{end}" of the stream. Bars: {bars_num}')
+
+    def _write(self, columns: dict) -> None:
+        symbols = np.array(self._symbols, dtype=object)[columns['symbol']]
+        lines = list(zip(
+            epoch_ns_to_datetime_str(columns['t']).tolist(),
+            symbols.tolist(),
+            columns['o'].tolist(),
+            columns['h'].tolist(),
+            columns['l'].tolist(),
+            columns['c'].tolist(),
+            columns['v'].tolist()
+        ))
+        self._client_db.bulk_insert_lines(self._tbl_name_bars_min, lines, self._bulk_insert_mode)
+        time_committed = time.time_ns()
+        latencies = (time_committed - columns['t'] - NS_PER_MINUTE) / 1e9
+        for latency, pipeline in zip(latencies.tolist(), ((time_committed - columns['recv']) / 1e9).tolist()):
+            _bar_latency_seconds.observe(latency)
+            _pipeline_seconds.observe(pipeline)
+        self.stats.latencies.extend(latencies.tolist())
+        self.stats.bars_written += len(lines)
+        self.stats.flushes += 1
+        _bars_written.inc(len(lines))
+
+    def _flush(self, stop: threading.Event, receiver: threading.Thread) -> None:
+        # after "stop", flush what the receiver has buffered until it exits.
+        while True:
+            self._ring.wait_flush(self._flush_rows, self._flush_interval, stop)
+            columns = self._ring.drain(self._flush_rows)
+            if len(columns['t']) == 0:
+                if stop.is_set() and not receiver.is_alive():
+                    return
+                if stop.is_set():
+                    time.sleep(self._flush_interval)
+                continue
+            while True:
+                try:
+                    self._write(columns)
+                    break
+                except Exception:
+                    if stop.is_set() and not receiver.is_alive():
+                        # the historical update still downloads these bars.
+                        self._drop(columns)
+                        break
+                    # keep the batch, the ring fills up and holds back the receiver meanwhile.
+                    self._logger.exception(f'Writing {len(columns["t"])} streamed bars is failed. retry.')
+                    time.sleep(1)
+
+    def _drop(self, columns: dict) -> None:
+        start, end = epoch_ns_to_datetime_str(np.array([columns['t'].min(), columns['t'].max()])).tolist()
+        self._logger.exception((
+            f'Writing {len(columns["t"])} streamed bars is failed at shutdown, dropped. '
+            f'Symbols: {len(np.unique(columns["symbol"]))}, Time: "{start}" -> "{end}"'
+        ))
+        self.stats.bars_dropped += len(columns['t'])
+        _bars_dropped.inc(len(columns['t']))
+
+    def _run_thread(self, target, stop: threading.Event, *args) -> None:
+        try:
+            target(stop, *args)
+        except BaseException as e:
+            self._failure = e
+            stop.set()
+
+    def run(self, symbols: list = None, stop: threading.Event = None) -> RealtimeStats:
+        """
+        Stream bars of "symbols" (active symbols by default) until "stop" is set.
+        """
+        if symbols is None:
+            symbols = self._repository_pt.get_symbols_active(PriceDataCategory.BAR, TimeFrame.MIN)
+        self._symbols = sorted(symbols)
+        self._symbol_index = {symbol: i for i, symbol in enumerate(self._symbols)}
+        stop = threading.Event() if stop is None else stop
+        receiver = threading.Thread(target=self._run_thread, args=(self._receive, stop), daemon=True)
+        flusher = threading.Thread(target=self._run_thread, args=(self._flush, stop, receiver), daemon=True)
+        receiver.start()
+        flusher.start()
+        try:
+            while not stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            stop.set()
+        receiver.join()
+        flusher.join()
+        if self._failure is not None:
+            raise self._failure
+        self._logger.info((
+            f'Realtime bars stopped. received: {self.stats.bars_received}, written: {self.stats.bars_written}, '
+            f'gap filled: {self.stats.bars_gap_filled}, dropped: {self.stats.bars_dropped}, '
+            f'reconnects: {self.stats.reconnects}, '
+            f'latency: {self.stats.get_latency_quantiles()}'
+        ))
+        return self.stats
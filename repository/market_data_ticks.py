@@ -0,0 +1,267 @@
+import os
+import re
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from logging import Logger
+from pathlib import Path
+from typing import Iterator, Optional
+from repository.client import ClientMarketData, ClientDB, get_client_db
+from repository import RepositoryPaperTrade
+from repository.pipeline import iter_pipeline, bounded_queue_size
+from repository.ticks_columnar import (
+    concat_ticks_columns,
+    decode_ticks_page,
+    empty_ticks_columns,
+    split_ticks_columns_by_day
+)
+from data_types import TimeFrame, PriceDataCategory
+from logger_alpaca.logger_alpaca import get_logger
+from exception import FailDownloadPriceData
+
+_DAY_DIR_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class _DayWriter:
+    """
+    Ticks of one day written as "part-NNNNN.npz" files into "{day}.tmp",
+    renamed to "{day}" when the day is complete.
+    """
+
+    def __init__(self, dir_symbol: str, day: str, part_ticks: int) -> None:
+        self.day = day
+        self.ticks_num = 0
+        self._dir_tmp = f'{dir_symbol}/{day}.tmp'
+        self._dir = f'{dir_symbol}/{day}'
+        self._part_ticks = part_ticks
+        self._pending = []
+        self._pending_len = 0
+        self._parts_num = 0
+        # a tmp dir is left by an interrupted run.
+        shutil.rmtree(self._dir_tmp, ignore_errors=True)
+        os.makedirs(self._dir_tmp)
+
+    def append(self, columns: dict) -> None:
+        self._pending.append(columns)
+        self._pending_len += len(columns['t'])
+        self.ticks_num += len(columns['t'])
+        if self._pending_len >= self._part_ticks:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        np.savez_compressed(f'{self._dir_tmp}/part-{self._parts_num:05d}.npz', **concat_ticks_columns(self._pending))
+        self._pending = []
+        self._pending_len = 0
+        self._parts_num += 1
+
+    def commit(self) -> None:
+        self._flush()
+        shutil.rmtree(self._dir, ignore_errors=True)
+        os.replace(self._dir_tmp, self._dir)
+
+
+@dataclass
+class RepositoryTicks:
+    """
+    Quotes or trades stored as compressed columnar files partitioned by day (UTC):
+    "{_tick_destination}/{category}/{symbol}/{YYYY-mm-dd}/part-NNNNN.npz".
+    Pages are streamed into the files of their day and the download progress (category, "tick")
+    advances to each day when it is complete, so a backfill resumes at the first incomplete day
+    and holds at most "_part_ticks" ticks plus the queued pages in memory.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _start_time: str = '2016-01-01'
+    _end_time: str = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d')
+    _category: PriceDataCategory = PriceDataCategory.TRADE
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    # built from the fields above when not given.
+    _repository_pt: Optional[RepositoryPaperTrade] = None
+    _client_md: Optional[ClientMarketData] = None
+    _tick_destination = f'{Path(__file__).parent}/../tick_data'
+    _part_ticks: int = 1000000
+    _pipeline_memory_limit: int = 256 * 1024 ** 2
+    # rough in-memory size of a tick as a dict of the api response.
+    _bytes_raw_tick = 500
+
+    def __post_init__(self) -> None:
+        if self._category == PriceDataCategory.BAR:
+            raise ValueError('Bars are stored by RepositoryMarketData.')
+        self._time_frame = TimeFrame.TICK
+        if self._repository_pt is None:
+            self._repository_pt = RepositoryPaperTrade(
+                _client_db=self._client_db
+            )
+        if self._client_md is None:
+            self._client_md = ClientMarketData(
+                _start_time=self._start_time,
+                _end_time=self._end_time,
+                _category=self._category,
+                _time_frame=self._time_frame,
+                _client_db=self._client_db
+            )
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _ensure_initialized(self) -> None:
+        # progress rows of assets synced before ticks were supported.
+        with self._init_lock:
+            if not self._initialized:
+                self._repository_pt.init_market_data_dl_progress(self._category, self._time_frame)
+                self._initialized = True
+
+    def _get_dir_symbol(self, symbol: str) -> str:
+        return f'{self._tick_destination}/{self._category.value}/{symbol}'
+
+    def _iter_pages(self, symbol: str, dl_date_start: str, dl_date_end: str) -> Iterator[dict]:
+        next_page_token = None
+        while True:
+            page = self._client_md.request_price_data_segment(
+                symbol=symbol,
+                dl_start_time=dl_date_start,
+                page_token=next_page_token,
+                dl_end_time=dl_date_end
+            )
+            yield page
+            if page['next_page_token'] is None:
+                return
+            next_page_token = page['next_page_token']
+
+    def _iter_decoded(self, pages: Iterator[dict]) -> Iterator[dict]:
+        for page in pages:
+            yield decode_ticks_page(self._category, page[self._category.value])
+
+    def _update_dl_progress(self, symbol: str, time_until: str) -> None:
+        self._repository_pt.update_market_data_dl_progress(
+            category=self._category,
+            time_frame=self._time_frame,
+            symbol=symbol,
+            message=None,
+            time_until=time_until
+        )
+
+    def _commit_day(self, symbol: str, writer: _DayWriter) -> None:
+        writer.commit()
+        self._update_dl_progress(symbol, writer.day)
+
+    def update_ticks(self, symbol: str) -> int:
+        """
+        fetch page -> decode -> append to the files of the day, fetch and decode in their own threads.
+        Returns the number of stored ticks.
+        """
+        self._ensure_initialized()
+        dl_start_date = self._repository_pt.get_date_should_download(self._category, self._time_frame, symbol)
+        if dl_start_date is None:
+            dl_start_date = self._start_time
+        elif self._end_time < dl_start_date:
+            self._logger.info(f'{self._category.value} "{symbol}" is latest. skipped.')
+            return 0
+        time_start = datetime.now()
+        maxsize = bounded_queue_size(
+            self._pipeline_memory_limit,
+            self._client_md._limit * self._bytes_raw_tick,
+            shares=2
+        )
+        decoded = iter_pipeline(
+            source=self._iter_pages(symbol, dl_date_start=dl_start_date, dl_date_end=self._end_time),
+            stages=[self._iter_decoded],
+            maxsizes=[maxsize, maxsize]
+        )
+        dir_symbol = self._get_dir_symbol(symbol)
+        writer = None
+        ticks_num = 0
+        try:
+            for columns in decoded:
+                for day, columns_day in split_ticks_columns_by_day(columns):
+                    # pages are in time order, so the previous day is complete.
+                    if writer is not None and writer.day != day:
+                        self._commit_day(symbol, writer)
+                        writer = None
+                    if writer is None:
+                        writer = _DayWriter(dir_symbol, day, self._part_ticks)
+                    writer.append(columns_day)
+                    ticks_num += len(columns_day['t'])
+            if writer is not None:
+                self._commit_day(symbol, writer)
+        except Exception as e:
+            raise FailDownloadPriceData(
+                f'Streaming {self._category.value} "{symbol}" is failed. stored ticks: {ticks_num}.'
+            ) from e
+        # nothing more exists until the end of the span.
+        self._update_dl_progress(symbol, self._end_time)
+        self._logger.info((
+            f'{self._category.value} "{symbol}" is updated. '
+            f'Ticks: {ticks_num}, Time: "{datetime.now() - time_start}"'
+        ))
+        return ticks_num
+
+    def update_ticks_concurrently(self, symbols: list, max_workers: int = 4) -> None:
+        symbols_len = len(symbols)
+        time_start = datetime.now()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.update_ticks, symbol): symbol for symbol in symbols}
+            for i, future in enumerate(as_completed(futures)):
+                symbol = futures[future]
+                try:
+                    ticks_num = future.result()
+                except FailDownloadPriceData as e:
+                    self._logger.error(str(e))
+                    continue
+                self._logger.info((
+                    f'Symbols progress: {i + 1}/{symbols_len}, '
+                    f'Symbol: "{symbol}", '
+                    f'Ticks: {ticks_num}, '
+                    f'Elapsed: "{datetime.now() - time_start}"'
+                ))
+
+    def list_days(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None) -> list:
+        # complete days stored for symbol, start and end are included.
+        dir_symbol = self._get_dir_symbol(symbol)
+        if not os.path.isdir(dir_symbol):
+            return []
+        return sorted(
+            d for d in os.listdir(dir_symbol)
+            if _DAY_DIR_PATTERN.match(d) and (start is None or start <= d) and (end is None or d <= end)
+        )
+
+    def iter_ticks(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[tuple]:
+        """
+        (day, columns) of each stored day, one day in memory at a time.
+        """
+        dir_symbol = self._get_dir_symbol(symbol)
+        for day in self.list_days(symbol, start, end):
+            parts = []
+            for name in sorted(os.listdir(f'{dir_symbol}/{day}')):
+                with np.load(f'{dir_symbol}/{day}/{name}', allow_pickle=False) as d:
+                    parts.append({k: d[k] for k in d.files})
+            yield day, concat_ticks_columns(parts) if parts else empty_ticks_columns(self._category)
+
+    def load_ticks_df(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        columns_list = [columns for _, columns in self.iter_ticks(symbol, start, end)]
+        columns = concat_ticks_columns(columns_list) if columns_list else empty_ticks_columns(self._category)
+        df = pd.DataFrame({
+            k: np.char.decode(v, 'ascii') if v.dtype.kind == 'S' else v
+            for k, v in columns.items()
+        })
+        df['t'] = df['t'].values.astype('datetime64[ns]')
+        return df
+
+
+def main():
+    repo = RepositoryTicks(
+        _category=PriceDataCategory.TRADE,
+        _start_time='2021-06-01',
+        _end_time='2021-06-04'
+    )
+    repo.update_ticks('SPY')
+    print(repo.load_ticks_df('SPY'))
+
+
+if __name__ == '__main__':
+    main()
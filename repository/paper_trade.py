@@ -1,23 +1,55 @@
+import threading
 import pandas as pd
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
 from logging import Logger
 from typing import Optional
-from repository.client import ClientPaperTrade, ClientDB
-from data_types import QueryType, PriceDataCategory, TimeFrame
+from repository.client import ClientPaperTrade, ClientDB, get_client_db
+from data_types import QueryType, PriceDataCategory, TimeFrame, BulkInsertMode
 from logger_alpaca.logger_alpaca import get_logger
 
+# (category, time_frame) pairs that have a row in market_data_dl_progress for each asset.
+DL_PROGRESS_TARGETS = [
+    *((PriceDataCategory.BAR, time_frame) for time_frame in (TimeFrame.MIN, TimeFrame.HOUR, TimeFrame.DAY)),
+    (PriceDataCategory.QUOTE, TimeFrame.TICK),
+    (PriceDataCategory.TRADE, TimeFrame.TICK)
+]
+
+
+@dataclass
+class AssetSyncReport:
+    added: int
+    changed: int
+    delisted: int
+
 
 @dataclass
 class RepositoryPaperTrade:
-    _logger: Logger = get_logger(__name__)
-    _client_db: ClientDB = ClientDB()
-    _client_pt: ClientPaperTrade = ClientPaperTrade()
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    _client_pt: ClientPaperTrade = field(default_factory=ClientPaperTrade)
     _tbl_name_assets: str = 'assets'
     _tbl_name_dl_progress: str = 'market_data_dl_progress'
+    # sync assets with the api on first use, otherwise only when table assets is empty.
+    # entry points ("main.py", "tools/") call "sync_assets" explicitly instead.
+    _sync_assets_on_init: bool = False
 
     def __post_init__(self) -> None:
-        self.create_tables()
-        self._init_market_data_dl_progress()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._progress_lock = threading.RLock()
+        self._progress_cache = {}
+
+    def _ensure_initialized(self) -> None:
+        # tables and download progress are prepared on first use, not on construction.
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.create_tables()
+            if self._sync_assets_on_init or self._count_table_assets() == 0:
+                self.sync_assets()
+            self._initialized = True
 
     def create_tables(self) -> None:
         q_create_assets = self._client_db.load_query_by_name(QueryType.CREATE, self._tbl_name_assets)
@@ -25,74 +57,89 @@ class RepositoryPaperTrade:
             QueryType.CREATE,
             self._tbl_name_dl_progress
         )
-        self._client_db.cur.execute(q_create_assets)
-        self._client_db.cur.execute(q_create_market_data_dl_progress)
-        self._client_db.conn.commit()
+        with self._client_db.cursor() as cur:
+            cur.execute(q_create_assets)
+            cur.execute(q_create_market_data_dl_progress)
         self._logger.info('Initialized tables paper_trade is completed.')
 
-    def _store_assets_to_db(self) -> None:
-        assets = self._client_pt.get_assets()
-        query = self._client_db.load_query_by_name(QueryType.INSERT, self._tbl_name_assets)
-        lines = [
-            (
-                a['id'],
-                a['class'],
-                a['easy_to_borrow'],
-                a['exchange'],
-                a['fractionable'],
-                a['marginable'],
-                a['name'],
-                a['shortable'],
-                a['status'],
-                a['symbol'],
-                a['tradable']
-            )
-            for a in assets
-        ]
-        self._client_db.insert_lines(query, lines)
-
-    def _count_table_assets(self) -> int:
-        query = self._client_db.load_query_by_name(QueryType.COUNT, self._tbl_name_assets)
-        self._client_db.cur.execute(query)
-        return self._client_db.cur.fetchone()[0]
-
-    def _count_market_data_dl_progress(self) -> int:
-        query = self._client_db.load_query_by_name(QueryType.COUNT, self._tbl_name_dl_progress)
-        self._client_db.cur.execute(query)
-        return self._client_db.cur.fetchone()[0]
+    @staticmethod
+    def _asset_to_line(a: dict) -> tuple:
+        # bool of the api is stored as tinyint, so compare as int.
+        return (
+            a['id'],
+            a['class'],
+            int(a['easy_to_borrow']),
+            a['exchange'],
+            int(a['fractionable']),
+            int(a['marginable']),
+            a['name'],
+            int(a['shortable']),
+            a['status'],
+            a['symbol'],
+            int(a['tradable'])
+        )
 
-    def _load_assets_dataframe(self) -> pd.DataFrame:
+    def _load_assets_lines(self) -> dict:
         query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_assets)
-        # if not exist assets data in db, download it.
-        if self._count_table_assets() == 0:
-            self._store_assets_to_db()
-        return pd.read_sql(query, self._client_db.conn)
-
-    def _init_market_data_dl_progress(self) -> None:
-        if self._count_market_data_dl_progress() != 0:
-            self._logger.debug(f'Table "{self._tbl_name_dl_progress}" is already initialized.')
-            return
-        asset_ids = self._load_assets_dataframe()['id']
-        lines = []
-        categories = [
-            PriceDataCategory.BAR.value,
-            PriceDataCategory.QUOTE.value,
-            PriceDataCategory.TRADE.value
+        return {line[0]: tuple(line) for line in self._client_db.fetch_all(query)}
+
+    def sync_assets(self) -> AssetSyncReport:
+        """
+        Diff "/assets" of the api against table assets and upsert only the changed rows.
+        Assets missing from the response are marked inactive.
+        Missing download progress rows of every target are inserted for all assets, new ones included.
+        """
+        time_start = datetime.now()
+        assets_db = self._load_assets_lines()
+        assets_api = {a['id']: self._asset_to_line(a) for a in self._client_pt.get_assets()}
+        idx_status = 8
+        added = [line for asset_id, line in assets_api.items() if asset_id not in assets_db]
+        changed = [
+            line for asset_id, line in assets_api.items()
+            if asset_id in assets_db and assets_db[asset_id] != line
         ]
-        time_frames = [
-            TimeFrame.MIN.value,
-            TimeFrame.HOUR.value,
-            TimeFrame.DAY.value
+        missing = [
+            line[:idx_status] + ('inactive',) + line[idx_status + 1:]
+            for asset_id, line in assets_db.items()
+            if asset_id not in assets_api and line[idx_status] != 'inactive'
         ]
-        default_until = None
-        default_message = None
-        for asset_id in asset_ids:
-            for category in categories:
-                for time_frame in time_frames:
-                    lines.append((category, time_frame, default_until, default_message, asset_id))
-        query = self._client_db.load_query_by_name(QueryType.INSERT, self._tbl_name_dl_progress)
-        self._client_db.insert_lines(query, lines)
-        self._logger.debug(f'Initialize table "{self._tbl_name_dl_progress}" is completed.')
+        delisted = [
+            line for line in changed
+            if line[idx_status] != 'active' and assets_db[line[0]][idx_status] == 'active'
+        ]
+        upsert_lines = added + changed + missing
+        if upsert_lines:
+            self._client_db.bulk_insert_lines(self._tbl_name_assets, upsert_lines, BulkInsertMode.UPSERT)
+        query = self._client_db.load_query_by_name(QueryType.INSERT, f'{self._tbl_name_dl_progress}_init')
+        with self._client_db.cursor() as cur:
+            for category, time_frame in DL_PROGRESS_TARGETS:
+                cur.execute(query, (category.value, time_frame.value))
+        self.invalidate_progress_cache()
+        report = AssetSyncReport(
+            added=len(added),
+            changed=len(changed) - len(delisted),
+            delisted=len(delisted) + len(missing)
+        )
+        self._logger.info((
+            f'Synced assets. added: {report.added}, changed: {report.changed}, '
+            f'delisted: {report.delisted}, time: "{datetime.now() - time_start}"'
+        ))
+        return report
+
+    def init_market_data_dl_progress(self, category: PriceDataCategory, time_frame: TimeFrame) -> None:
+        """
+        Insert the missing progress rows of (category, time_frame) for every asset,
+        for targets added to "DL_PROGRESS_TARGETS" after the assets were synced.
+        """
+        self._ensure_initialized()
+        query = self._client_db.load_query_by_name(QueryType.INSERT, f'{self._tbl_name_dl_progress}_init')
+        self._client_db.execute(query, (category.value, time_frame.value))
+        with self._progress_lock:
+            self._progress_cache.pop((category, time_frame), None)
+
+    def _count_table_assets(self) -> int:
+        query = self._client_db.load_query_by_name(QueryType.COUNT, self._tbl_name_assets)
+        return self._client_db.fetch_one(query)[0]
 
     def _get_df_market_data_dl_progress_active(
             self,
@@ -100,11 +147,24 @@ class RepositoryPaperTrade:
             time_frame: TimeFrame
     ) -> pd.DataFrame:
         query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_dl_progress)
-        return pd.read_sql(
-            query,
-            self._client_db.conn,
-            params=(category.value, time_frame.value)
-        )
+        return self._client_db.fetch_df(query, (category.value, time_frame.value))
+
+    def _get_progress_cache(self, category: PriceDataCategory, time_frame: TimeFrame) -> dict:
+        """
+        symbol -> (asset_id, until) of active assets, loaded once per (category, time_frame).
+        """
+        key = (category, time_frame)
+        with self._progress_lock:
+            if key not in self._progress_cache:
+                query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_dl_progress)
+                rows = self._client_db.fetch_all(query, (category.value, time_frame.value))
+                # (asset_id, category, time_frame, until, message, status, symbol)
+                self._progress_cache[key] = {r[6]: (r[0], r[3]) for r in rows}
+            return self._progress_cache[key]
+
+    def invalidate_progress_cache(self) -> None:
+        with self._progress_lock:
+            self._progress_cache.clear()
 
     def get_symbols_market_data_download_todo(
             self,
@@ -112,13 +172,13 @@ class RepositoryPaperTrade:
             time_frame: TimeFrame,
             time_until: str
     ) -> list:
-        # key: asset_id, value: symbol
-        condition = f'until.isnull() | until < "{time_until}"'
-        df = self._get_df_market_data_dl_progress_active(
-            category=category,
-            time_frame=time_frame
-        ).query(condition).set_index('asset_id')
-        return df['symbol'].values
+        self._ensure_initialized()
+        time_until = datetime.strptime(time_until, '%Y-%m-%d')
+        return [
+            symbol
+            for symbol, (_, until) in self._get_progress_cache(category, time_frame).items()
+            if until is None or until < time_until
+        ]
 
     def update_market_data_dl_progress(
             self,
@@ -128,14 +188,15 @@ class RepositoryPaperTrade:
             time_until: str,
             message: str = None
     ) -> None:
-        asset_id = self._get_df_market_data_dl_progress_active(
-            category,
-            time_frame
-        ).query(f'symbol == "{symbol}"').iat[0, 0]
+        self._ensure_initialized()
+        progress = self._get_progress_cache(category, time_frame)
+        asset_id = progress[symbol][0]
         query = self._client_db.load_query_by_name(QueryType.UPDATE, self._tbl_name_dl_progress)
         param = (time_until, message, asset_id, category.value, time_frame.value)
-        self._client_db.cur.execute(query, param)
-        self._client_db.conn.commit()
+        self._client_db.execute(query, param)
+        # write-through
+        with self._progress_lock:
+            progress[symbol] = (asset_id, datetime.strptime(time_until, '%Y-%m-%d'))
         self._logger.info((
             f'Updated download progress of "{symbol}". '
             f'Category: {category.value}, '
@@ -145,6 +206,57 @@ class RepositoryPaperTrade:
             f'Message: {message}'
         ))
 
+    def update_market_data_dl_progress_many(
+            self,
+            category: PriceDataCategory,
+            time_frame: TimeFrame,
+            progresses: list
+    ) -> None:
+        """
+        Update progress of many symbols with one multi-row statement.
+        progresses: [(symbol, time_until, message), ...]
+        """
+        self._ensure_initialized()
+        progress = self._get_progress_cache(category, time_frame)
+        lines = [
+            (category.value, time_frame.value, time_until, message, progress[symbol][0])
+            for symbol, time_until, message in progresses
+        ]
+        self._client_db.bulk_insert_lines(self._tbl_name_dl_progress, lines, BulkInsertMode.UPSERT)
+        # write-through
+        with self._progress_lock:
+            for symbol, time_until, _ in progresses:
+                progress[symbol] = (progress[symbol][0], datetime.strptime(time_until, '%Y-%m-%d'))
+        self._logger.info((
+            f'Updated download progress of {len(progresses)} symbols. '
+            f'Category: {category.value}, '
+            f'Time frame: {time_frame.value}'
+        ))
+
+    def get_symbols_active(self, category: PriceDataCategory, time_frame: TimeFrame) -> list:
+        # active symbols that have a progress row of (category, time_frame).
+        self._ensure_initialized()
+        return list(self._get_progress_cache(category, time_frame).keys())
+
+    def get_symbols_downloaded(self, category: PriceDataCategory, time_frame: TimeFrame) -> list:
+        # active symbols that have any data downloaded.
+        self._ensure_initialized()
+        return [
+            symbol
+            for symbol, (_, until) in self._get_progress_cache(category, time_frame).items()
+            if until is not None
+        ]
+
+    def get_date_downloaded_until(
+            self,
+            category: PriceDataCategory,
+            time_frame: TimeFrame,
+            symbol: str
+    ) -> Optional[str]:
+        self._ensure_initialized()
+        date = self._get_progress_cache(category, time_frame)[symbol][1]
+        return None if date is None else date.strftime('%Y-%m-%d')
+
     def get_date_should_download(
             self,
             category: PriceDataCategory,
@@ -156,12 +268,11 @@ class RepositoryPaperTrade:
         The start and end dates of the specified download period for the alpaca api are included.
         So when you start a new download, you need to specify the day after the download date.
         """
-        df = self._get_df_market_data_dl_progress_active(category, time_frame).set_index('symbol')
-        date = df.at[symbol, 'until']
-        # when initialized, date becomes None, and after that it becomes NaT. the reason is unknown.
-        if date is None or date is pd.NaT:
+        self._ensure_initialized()
+        date = self._get_progress_cache(category, time_frame)[symbol][1]
+        if date is None:
             return None
-        return (date + pd.tseries.offsets.Day()).strftime('%Y-%m-%d')
+        return (date + timedelta(days=1)).strftime('%Y-%m-%d')
 
 
 def main():
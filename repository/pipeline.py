@@ -0,0 +1,78 @@
+import queue
+import threading
+from typing import Iterable, Iterator
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # block while the queue is full, but give up when the consumer has stopped.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _iter_queue(q: queue.Queue, stop: threading.Event) -> Iterator:
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        if isinstance(item, _Failure):
+            raise item.exception
+        yield item
+
+
+def _run_stage(items: Iterable, q_out: queue.Queue, stop: threading.Event) -> None:
+    try:
+        for item in items:
+            if not _put(q_out, item, stop):
+                return
+        _put(q_out, _END, stop)
+    except BaseException as e:
+        _put(q_out, _Failure(e), stop)
+
+
+def iter_pipeline(source: Iterable, stages: list, maxsizes: list) -> Iterator:
+    """
+    Run "source" and each stage of "stages" (generator function: iterator -> iterator) in its own thread,
+    connected by bounded queues of "maxsizes" (one per thread), and yield the output of the last stage.
+    The bounded queues block the producers, so at most "maxsizes" items of each stage are held in memory.
+    An exception of any stage is raised in the consumer, and stopping the iteration stops every stage.
+    """
+    if len(maxsizes) != len(stages) + 1:
+        raise ValueError('"maxsizes" must have one size for the source and for each stage.')
+    stop = threading.Event()
+    threads = []
+    items = source
+    for stage, maxsize in zip([None] + list(stages), maxsizes):
+        if stage is not None:
+            items = stage(items)
+        q = queue.Queue(maxsize=maxsize)
+        threads.append(threading.Thread(target=_run_stage, args=(items, q, stop), daemon=True))
+        items = _iter_queue(q, stop)
+    for thread in threads:
+        thread.start()
+    try:
+        yield from items
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=1)
+
+
+def bounded_queue_size(memory_limit: int, item_bytes: int, shares: int) -> int:
+    # queue size that keeps the items of one of "shares" queues within the memory limit.
+    return max(1, memory_limit // shares // max(1, item_bytes))
+
@@ -0,0 +1,207 @@
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from logging import Logger
+from typing import Optional
+from repository.client import ClientDB, get_client_db
+from repository import RepositoryPaperTrade
+from repository.bars_columnar import NS_PER_DAY, bars_columns_from_rows, bars_columns_to_lines, concat_bars_columns
+from data_types import TimeFrame, PriceDataCategory, QueryType, BulkInsertMode, TradingSession
+from logger_alpaca.logger_alpaca import get_logger
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+TZ_EXCHANGE = 'America/New_York'
+# [start, end) minute of the day in exchange local time.
+SESSION_MINUTES = {
+    TradingSession.REGULAR: (9 * 60 + 30, 16 * 60),
+    TradingSession.EXTENDED: (4 * 60, 20 * 60)
+}
+BUCKET_NS = {
+    TimeFrame.HOUR: NS_PER_HOUR,
+    TimeFrame.DAY: NS_PER_DAY
+}
+
+
+def to_exchange_local_ns(t: np.ndarray) -> np.ndarray:
+    # wall clock time of the exchange as epoch nanoseconds, daylight saving time applied.
+    return pd.DatetimeIndex(t.astype('datetime64[ns]')).tz_localize('UTC').tz_convert(TZ_EXCHANGE) \
+        .tz_localize(None).as_unit('ns').asi8
+
+
+def exchange_local_ns_to_utc(t_local: np.ndarray) -> np.ndarray:
+    # inverse of "to_exchange_local_ns". sessions and midnight never fall on an ambiguous wall clock time.
+    return pd.DatetimeIndex(t_local.astype('datetime64[ns]')).tz_localize(TZ_EXCHANGE).tz_convert('UTC') \
+        .tz_localize(None).as_unit('ns').asi8
+
+
+def _empty_resampled() -> dict:
+    columns = {k: np.empty(0, dtype=np.float64) for k in ('o', 'h', 'l', 'c')}
+    columns.update(t=np.empty(0, dtype=np.int64), v=np.empty(0, dtype=np.uint64))
+    return columns
+
+
+def resample_bars_columns(
+        columns: dict,
+        time_frame: TimeFrame,
+        session: TradingSession,
+        t_touched: Optional[int] = None
+) -> dict:
+    """
+    Aggregate sorted 1-minute bars columns into "time_frame" bars of the minutes within "session".
+    Buckets are hours and days of the exchange local time, labeled by their start in UTC,
+    so a day bar is labeled at midnight of New York like the day bars of alpaca api.
+    Volume is summed as uint64.
+    t_touched: only buckets containing a minute at or after this epoch ns are returned.
+    """
+    if len(columns['t']) == 0:
+        return _empty_resampled()
+    t_local = to_exchange_local_ns(columns['t'])
+    minute_of_day = (t_local % NS_PER_DAY) // NS_PER_MINUTE
+    session_start, session_end = SESSION_MINUTES[session]
+    in_session = (minute_of_day >= session_start) & (minute_of_day < session_end)
+    if not in_session.any():
+        return _empty_resampled()
+    columns = {k: v[in_session] for k, v in columns.items()}
+    t_local = t_local[in_session]
+    bucket_ns = BUCKET_NS[time_frame]
+    bucket = t_local // bucket_ns
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)]
+    resampled = {
+        't': exchange_local_ns_to_utc(bucket[starts] * bucket_ns),
+        'o': columns['o'][starts],
+        'h': np.maximum.reduceat(columns['h'], starts),
+        'l': np.minimum.reduceat(columns['l'], starts),
+        'c': columns['c'][ends - 1],
+        'v': np.add.reduceat(columns['v'].astype(np.uint64), starts)
+    }
+    if t_touched is not None:
+        is_touched = columns['t'][ends - 1] >= t_touched
+        resampled = {k: v[is_touched] for k, v in resampled.items()}
+    return resampled
+
+
+@dataclass
+class ResampleBars:
+    """
+    Build hour and day bars from bars_1min instead of downloading them from the api.
+    Progress of ("bars", "1Hour") and ("bars", "1Day") in market_data_dl_progress is the "until" of
+    bars_1min the table was built from, so a run recomputes only the buckets touched by newer minutes.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    _session: TradingSession = TradingSession.EXTENDED
+    _time_frames: tuple = (TimeFrame.HOUR, TimeFrame.DAY)
+    _tbl_name_bars_min: str = 'bars_1min'
+    _tbl_names: dict = field(default_factory=lambda: {
+        TimeFrame.HOUR: 'bars_1hour',
+        TimeFrame.DAY: 'bars_1day'
+    })
+    _chunksize: int = 100000
+
+    def __post_init__(self) -> None:
+        self._repository_pt = RepositoryPaperTrade(
+            _client_db=self._client_db
+        )
+        self._tables_lock = threading.Lock()
+        self._tables_created = False
+
+    def _ensure_tables(self) -> None:
+        with self._tables_lock:
+            if not self._tables_created:
+                with self._client_db.cursor() as cur:
+                    for time_frame in self._time_frames:
+                        cur.execute(self._client_db.load_query_by_name(QueryType.CREATE, self._tbl_names[time_frame]))
+                self._tables_created = True
+
+    def _load_minutes(self, symbol: str, time_from: Optional[str]) -> dict:
+        if time_from is None:
+            query = self._client_db.load_query_by_name(QueryType.SELECT, self._tbl_name_bars_min)
+            params = (symbol,)
+        else:
+            query = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name_bars_min}_from')
+            params = (symbol, time_from)
+        return concat_bars_columns([
+            bars_columns_from_rows(rows) for rows in self._client_db.fetch_chunks(query, params, self._chunksize)
+        ])
+
+    def resample_symbol(self, symbol: str) -> dict:
+        """
+        Bring the resampled tables of symbol up to date with bars_1min.
+        Returns {time_frame: number of upserted bars} of the updated time frames.
+        """
+        self._ensure_tables()
+        until_min = self._repository_pt.get_date_downloaded_until(PriceDataCategory.BAR, TimeFrame.MIN, symbol)
+        if until_min is None:
+            return {}
+        untils = {
+            time_frame: self._repository_pt.get_date_downloaded_until(PriceDataCategory.BAR, time_frame, symbol)
+            for time_frame in self._time_frames
+        }
+        time_frames = [tf for tf in self._time_frames if untils[tf] is None or untils[tf] < until_min]
+        if not time_frames:
+            return {}
+        # minutes after "until" (00:00 UTC of the next day) may belong to a bucket that started the day before,
+        # so read from one day earlier. Buckets without newer minutes are dropped by "t_touched".
+        if any(untils[tf] is None for tf in time_frames):
+            time_from = None
+        else:
+            time_from = (
+                datetime.strptime(min(untils[tf] for tf in time_frames), '%Y-%m-%d') - timedelta(days=1)
+            ).strftime('%Y-%m-%d')
+        minutes = self._load_minutes(symbol, time_from)
+        bars_nums = {}
+        for time_frame in time_frames:
+            if untils[time_frame] is None:
+                t_touched = None
+            else:
+                t_touched = int((np.datetime64(untils[time_frame], 'D') + 1).astype('datetime64[ns]').astype(np.int64))
+            bars = resample_bars_columns(minutes, time_frame, self._session, t_touched)
+            if len(bars['t']) != 0:
+                self._client_db.bulk_insert_lines(
+                    self._tbl_names[time_frame],
+                    bars_columns_to_lines(symbol, bars),
+                    BulkInsertMode.UPSERT
+                )
+            self._repository_pt.update_market_data_dl_progress(
+                PriceDataCategory.BAR,
+                time_frame,
+                symbol,
+                until_min,
+                f'resampled from {self._tbl_name_bars_min}'
+            )
+            bars_nums[time_frame] = len(bars['t'])
+        return bars_nums
+
+    def update(self, symbols: list = None, max_workers: int = 4) -> None:
+        """
+        Resample symbols (all downloaded symbols by default) concurrently.
+        """
+        if symbols is None:
+            symbols = self._repository_pt.get_symbols_downloaded(PriceDataCategory.BAR, TimeFrame.MIN)
+        symbols_len = len(symbols)
+        time_start = datetime.now()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.resample_symbol, symbol): symbol for symbol in symbols}
+            for i, future in enumerate(as_completed(futures)):
+                bars_nums = future.result()
+                self._logger.info((
+                    f'Resample progress: {i + 1}/{symbols_len}, '
+                    f'Symbol: "{futures[future]}", '
+                    f'Bars: {", ".join(f"{tf.value}={n}" for tf, n in bars_nums.items()) or "latest"}, '
+                    f'Elapsed: "{datetime.now() - time_start}"'
+                ))
+
+
+def main():
+    resample = ResampleBars()
+    resample.update(['SPY'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import os
+import socket
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from logging import Logger
+from typing import Callable, Optional
+from repository.client import ClientDB, get_client_db
+from repository import RepositoryPaperTrade
+from data_types import QueryType, PriceDataCategory, TimeFrame
+from logger_alpaca.logger_alpaca import get_logger
+from metrics_alpaca.metrics_alpaca import counter
+
+_jobs_claimed = counter('scheduler_jobs_claimed_total', 'Download jobs leased by this process.')
+_jobs_completed = counter('scheduler_jobs_completed_total', 'Download jobs completed and released.')
+_jobs_failed = counter('scheduler_jobs_failed_total', 'Download jobs that raised, recorded in "message".')
+_leases_lost = counter('scheduler_leases_lost_total', 'Jobs whose lease expired and was taken before release.')
+
+
+def get_default_owner() -> str:
+    # unique per worker across hosts, fits lease_owner varchar(64).
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[-64:]
+
+
+@dataclass
+class DownloadJob:
+    asset_id: str
+    symbol: str
+    # download progress when claimed, None if never downloaded.
+    until: Optional[datetime]
+
+
+@dataclass
+class SchedulerDownload:
+    """
+    Work queue over market_data_dl_progress: a row of (category, time_frame) whose "until" is before
+    "_time_until" is a job. Workers on any host claim batches of jobs by leasing them for "_lease_seconds",
+    extend the leases of their jobs from a heartbeat thread, and release each job when done, or record
+    the error in "message" and retry it after "_retry_seconds" until "_max_attempts".
+    Jobs that reached "_max_attempts" stay out of the queue until "reset_attempts".
+    A job of a crashed worker is claimed again when its lease expires.
+    """
+    _logger: Logger = field(default_factory=partial(get_logger, __name__))
+    _client_db: ClientDB = field(default_factory=get_client_db)
+    # built from the fields above when not given.
+    _repository_pt: Optional[RepositoryPaperTrade] = None
+    _category: PriceDataCategory = PriceDataCategory.BAR
+    _time_frame: TimeFrame = TimeFrame.MIN
+    # the end date of the downloads, jobs are the rows downloaded until before it.
+    _time_until: str = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d')
+    _owner: str = field(default_factory=get_default_owner)
+    _tbl_name: str = 'market_data_dl_progress'
+    _batch: int = 10
+    _lease_seconds: int = 600
+    _retry_seconds: int = 300
+    _max_attempts: int = 5
+    # candidates read without locks per claimed job, rows locked or leased by other workers meanwhile are skipped.
+    _candidates_factor: int = 4
+
+    def __post_init__(self) -> None:
+        if self._repository_pt is None:
+            self._repository_pt = RepositoryPaperTrade(_client_db=self._client_db, _sync_assets_on_init=False)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _ensure_schema(self) -> None:
+        # lease columns are added to a progress table created before the scheduler existed.
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            self._repository_pt.create_tables()
+            self._repository_pt.init_market_data_dl_progress(self._category, self._time_frame)
+            query = self._client_db.load_query_by_name(QueryType.SELECT, 'table_columns')
+            columns = {r[0] for r in self._client_db.fetch_all(query, (self._tbl_name,))}
+            if 'lease_owner' not in columns:
+                query = self._client_db.load_query_by_name(QueryType.ALTER, f'{self._tbl_name}_add_lease')
+                self._client_db.execute(query)
+                self._logger.info(f'Added lease columns to "{self._tbl_name}".')
+            self._schema_ready = True
+
+    def _execute_rowcount(self, query: str, params: tuple) -> int:
+        with self._client_db.cursor() as cur:
+            cur.execute(query, params)
+            return cur.rowcount
+
+    def claim(self, limit: int = None) -> list:
+        """
+        Lease up to "limit" ("_batch" by default) jobs, the least recently downloaded first.
+        Candidates are read without locks, then locked by primary key with "FOR UPDATE SKIP LOCKED",
+        checked again to be still due, and leased in the same transaction, so concurrent workers never lease
+        the same job, never lease one completed meanwhile, and never wait for each other.
+        """
+        self._ensure_schema()
+        limit = limit or self._batch
+        query_candidates = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_candidates')
+        candidates = self._client_db.fetch_all(query_candidates, (
+            self._category.value,
+            self._time_frame.value,
+            self._time_until,
+            self._max_attempts,
+            limit * self._candidates_factor
+        ))
+        if not candidates:
+            return []
+        jobs_candidate = {r[0]: DownloadJob(r[0], r[1], r[2]) for r in candidates}
+        asset_ids_param = ', '.join(['%s'] * len(jobs_candidate))
+        query_claim = self._client_db.load_query_by_name(QueryType.SELECT, f'{self._tbl_name}_claim')
+        query_lease = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_lease')
+        with self._client_db.cursor() as cur:
+            cur.execute(
+                query_claim.format(asset_ids=asset_ids_param),
+                (
+                    self._category.value,
+                    self._time_frame.value,
+                    *jobs_candidate.keys(),
+                    self._time_until,
+                    self._max_attempts,
+                    limit
+                )
+            )
+            asset_ids = [r[0] for r in cur.fetchall()]
+            if asset_ids:
+                cur.execute(query_lease.format(asset_ids=', '.join(['%s'] * len(asset_ids))), (
+                    self._owner,
+                    self._lease_seconds,
+                    self._category.value,
+                    self._time_frame.value,
+                    *asset_ids
+                ))
+        _jobs_claimed.inc(len(asset_ids))
+        self._logger.debug('Claimed %d of %d candidate jobs. owner: %s', len(asset_ids), len(candidates), self._owner)
+        return [jobs_candidate[asset_id] for asset_id in asset_ids]
+
+    def heartbeat(self) -> int:
+        # extend the leases of all jobs of this owner. Returns the number of extended leases.
+        query = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_heartbeat')
+        return self._execute_rowcount(query, (self._lease_seconds, self._owner))
+
+    def release(self, job: DownloadJob) -> bool:
+        """
+        Release a completed job. False if its lease was lost to another worker meanwhile,
+        the work is then done twice, which the idempotent writes of bars and ticks allow.
+        """
+        query = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_release')
+        released = self._execute_rowcount(
+            query,
+            (job.asset_id, self._category.value, self._time_frame.value, self._owner)
+        ) == 1
+        if released:
+            _jobs_completed.inc()
+        else:
+            _leases_lost.inc()
+            self._logger.warning(f'Lease of "{job.symbol}" was lost before release. owner: {self._owner}')
+        return released
+
+    def fail(self, job: DownloadJob, message: str) -> None:
+        # record the error and keep the job from being claimed again for "_retry_seconds".
+        query = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_fail')
+        self._execute_rowcount(query, (
+            self._retry_seconds,
+            message[:256],
+            job.asset_id,
+            self._category.value,
+            self._time_frame.value,
+            self._owner
+        ))
+        _jobs_failed.inc()
+
+    def reset_attempts(self) -> int:
+        """
+        Make the failed jobs of (category, time_frame) claimable now, those that reached "_max_attempts" included,
+        e.g. after the cause of the errors was fixed. Leased jobs are kept. Returns the number of reset jobs.
+        """
+        self._ensure_schema()
+        query = self._client_db.load_query_by_name(QueryType.UPDATE, f'{self._tbl_name}_reset_attempts')
+        reset_num = self._execute_rowcount(query, (self._category.value, self._time_frame.value))
+        self._logger.info((
+            f'Reset the attempts of {reset_num} jobs. '
+            f'Category: {self._category.value}, Time frame: {self._time_frame.value}'
+        ))
+        return reset_num
+
+    def _run_heartbeat(self, stop: threading.Event) -> None:
+        while not stop.wait(self._lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                # the leases expire if this keeps failing, and the jobs are claimed by other workers.
+                self._logger.warning(f'Heartbeat failed. owner: {self._owner}, error: {e}')
+
+    def run(self, handler: Callable[[str], object], max_jobs: int = None) -> int:
+        """
+        Claim jobs and call "handler(symbol)" for each until no job is left (or "max_jobs" are done).
+        The handler downloads the symbol and advances its download progress.
+        Returns the number of completed jobs.
+        """
+        time_start = datetime.now()
+        jobs_done = 0
+        stop = threading.Event()
+        thread_heartbeat = threading.Thread(target=self._run_heartbeat, args=(stop,), daemon=True)
+        thread_heartbeat.start()
+        try:
+            while max_jobs is None or jobs_done < max_jobs:
+                jobs = self.claim(self._batch if max_jobs is None else min(self._batch, max_jobs - jobs_done))
+                if not jobs:
+                    break
+                # other workers advance the progress, read it again for this batch.
+                self._repository_pt.invalidate_progress_cache()
+                for job in jobs:
+                    try:
+                        handler(job.symbol)
+                    except Exception as e:
+                        self._logger.exception(f'Job "{job.symbol}" failed. owner: {self._owner}')
+                        self.fail(job, f'{type(e).__name__}: {e}')
+                        continue
+                    self.release(job)
+                    jobs_done += 1
+        finally:
+            stop.set()
+            thread_heartbeat.join()
+        self._logger.info((
+            f'Worker "{self._owner}" finished. '
+            f'Category: {self._category.value}, Time frame: {self._time_frame.value}, '
+            f'Jobs: {jobs_done}, Elapsed: "{datetime.now() - time_start}"'
+        ))
+        return jobs_done
@@ -0,0 +1,113 @@
+import os
+import yaml
+import numpy as np
+from dataclasses import dataclass
+from glob import glob
+from typing import Optional
+from data_types import SpoolFormat
+from repository.bars_columnar import BARS_COLUMNS_DTYPE, decode_bars_page
+
+
+@dataclass
+class SpoolPage:
+    columns: dict
+    next_page_token: Optional[str]
+
+
+class SpoolNpz:
+    """
+    One uncompressed ".npz" per page holding the decoded typed columns.
+    Loading is a memcpy of each column, no parsing.
+    """
+    extension = 'npz'
+
+    def write_page(self, path: str, page: dict, columns: dict) -> None:
+        next_page_token = page.get('next_page_token')
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                next_page_token=np.array('' if next_page_token is None else next_page_token),
+                **columns
+            )
+
+    def read_page(self, path: str) -> SpoolPage:
+        with np.load(path, allow_pickle=False) as d:
+            columns = {k: d[k] for k in BARS_COLUMNS_DTYPE.keys()}
+            next_page_token = str(d['next_page_token']) or None
+        return SpoolPage(columns, next_page_token)
+
+
+class SpoolYaml:
+    """
+    Legacy format, the raw api response dumped by yaml.
+    """
+    extension = 'yaml'
+
+    def write_page(self, path: str, page: dict, columns: dict) -> None:
+        with open(path, 'w') as f:
+            yaml.dump(page, f, indent=2)
+
+    def read_page(self, path: str) -> SpoolPage:
+        with open(path, 'r') as f:
+            page = yaml.safe_load(f)
+        return SpoolPage(decode_bars_page(page['bars']), page['next_page_token'])
+
+
+_spools = {
+    SpoolFormat.NPZ: SpoolNpz(),
+    SpoolFormat.YAML: SpoolYaml()
+}
+
+
+def get_spool(spool_format: SpoolFormat):
+    return _spools[spool_format]
+
+
+def get_spool_by_path(path: str):
+    return get_spool(SpoolFormat(path.rsplit('.', 1)[-1]))
+
+
+def list_spool_pages(dir_path: str) -> list:
+    # every supported format is listed, so trees written by old versions are still readable.
+    return sorted(p for s in _spools.values() for p in glob(f'{dir_path}/*.{s.extension}'))
+
+
+def write_spool_page_atomic(spool, path: str, page: dict, columns: dict) -> int:
+    """
+    Write a page to a temporary file and rename it to "path", so "path" is never a half-written page.
+    The file is synced before the rename, so a journal naming it never survives a crash without it.
+    Returns the size of the file.
+    """
+    spool.write_page(f'{path}.tmp', page, columns)
+    with open(f'{path}.tmp', 'rb') as f:
+        os.fsync(f.fileno())
+    size = os.path.getsize(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    return size
+
+
+def read_spool_page(path: str) -> SpoolPage:
+    return get_spool_by_path(path).read_page(path)
+
+
+def migrate_spool_tree(
+        root: str,
+        spool_format: SpoolFormat = SpoolFormat.NPZ,
+        remove_source: bool = True
+) -> int:
+    """
+    Rewrite every yaml page under "root" (e.g. "api_data/bars") into "spool_format".
+    Returns the number of migrated pages.
+    """
+    if spool_format == SpoolFormat.YAML:
+        raise ValueError('Migration into the legacy yaml format is not supported.')
+    spool = get_spool(spool_format)
+    migrated_num = 0
+    for path in glob(f'{root}/**/*.{SpoolYaml.extension}', recursive=True):
+        page = read_spool_page(path)
+        path_dst = f'{path.rsplit(".", 1)[0]}.{spool.extension}'
+        spool.write_page(path_dst, {'next_page_token': page.next_page_token}, page.columns)
+        if remove_source:
+            os.remove(path)
+        migrated_num += 1
+    return migrated_num
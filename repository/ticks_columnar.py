@@ -0,0 +1,74 @@
+import numpy as np
+from data_types import PriceDataCategory
+from repository.bars_columnar import NS_PER_DAY, to_epoch_ns
+
+# typed columns of quotes and trades of alpaca api. time is epoch nanoseconds in UTC.
+# exchange and tape codes are one ascii character, conditions are joined by ",".
+TICKS_COLUMNS_DTYPE = {
+    PriceDataCategory.TRADE: {
+        't': np.int64,
+        'x': 'S1',
+        'p': np.float64,
+        's': np.uint32,
+        'c': 'S',
+        'i': np.uint64,
+        'z': 'S1'
+    },
+    PriceDataCategory.QUOTE: {
+        't': np.int64,
+        'ax': 'S1',
+        'ap': np.float64,
+        'as': np.uint32,
+        'bx': 'S1',
+        'bp': np.float64,
+        'bs': np.uint32,
+        'c': 'S',
+        'z': 'S1'
+    }
+}
+
+
+def empty_ticks_columns(category: PriceDataCategory) -> dict:
+    return {k: np.empty(0, dtype=dtype) for k, dtype in TICKS_COLUMNS_DTYPE[category].items()}
+
+
+def decode_ticks_page(category: PriceDataCategory, ticks: list) -> dict:
+    """
+    Convert "quotes" or "trades" of a page of alpaca api into typed columns.
+    """
+    if not ticks:
+        return empty_ticks_columns(category)
+    columns = {}
+    for k, dtype in TICKS_COLUMNS_DTYPE[category].items():
+        if k == 't':
+            columns[k] = to_epoch_ns([tick['t'] for tick in ticks])
+        elif k == 'c':
+            columns[k] = np.array([','.join(tick.get('c') or ()) for tick in ticks], dtype=dtype)
+        elif dtype == 'S1':
+            columns[k] = np.array([tick.get(k, '') for tick in ticks], dtype=dtype)
+        else:
+            columns[k] = np.fromiter((tick[k] for tick in ticks), dtype=dtype, count=len(ticks))
+    return columns
+
+
+def concat_ticks_columns(columns_list: list) -> dict:
+    # ticks of the same time are all kept, the pages are already in time order.
+    return {k: np.concatenate([c[k] for c in columns_list]) for k in columns_list[0].keys()}
+
+
+def split_ticks_columns_by_day(columns: dict) -> list:
+    """
+    [(day as "YYYY-mm-dd" in UTC, columns of the day), ...] of columns sorted by time.
+    """
+    days = columns['t'] // NS_PER_DAY
+    if len(days) == 0:
+        return []
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(days)]
+    return [
+        (
+            str(np.datetime64(int(days[start]), 'D')),
+            {k: v[start:end] for k, v in columns.items()}
+        )
+        for start, end in zip(starts, ends)
+    ]
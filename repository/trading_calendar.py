@@ -0,0 +1,96 @@
+from datetime import date, timedelta
+from functools import lru_cache
+import numpy as np
+
+# minutes of the regular session (09:30-16:00) and of an early close (09:30-13:00) of NYSE.
+SESSION_MINUTES_FULL = 390
+SESSION_MINUTES_EARLY_CLOSE = 210
+# closures not given by the holiday rules.
+SPECIAL_CLOSURES = (
+    date(2018, 12, 5),  # national day of mourning, George H.W. Bush
+    date(2025, 1, 9)  # national day of mourning, Jimmy Carter
+)
+
+
+def _easter(year: int) -> date:
+    # anonymous gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # n-th (1-based, -1 for the last) weekday (Monday is 0) of the month.
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(d: date) -> date:
+    # a holiday on Saturday is observed on Friday, on Sunday on Monday.
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=None)
+def get_holidays(year: int) -> tuple:
+    holidays = [
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving Day
+        _observed(date(year, 12, 25))  # Christmas Day
+    ]
+    # New Year's Day on Saturday is not observed on the Friday before.
+    if date(year, 1, 1).weekday() != 5:
+        holidays.append(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+    holidays.extend(d for d in SPECIAL_CLOSURES if d.year == year)
+    return tuple(sorted(holidays))
+
+
+@lru_cache(maxsize=None)
+def get_early_closes(year: int) -> tuple:
+    holidays = get_holidays(year)
+    candidates = [
+        date(year, 7, 3),  # before Independence Day
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # day after Thanksgiving
+        date(year, 12, 24)  # Christmas Eve
+    ]
+    return tuple(d for d in candidates if d.weekday() < 5 and d not in holidays)
+
+
+def get_trading_days(start: str, end: str) -> np.ndarray:
+    """
+    Days (datetime64[D]) NYSE is open in [start, end], both dates included.
+    """
+    days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    years = range(int(start[:4]), int(end[:4]) + 1)
+    holidays = np.array([d for y in years for d in get_holidays(y)], dtype='datetime64[D]')
+    return days[np.is_busday(days, holidays=holidays)]
+
+
+def get_session_minutes(days: np.ndarray) -> np.ndarray:
+    # minutes of the regular session of each trading day.
+    if len(days) == 0:
+        return np.empty(0, dtype=np.int64)
+    years = range(int(str(days.min())[:4]), int(str(days.max())[:4]) + 1)
+    early_closes = np.array([d for y in years for d in get_early_closes(y)], dtype='datetime64[D]')
+    return np.where(np.isin(days, early_closes), SESSION_MINUTES_EARLY_CLOSE, SESSION_MINUTES_FULL)
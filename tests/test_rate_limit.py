@@ -0,0 +1,37 @@
+"""
+Pacing of TokenBucket against the api mock of benchmark/mock_alpaca.py, which answers 429
+to requests beyond its per-minute limit like alpaca.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmark.mock_alpaca import MockAlpacaServer
+from repository.client import ClientMarketData
+
+# unique, so the bucket shared per rate is not spent by other tests.
+RATE_PER_MIN = 601
+SECONDS = 3
+THREADS = 8
+
+
+def test_no_429_at_configured_rate():
+    server = MockAlpacaServer(rate_limit_per_min=RATE_PER_MIN).start()
+    try:
+        client = ClientMarketData(_base_url=server.url, _api_rate_limit=RATE_PER_MIN, _limit=10)
+        time_end = time.monotonic() + SECONDS
+
+        def request_until_end() -> int:
+            requests_num = 0
+            while time.monotonic() < time_end:
+                client.request_price_data_segment('AAPL', '2021-01-04', dl_end_time='2021-01-04')
+                requests_num += 1
+            return requests_num
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            requests_num = sum(executor.map(lambda _: request_until_end(), range(THREADS)))
+        client.close()
+    finally:
+        server.stop()
+    assert server.rate_limited_num == 0
+    # paced from the first request, the threads finishing their last wait included.
+    assert requests_num <= RATE_PER_MIN * SECONDS / 60 + THREADS + 1
+    assert requests_num >= RATE_PER_MIN * SECONDS / 60 * 0.8
@@ -0,0 +1,93 @@
+"""
+Leases of SchedulerDownload between processes sharing one market_data_dl_progress.
+Needs the MySQL/MariaDB of "DB_*", the tables are created in the database "DB_TEST_NAME"
+(alpaca_market_db_test by default) and emptied on each run. Skipped when the server is unreachable.
+"""
+import multiprocessing
+import os
+import time
+import uuid
+import pytest
+from data_types import BulkInsertMode, PriceDataCategory, TimeFrame
+from repository import RepositoryPaperTrade
+from repository.client import ClientDB
+from repository.scheduler import SchedulerDownload
+
+DB_TEST_NAME = os.getenv('DB_TEST_NAME', 'alpaca_market_db_test')
+TIME_UNTIL = '2021-01-04'
+JOBS = 40
+PROCESSES = 4
+
+
+def _get_client_db() -> ClientDB:
+    return ClientDB(_name=DB_TEST_NAME, _pool_size=2)
+
+
+def _get_scheduler(client_db: ClientDB, owner: str, **kwargs) -> SchedulerDownload:
+    return SchedulerDownload(_client_db=client_db, _owner=owner, _time_until=TIME_UNTIL, **kwargs)
+
+
+def _run_worker(owner: str) -> list:
+    # completes every job it claims, returns the symbols it handled.
+    client_db = _get_client_db()
+    scheduler = _get_scheduler(client_db, owner, _batch=3)
+    symbols = []
+
+    def handler(symbol: str) -> None:
+        symbols.append(symbol)
+        scheduler._repository_pt.update_market_data_dl_progress(PriceDataCategory.BAR, TimeFrame.MIN, symbol, TIME_UNTIL)
+
+    scheduler.run(handler)
+    return symbols
+
+
+@pytest.fixture
+def client_db() -> ClientDB:
+    client_db = _get_client_db()
+    try:
+        client_db.init_db()
+    except Exception as e:
+        pytest.skip(f'MySQL is unreachable: {e}')
+    repository_pt = RepositoryPaperTrade(_client_db=client_db, _sync_assets_on_init=False)
+    repository_pt.create_tables()
+    client_db.execute('DELETE FROM market_data_dl_progress;')
+    client_db.execute('DELETE FROM assets;')
+    client_db.bulk_insert_lines('assets', [
+        (str(uuid.uuid4()), 'us_equity', 1, 'NYSE', 1, 1, f'Test {i}', 1, 'active', f'T{i:03d}', 1)
+        for i in range(JOBS)
+    ], BulkInsertMode.UPSERT)
+    repository_pt.init_market_data_dl_progress(PriceDataCategory.BAR, TimeFrame.MIN)
+    return client_db
+
+
+def test_no_job_is_leased_twice(client_db: ClientDB):
+    with multiprocessing.get_context('spawn').Pool(PROCESSES) as pool:
+        symbols_by_worker = pool.map(_run_worker, [f'worker-{i}' for i in range(PROCESSES)])
+    symbols = [s for worker_symbols in symbols_by_worker for s in worker_symbols]
+    assert len(symbols) == len(set(symbols))
+    assert set(symbols) == {f'T{i:03d}' for i in range(JOBS)}
+    assert _get_scheduler(client_db, 'checker').claim() == []
+
+
+def test_expired_lease_is_taken_over(client_db: ClientDB):
+    # a worker that crashed after claiming, its leases are never extended nor released.
+    crashed = _get_scheduler(client_db, 'crashed', _lease_seconds=1, _batch=5)
+    jobs_crashed = crashed.claim()
+    assert len(jobs_crashed) == 5
+    other = _get_scheduler(client_db, 'other', _batch=JOBS)
+    assert {j.asset_id for j in jobs_crashed}.isdisjoint(j.asset_id for j in other.claim())
+    time.sleep(2)
+    jobs_taken = other.claim()
+    assert {j.asset_id for j in jobs_taken} == {j.asset_id for j in jobs_crashed}
+    assert not crashed.release(jobs_crashed[0])
+    assert other.release(jobs_taken[0])
+
+
+def test_reset_attempts(client_db: ClientDB):
+    scheduler = _get_scheduler(client_db, 'failing', _batch=1, _max_attempts=1, _retry_seconds=0)
+    job = scheduler.claim()[0]
+    scheduler.fail(job, 'RuntimeError: test')
+    assert job.asset_id not in {j.asset_id for j in scheduler.claim(JOBS)}
+    assert scheduler.reset_attempts() == 1
+    # the claim above leased every other job, only the reset one is left.
+    assert [j.asset_id for j in _get_scheduler(client_db, 'retry').claim(JOBS)] == [job.asset_id]
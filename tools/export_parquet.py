@@ -0,0 +1,41 @@
+import argparse
+from data_types import TimeFrame
+from repository import RepositoryPaperTrade
+from repository.client import get_client_db
+from repository.export_parquet import ExportParquet
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Export bars into hive-partitioned parquet datasets (symbol/year/month), '
+            'only what was downloaded since the last export.'
+        )
+    )
+    parser.add_argument('--dest', help='root of the datasets, "export_data" by default.')
+    parser.add_argument(
+        '--time-frames',
+        nargs='+',
+        choices=[t.value for t in (TimeFrame.MIN, TimeFrame.HOUR, TimeFrame.DAY)],
+        default=[TimeFrame.MIN.value]
+    )
+    parser.add_argument('--symbols', nargs='+', help='all downloaded symbols by default.')
+    parser.add_argument('--full', action='store_true', help='ignore the watermarks and rewrite every partition.')
+    parser.add_argument('--row-group-size', type=int, default=5000)
+    args = parser.parse_args()
+    client_db = get_client_db()
+    kwargs = {
+        '_client_db': client_db,
+        '_repository_pt': RepositoryPaperTrade(_client_db=client_db),
+        '_row_group_size': args.row_group_size
+    }
+    if args.dest:
+        kwargs['_dest_dir'] = args.dest
+    exporter = ExportParquet(**kwargs)
+    reports = exporter.export(tuple(TimeFrame(t) for t in args.time_frames), args.symbols, args.full)
+    for time_frame, report in reports.items():
+        print(f'{time_frame.value}: symbols: {report.symbols}, partitions: {report.partitions}, rows: {report.rows}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+import argparse
+from repository.bars_schema import SchemaBarsMin
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Migrate bars_1min to the (symbol, time) clustered, partitioned schema. Safe to rerun.'
+    )
+    parser.add_argument('--chunk', type=int, default=200000, help='rows copied per committed chunk.')
+    args = parser.parse_args()
+    SchemaBarsMin(_copy_chunk=args.chunk).migrate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import argparse
+from pathlib import Path
+from data_types import SpoolFormat
+from repository.spool import migrate_spool_tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite yaml pages of the download spool into a columnar format.')
+    parser.add_argument('--root', default=f'{Path(__file__).parent}/../api_data/bars')
+    parser.add_argument('--keep-source', action='store_true', help='do not remove yaml files after migration.')
+    args = parser.parse_args()
+    migrated_num = migrate_spool_tree(args.root, SpoolFormat.NPZ, remove_source=not args.keep_source)
+    print(f'Migrated {migrated_num} pages under "{args.root}".')
+
+
+if __name__ == '__main__':
+    main()
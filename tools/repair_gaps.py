@@ -0,0 +1,42 @@
+import argparse
+import sys
+from repository import RepositoryMarketData
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report trading days missing from bars_1min per symbol and download only those days again.'
+    )
+    parser.add_argument('--symbols', nargs='+', help='all downloaded symbols by default.')
+    parser.add_argument('--start', default='2016-01-01')
+    parser.add_argument(
+        '--min-session-ratio',
+        type=float,
+        default=0.0,
+        help='also repair days whose regular session has less than this ratio of its minutes, e.g. 0.9.'
+    )
+    parser.add_argument('--dry-run', action='store_true', help='only report the gaps.')
+    parser.add_argument(
+        '--rebuild-coverage',
+        action='store_true',
+        help='rebuild the coverage index from bars_1min first, for bars stored before the index existed.'
+    )
+    args = parser.parse_args()
+    repo = RepositoryMarketData(_start_time=args.start, _use_cache=False)
+    if args.rebuild_coverage:
+        symbols = args.symbols or repo._repository_pt.get_symbols_downloaded(repo._category, repo._time_frame)
+        for symbol in symbols:
+            print(f'{symbol}: rebuilt coverage of {repo._coverage.rebuild(symbol)} days.')
+    gaps_symbols = repo.find_gaps(args.symbols, args.min_session_ratio)
+    for symbol, gaps in gaps_symbols.items():
+        print(f'{symbol}: missing {len(gaps["missing"])} days, partial {len(gaps["partial"])} days.')
+        if args.dry_run:
+            continue
+        days = sorted(set(gaps['missing'].tolist()) | set(gaps['partial'].tolist()))
+        print(f'{symbol}: repaired with {repo.repair_bars_days(symbol, days)} bars.')
+    print(f'Symbols with gaps: {len(gaps_symbols)}')
+    sys.exit(1 if gaps_symbols and args.dry_run else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import argparse
+from metrics_alpaca.metrics_alpaca import enable_metrics, start_metrics_server
+from repository import RepositoryPaperTrade
+from repository.client import get_client_db
+from repository.market_data_realtime import RepositoryRealtimeBars
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Stream minute bars of the active symbols into bars_1min until interrupted.'
+    )
+    parser.add_argument('--symbols', nargs='+', help='all active symbols by default.')
+    parser.add_argument('--flush-rows', type=int, default=5000)
+    parser.add_argument('--flush-interval', type=float, default=0.1, help='seconds a bar may wait for its batch.')
+    parser.add_argument('--metrics-port', type=int, help='serve metrics, the bar latency included, on this port.')
+    parser.add_argument('--metrics-host', default='127.0.0.1', help='address of the metrics server, "0.0.0.0" for all.')
+    parser.add_argument('--sync-assets', action='store_true', help='sync assets with the api before starting.')
+    args = parser.parse_args()
+    if args.metrics_port:
+        enable_metrics()
+        start_metrics_server(args.metrics_port, args.metrics_host)
+    client_db = get_client_db()
+    repository_pt = RepositoryPaperTrade(_client_db=client_db)
+    if args.sync_assets:
+        repository_pt.create_tables()
+        repository_pt.sync_assets()
+    repo = RepositoryRealtimeBars(
+        _client_db=client_db,
+        _repository_pt=repository_pt,
+        _flush_rows=args.flush_rows,
+        _flush_interval=args.flush_interval
+    )
+    repo.run(args.symbols)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import multiprocessing
+from datetime import datetime, timedelta
+from data_types import PriceDataCategory, TimeFrame
+from repository import RepositoryPaperTrade, RepositoryMarketData
+from repository.client import ClientDuckDB, ClientMarketData, get_client_db
+from repository.market_data_ticks import RepositoryTicks
+from repository.scheduler import SchedulerDownload
+
+
+def _run_worker(
+        category: PriceDataCategory,
+        time_until: str,
+        batch: int,
+        lease_seconds: int,
+        max_jobs: int,
+        rate_per_min: int
+) -> int:
+    # one process: its own pool, progress cache, heartbeat and share of the api rate limit.
+    client_db = get_client_db()
+    repository_pt = RepositoryPaperTrade(_client_db=client_db, _sync_assets_on_init=False)
+    time_frame = TimeFrame.MIN if category == PriceDataCategory.BAR else TimeFrame.TICK
+    client_md = ClientMarketData(
+        _end_time=time_until,
+        _category=category,
+        _time_frame=time_frame,
+        _client_db=client_db,
+        _api_rate_limit=rate_per_min
+    )
+    if category == PriceDataCategory.BAR:
+        repo = RepositoryMarketData(
+            _end_time=time_until,
+            _client_db=client_db,
+            _repository_pt=repository_pt,
+            _client_md=client_md
+        )
+        handler = repo.update_bars_in_db
+    else:
+        repo = RepositoryTicks(
+            _end_time=time_until,
+            _category=category,
+            _client_db=client_db,
+            _repository_pt=repository_pt,
+            _client_md=client_md
+        )
+        handler = repo.update_ticks
+    scheduler = SchedulerDownload(
+        _client_db=client_db,
+        _repository_pt=repository_pt,
+        _category=category,
+        _time_frame=time_frame,
+        _time_until=time_until,
+        _batch=batch,
+        _lease_seconds=lease_seconds
+    )
+    return scheduler.run(handler, max_jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Download stale symbols with worker processes that lease jobs from market_data_dl_progress. '
+            'Run it on as many hosts as needed against the same db.'
+        )
+    )
+    parser.add_argument('--category', choices=[c.value for c in PriceDataCategory], default=PriceDataCategory.BAR.value)
+    parser.add_argument('--until', default=(datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d'))
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=10, help='jobs leased per claim.')
+    parser.add_argument('--lease-seconds', type=int, default=600)
+    parser.add_argument('--max-jobs', type=int, help='jobs per process, all stale symbols by default.')
+    parser.add_argument(
+        '--rate-per-min',
+        type=int,
+        default=200,
+        help='api requests per minute of the key on this host, split evenly between the processes.'
+    )
+    parser.add_argument(
+        '--reset-attempts',
+        action='store_true',
+        help='make failed jobs claimable again before starting, those out of attempts included.'
+    )
+    parser.add_argument('--sync-assets', action='store_true', help='sync assets with the api before starting.')
+    args = parser.parse_args()
+    if args.rate_per_min < args.processes:
+        parser.error('"--rate-per-min" must give each process at least one request per minute.')
+    client_db = get_client_db()
+    if isinstance(client_db, ClientDuckDB) and args.processes > 1:
+        parser.error('A duckdb file is written by one process only, use "--processes 1".')
+    if args.sync_assets:
+        repository_pt = RepositoryPaperTrade(_client_db=client_db, _sync_assets_on_init=False)
+        repository_pt.create_tables()
+        repository_pt.sync_assets()
+    if args.reset_attempts:
+        category = PriceDataCategory(args.category)
+        SchedulerDownload(
+            _client_db=client_db,
+            _category=category,
+            _time_frame=TimeFrame.MIN if category == PriceDataCategory.BAR else TimeFrame.TICK,
+            _time_until=args.until
+        ).reset_attempts()
+    rate_per_min = args.rate_per_min // args.processes
+    print(f'Rate limit: {rate_per_min} requests/min per process, {args.processes} processes.')
+    worker_args = (
+        PriceDataCategory(args.category),
+        args.until,
+        args.batch,
+        args.lease_seconds,
+        args.max_jobs,
+        rate_per_min
+    )
+    if args.processes == 1:
+        jobs = [_run_worker(*worker_args)]
+    else:
+        # spawn, so no process inherits the connections and threads of another.
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            jobs = pool.starmap(_run_worker, [worker_args] * args.processes)
+    print(f'Completed jobs: {sum(jobs)} by {args.processes} processes.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import sys
+from glob import glob
+from pathlib import Path
+from repository.checkpoint import verify_download_dir, repair_download_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Detect missing, truncated or unreadable pages of download directories.'
+    )
+    parser.add_argument('--root', default=f'{Path(__file__).parent}/../api_data/bars')
+    parser.add_argument(
+        '--repair',
+        action='store_true',
+        help='cut journals before their first bad page, so the next download resumes from there.'
+    )
+    args = parser.parse_args()
+    # "{root}/{symbol}/{time_frame}/{start}_{end}"
+    dir_paths = sorted(glob(f'{args.root}/*/*/*_*'))
+    problems_num = 0
+    for dir_path in dir_paths:
+        problems = verify_download_dir(dir_path)
+        for problem in problems:
+            print(f'{dir_path}: {problem}')
+        problems_num += len(problems)
+        if problems and args.repair:
+            print(f'{dir_path}: dropped {repair_download_dir(dir_path)} pages.')
+    print(f'Verified {len(dir_paths)} directories under "{args.root}". problems: {problems_num}')
+    sys.exit(1 if problems_num else 0)
+
+
+if __name__ == '__main__':
+    main()